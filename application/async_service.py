@@ -0,0 +1,194 @@
+import logging
+from typing import TYPE_CHECKING, AsyncIterator
+
+from quart import Quart, current_app, request
+from werkzeug.exceptions import BadRequest
+
+from application.courier_cache import CourierCache
+from application.data_validator import DataValidator
+from application.exception_handler import handle_exceptions
+from application.handlers import RequestHandlers
+from application.indexes import INDEXES
+from application.ingestion import CHUNK_SIZE, NDJSON_MIMETYPE, IngestionMode, ingest_chunk, iter_ndjson
+from application.metrics import PROMETHEUS_MIMETYPE, Metrics
+from application.serialization import JsonSerializer
+from application.steps import run_async
+from utils.preparer import prepare_couriers, prepare_orders
+
+if TYPE_CHECKING:
+    from motor.motor_asyncio import AsyncIOMotorDatabase
+
+logger = logging.getLogger(__name__)
+
+
+class JsonQuart(Quart):
+    """
+    Асинхронный аналог application.serialization.JsonFlask.
+    """
+
+    def __init__(self, *args, serializer: JsonSerializer = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.serializer = serializer or JsonSerializer()
+
+    async def make_response(self, result):
+        if isinstance(result, tuple) and len(result) and isinstance(result[0], (dict, list)):
+            result = (self.serializer.response(result[0], self.response_class),) + result[1:]
+        elif isinstance(result, (dict, list)):
+            result = self.serializer.response(result, self.response_class)
+        return await super().make_response(result)
+
+
+async def _get_json() -> dict:
+    if not request.is_json:
+        raise BadRequest('Content-Type must be application/json')
+    try:
+        return current_app.serializer.loads(await request.get_data())
+    except ValueError as e:
+        raise BadRequest(f'Failed to decode JSON object: {e}')
+
+
+async def _iter_lines(body) -> AsyncIterator[bytes]:
+    """
+    Делит тело запроса на строки по мере получения.
+
+    :param body: тело запроса Quart
+    :return: строки без перевода строки
+    """
+    buffer = b''
+    async for data in body:
+        *lines, buffer = (buffer + data).split(b'\n')
+        for line in lines:
+            yield line
+    if buffer:
+        yield buffer
+
+
+def make_async_app(db: 'AsyncIOMotorDatabase', data_validator: DataValidator,
+                   serializer: JsonSerializer = None, metrics: Metrics = None,
+                   courier_cache: CourierCache = None, ingestion: IngestionMode = None) -> Quart:
+    """
+    Создаёт ASGI-приложение сервиса поверх асинхронного драйвера монго.
+
+    Обработчики выполняют те же шаги RequestHandlers, что и make_app, поэтому совпадают с ним по проверке
+    входных данных, ответам, обработке ошибок, кэшу курьеров, метрикам и режимам вставки. Пока процесс ждёт
+    ответа монго, он обслуживает другие запросы, поэтому одному процессу не нужен отдельный воркер на каждый
+    запрос. Загрузки /imports, книга заказов и чтения с реплик есть только у make_app.
+    :param AsyncIOMotorDatabase db: база данных сервиса
+    :param DataValidator data_validator: валидатор входных данных
+    :param JsonSerializer serializer: сериализация тел запросов и ответов
+    :param Metrics metrics: метрики сервиса
+    :param CourierCache courier_cache: кэш профилей курьеров поверх коллекции motor
+    :param IngestionMode ingestion: режим вставки пакетов POST /couriers и POST /orders
+    :return: приложение
+    :rtype: Quart
+    """
+    app = JsonQuart(__name__, serializer=serializer)
+    if metrics is None:
+        metrics = Metrics()
+    if courier_cache is None:
+        courier_cache = CourierCache(db['couriers'], metrics=metrics)
+    if ingestion is None:
+        ingestion = IngestionMode()
+    handlers = RequestHandlers(db, data_validator, metrics, courier_cache, ingestion)
+
+    @app.before_serving
+    async def ensure_indexes():
+        for collection_name, indexes in INDEXES.items():
+            await db[collection_name].create_indexes(indexes)
+
+    async def parse_json():
+        with metrics.stage('parse_json'):
+            return await _get_json()
+
+    async def ingest_ndjson_request(collection_name: str, validate_chunk, prepare, id_field: str):
+        # Как application.ingestion.ingest_ndjson: в памяти не больше одной пачки объектов
+        collection = ingestion.target(db[collection_name])
+        ids_list = []
+        errors = []
+        chunk = []
+        line_number = 0
+        async for line in _iter_lines(request.body):
+            line_number += 1
+            chunk.extend(iter_ndjson([line], app.serializer.loads, start=line_number))
+            if len(chunk) == (ingestion.chunk_size or CHUNK_SIZE):
+                chunk_inserted, chunk_errors = await run_async(
+                    ingest_chunk(chunk, collection, validate_chunk, prepare, id_field))
+                ids_list.extend(chunk_inserted)
+                errors.extend(chunk_errors)
+                chunk = []
+        if chunk:
+            chunk_inserted, chunk_errors = await run_async(
+                ingest_chunk(chunk, collection, validate_chunk, prepare, id_field))
+            ids_list.extend(chunk_inserted)
+            errors.extend(chunk_errors)
+        response = {collection_name: ids_list}
+        if errors:
+            response['errors'] = errors
+            return response, 400
+        return response, 201
+
+    @app.route('/metrics', methods=['GET'])
+    async def get_metrics():
+        return metrics.render(), 200, {'Content-Type': PROMETHEUS_MIMETYPE}
+
+    @app.route('/couriers', methods=['POST'])
+    @metrics.instrument
+    @handle_exceptions(logger)
+    async def add_couriers():
+        if request.mimetype == NDJSON_MIMETYPE:
+            return await ingest_ndjson_request('couriers', data_validator.validate_couriers_chunk,
+                                               prepare_couriers, 'courier_id')
+        return await run_async(handlers.add_couriers(await parse_json()))
+
+    @app.route('/couriers', methods=['PATCH'])
+    @metrics.instrument
+    @handle_exceptions(logger)
+    async def patch_couriers():
+        return await run_async(handlers.patch_couriers(await parse_json()))
+
+    @app.route('/couriers/<int:courier_id>', methods=['GET'])
+    @metrics.instrument
+    @handle_exceptions(logger)
+    async def get_courier(courier_id):
+        return await run_async(handlers.get_courier(courier_id))
+
+    @app.route('/couriers/<int:courier_id>', methods=['PATCH'])
+    @metrics.instrument
+    @handle_exceptions(logger)
+    async def patch_courier(courier_id):
+        return await run_async(handlers.patch_courier(courier_id, await parse_json()))
+
+    @app.route('/orders', methods=['POST'])
+    @metrics.instrument
+    @handle_exceptions(logger)
+    async def add_orders():
+        if request.mimetype == NDJSON_MIMETYPE:
+            return await ingest_ndjson_request('orders', data_validator.validate_orders_chunk,
+                                               prepare_orders, 'order_id')
+        return await run_async(handlers.add_orders(await parse_json()))
+
+    @app.route('/orders/assign', methods=['POST'])
+    @metrics.instrument
+    @handle_exceptions(logger)
+    async def assign_orders():
+        return await run_async(handlers.assign_orders(await parse_json()))
+
+    @app.route('/orders/assign/batch', methods=['POST'])
+    @metrics.instrument
+    @handle_exceptions(logger)
+    async def assign_orders_batch():
+        return await run_async(handlers.assign_orders_batch(await parse_json()))
+
+    @app.route('/orders/complete', methods=['POST'])
+    @metrics.instrument
+    @handle_exceptions(logger)
+    async def complete_order():
+        return await run_async(handlers.complete_order(await parse_json()))
+
+    @app.route('/orders/complete/batch', methods=['POST'])
+    @metrics.instrument
+    @handle_exceptions(logger)
+    async def complete_orders_batch():
+        return await run_async(handlers.complete_orders_batch(await parse_json()))
+
+    return app
@@ -0,0 +1,198 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+from pymongo.collection import Collection
+from pymongo.errors import PyMongoError
+
+from application.metrics import CACHE_INVALIDATIONS_METRIC, CACHE_METRIC, Metrics
+from application.steps import Fetch, Steps, run
+
+logger = logging.getLogger(__name__)
+
+# Поля профиля курьера, которые нужны обработчикам назначения и выполнения заказов.
+# Остальные поля курьера (текущий развоз, статистика доставок) меняются на каждом запросе и не кэшируются
+PROFILE_FIELDS = ('courier_type', 'regions', 'working_hours')
+
+# Изменения курьеров, после которых профиль в кэше устаревает
+PROFILE_CHANGES = [{'$match': {'$or': [
+    {'operationType': {'$in': ['replace', 'delete']}},
+    *({f'updateDescription.updatedFields.{field}': {'$exists': True}} for field in PROFILE_FIELDS),
+    {'updateDescription.removedFields': {'$in': list(PROFILE_FIELDS)}},
+]}}]
+
+# Пауза перед повторным подключением к потоку изменений после ошибки, в секундах
+RETRY_DELAY = 1
+
+
+class CourierCache(object):
+    """
+    Кэш профилей курьеров в памяти процесса с вытеснением давно не использованных записей и временем жизни.
+
+    Согласованность между процессами сервиса поддерживается потоком изменений коллекции курьеров:
+    запись удаляется из кэша, как только в любом процессе изменились поля профиля. Время жизни
+    ограничивает устаревание, пока поток изменений недоступен. Коллекция может быть и коллекцией motor:
+    тогда курьеры читаются шагами fetch и fetch_many, а поток изменений читает watch_async.
+    """
+
+    def __init__(self, collection: Collection, max_size: int = 10000, ttl: float = 60,
+                 metrics: Optional[Metrics] = None):
+        self.collection = collection
+        self.max_size = max_size
+        self.ttl = ttl
+        self.metrics = metrics
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._entries: OrderedDict = OrderedDict()
+        # Меняется при каждой инвалидации: профиль, прочитанный до неё, в кэш не попадает
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._watcher_pid = None
+        self._projection = {field: 1 for field in PROFILE_FIELDS}
+
+    def get(self, courier_id: int) -> Optional[dict]:
+        """
+        Возвращает профиль курьера: поля _id, courier_type, regions и working_hours.
+
+        Возвращаемый словарь общий для всех запросов, изменять его нельзя.
+        :param int courier_id: идентификатор курьера
+        :return: профиль или None, если курьера нет
+        :rtype: Optional[dict]
+        """
+        return run(self.fetch(courier_id))
+
+    def get_many(self, courier_ids: Iterable[int]) -> Dict[int, dict]:
+        """
+        Возвращает профили нескольких курьеров, недостающие читаются одним запросом.
+
+        :param courier_ids: идентификаторы курьеров
+        :return: словарь идентификатор -> профиль для найденных курьеров
+        :rtype: Dict[int, dict]
+        """
+        return run(self.fetch_many(courier_ids))
+
+    def fetch(self, courier_id: int) -> Steps[Optional[dict]]:
+        # Шаги get
+        courier, generation = self.__lookup(courier_id)
+        if courier is None:
+            courier = yield self.collection.find_one({'_id': courier_id}, self._projection)
+            if courier is not None:
+                self.__store(courier, generation)
+        return courier
+
+    def fetch_many(self, courier_ids: Iterable[int]) -> Steps[Dict[int, dict]]:
+        # Шаги get_many
+        couriers = {}
+        missing_ids = []
+        generation = None
+        for courier_id in courier_ids:
+            courier, current_generation = self.__lookup(courier_id)
+            generation = current_generation if generation is None else generation
+            if courier is None:
+                missing_ids.append(courier_id)
+            else:
+                couriers[courier_id] = courier
+        if missing_ids:
+            for courier in (yield Fetch(self.collection.find({'_id': {'$in': missing_ids}}, self._projection))):
+                self.__store(courier, generation)
+                couriers[courier['_id']] = courier
+        return couriers
+
+    def invalidate(self, courier_id: int, source: str = 'write'):
+        with self._lock:
+            self._entries.pop(courier_id, None)
+            self._generation += 1
+            self.invalidations += 1
+        if self.metrics is not None:
+            self.metrics.increment(CACHE_INVALIDATIONS_METRIC, (('source', source),))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'size': len(self._entries),
+                    'hits': self.hits,
+                    'misses': self.misses,
+                    'invalidations': self.invalidations,
+                    'hit_rate': self.hits / lookups if lookups else None}
+
+    def start_watching(self):
+        """
+        Запускает в фоновом потоке чтение потока изменений коллекции курьеров.
+
+        Поток запускается один раз в каждом процессе, поэтому метод можно вызывать до форка воркеров.
+        """
+        with self._lock:
+            if self._watcher_pid == os.getpid():
+                return
+            self._watcher_pid = os.getpid()
+        threading.Thread(target=self.watch, daemon=True).start()
+
+    def watch(self):
+        resume_token = None
+        while True:
+            try:
+                with self.collection.watch(PROFILE_CHANGES, resume_after=resume_token) as stream:
+                    for change in stream:
+                        resume_token = stream.resume_token
+                        self.invalidate(change['documentKey']['_id'], 'change_stream')
+            except PyMongoError:
+                logger.exception('Courier change stream failed')
+                # Пока потока изменений не было, кэш мог устареть
+                resume_token = None
+                self.clear()
+                time.sleep(RETRY_DELAY)
+
+    async def watch_async(self):
+        """
+        Читает поток изменений коллекции курьеров motor, как watch.
+
+        Запускается фоновой задачей асинхронного приложения.
+        """
+        resume_token = None
+        while True:
+            try:
+                async with self.collection.watch(PROFILE_CHANGES, resume_after=resume_token) as stream:
+                    async for change in stream:
+                        resume_token = stream.resume_token
+                        self.invalidate(change['documentKey']['_id'], 'change_stream')
+            except PyMongoError:
+                logger.exception('Courier change stream failed')
+                resume_token = None
+                self.clear()
+                await asyncio.sleep(RETRY_DELAY)
+
+    def __lookup(self, courier_id: int) -> Tuple[Optional[dict], int]:
+        with self._lock:
+            generation = self._generation
+            entry = self._entries.get(courier_id)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(courier_id)
+                self.hits += 1
+                result = 'hit'
+                courier = entry[1]
+            else:
+                self.misses += 1
+                result = 'miss'
+                courier = None
+        if self.metrics is not None:
+            self.metrics.increment(CACHE_METRIC, (('result', result),))
+        return courier, generation
+
+    def __store(self, courier: dict, generation: int):
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._entries[courier['_id']] = (time.monotonic() + self.ttl, courier)
+            self._entries.move_to_end(courier['_id'])
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
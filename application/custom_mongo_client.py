@@ -1,29 +1,257 @@
 import logging
+import os
+import threading
+import time
+from typing import Callable, List, Mapping, Optional
 
-from pymongo import MongoClient
+from pymongo import MongoClient, monitoring
 from pymongo.errors import PyMongoError
 
+from application.metrics import MONGO_POOL_METRIC, MONGO_POOL_WAIT_METRIC, Metrics
+
 logger = logging.getLogger(__name__)
 
+# Размер пула соединений pymongo по умолчанию
+DEFAULT_MAX_POOL_SIZE = 100
+
+
+def _write_concern(value: str):
+    return value if value == 'majority' else int(value)
+
+
+# Настройки подключения из переменных окружения: переменная -> (параметр MongoClient, преобразование)
+ENV_OPTIONS = {
+    'MONGO_MAX_POOL_SIZE': ('maxPoolSize', int),
+    'MONGO_MIN_POOL_SIZE': ('minPoolSize', int),
+    'MONGO_MAX_IDLE_TIME_MS': ('maxIdleTimeMS', int),
+    'MONGO_WAIT_QUEUE_TIMEOUT_MS': ('waitQueueTimeoutMS', int),
+    'MONGO_CONNECT_TIMEOUT_MS': ('connectTimeoutMS', int),
+    'MONGO_SOCKET_TIMEOUT_MS': ('socketTimeoutMS', int),
+    'MONGO_SERVER_SELECTION_TIMEOUT_MS': ('serverSelectionTimeoutMS', int),
+    'MONGO_READ_PREFERENCE': ('readPreference', str),
+    'MONGO_WRITE_CONCERN': ('w', _write_concern),
+}
+
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """
+    Слушатель пула соединений pymongo: число открытых и занятых соединений и ожидание свободного соединения.
+
+    Если переданы метрики, те же значения отдаются в /metrics, где они суммируются по воркерам.
+    """
+
+    def __init__(self, metrics: Optional[Metrics] = None):
+        self.metrics = metrics
+        self.open = 0
+        self.in_use = 0
+        self.checkouts = 0
+        self.failed_checkouts = 0
+        self.wait_seconds = 0.0
+        self._lock = threading.Lock()
+        self._checkout_started = threading.local()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'open': self.open,
+                    'in_use': self.in_use,
+                    'checkouts': self.checkouts,
+                    'failed_checkouts': self.failed_checkouts,
+                    'wait_seconds': self.wait_seconds}
+
+    def reset(self):
+        """
+        Обнуляет статистику, унаследованную от родительского процесса.
+        """
+        self.__change('open', -self.open)
+        self.__change('in_use', -self.in_use)
+
+    def connection_created(self, event):
+        self.__change('open', 1)
+
+    def connection_closed(self, event):
+        self.__change('open', -1)
+
+    def connection_check_out_started(self, event):
+        self._checkout_started.value = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        wait = time.perf_counter() - getattr(self._checkout_started, 'value', time.perf_counter())
+        with self._lock:
+            self.checkouts += 1
+            self.wait_seconds += wait
+        self.__change('in_use', 1)
+        if self.metrics is not None:
+            self.metrics.observe(MONGO_POOL_WAIT_METRIC, (('outcome', 'success'),), wait)
+
+    def connection_check_out_failed(self, event):
+        wait = time.perf_counter() - getattr(self._checkout_started, 'value', time.perf_counter())
+        with self._lock:
+            self.failed_checkouts += 1
+        if self.metrics is not None:
+            self.metrics.observe(MONGO_POOL_WAIT_METRIC, (('outcome', 'failure'),), wait)
+
+    def connection_checked_in(self, event):
+        self.__change('in_use', -1)
+
+    def connection_ready(self, event):
+        pass
+
+    def pool_created(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def __change(self, state: str, delta: int):
+        with self._lock:
+            setattr(self, state, getattr(self, state) + delta)
+        if self.metrics is not None:
+            self.metrics.increment(MONGO_POOL_METRIC, (('state', state),), delta)
 
-def _initiate_replica_set(host: str, port: int):
-    """Инициализирует replica set через новое подключение к узлу монго.
 
-    :param str host: адрес узла монго, на котором инициируется replica set
-    :param int port: порт, который прослушивает узел монго
+class ConnectionManager(object):
     """
-    client = MongoClient(host, port)
-    try:
-        client.admin.command('replSetInitiate')
-    except PyMongoError:
-        logger.info('Replica set already initiated')
-    finally:
-        client.close()
+    Подключение к монго, которое создаётся лениво в том процессе, где используется.
 
+    Клиент pymongo нельзя использовать после форка, поэтому при gunicorn --preload клиент, созданный
+    в мастере, в воркере не используется: при первом обращении воркер создаёт свой клиент с теми же
+    настройками и вызывает функции, зарегистрированные через on_connect. Базы и коллекции, которые
+    возвращает database, обращаются к клиенту текущего процесса, поэтому их можно создать до форка.
+    """
+
+    def __init__(self, host: str, port: int, replica_set: Optional[str] = None, metrics: Optional[Metrics] = None,
+                 event_listeners: Optional[list] = None, client_class: Callable = MongoClient, **options):
+        """
+        :param str host: адрес узла монго
+        :param int port: порт узла монго
+        :param str replica_set: имя replica set
+        :param Metrics metrics: метрики для статистики пула соединений
+        :param list event_listeners: слушатели событий pymongo
+        :param client_class: класс клиента
+        :param options: параметры MongoClient: maxPoolSize, таймауты, readPreference, w и др.
+        """
+        self.host = host
+        self.port = port
+        self.replica_set = replica_set
+        self.options = options
+        self.client_class = client_class
+        self.pool_listener = PoolStatsListener(metrics)
+        self.event_listeners = list(event_listeners or []) + [self.pool_listener]
+        self._client = None
+        self._pid = None
+        self._on_connect: List[Callable] = []
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_environ(cls, environ: Mapping[str, str], **kwargs) -> 'ConnectionManager':
+        """
+        Создаёт менеджер по переменным окружения DATABASE_URI, REPLICA_SET и ENV_OPTIONS.
+
+        :param environ: переменные окружения
+        :param kwargs: остальные параметры конструктора
+        :rtype: ConnectionManager
+        """
+        options = {option: convert(environ[variable]) for variable, (option, convert) in ENV_OPTIONS.items()
+                   if environ.get(variable)}
+        options.update(kwargs)
+        return cls(environ['DATABASE_URI'], 27017, environ.get('REPLICA_SET'), **options)
+
+    def client_options(self) -> dict:
+        """
+        Параметры клиента, в том числе для асинхронного клиента motor.
+
+        :rtype: dict
+        """
+        options = dict(self.options)
+        if self.replica_set:
+            options['replicaset'] = self.replica_set
+        return options
+
+    @property
+    def client(self) -> MongoClient:
+        if self._pid == os.getpid():
+            return self._client
+        with self._lock:
+            if self._pid == os.getpid():
+                return self._client
+            if self._pid is not None:
+                # Клиент родительского процесса не закрывается: его соединения принадлежат родителю
+                self.pool_listener.reset()
+            self._client = self.client_class(self.host, self.port, event_listeners=self.event_listeners,
+                                             **self.client_options())
+            self._pid = os.getpid()
+        for callback in self._on_connect:
+            callback()
+        return self._client
+
+    def on_connect(self, callback: Callable):
+        """
+        Регистрирует функцию, которая вызывается при создании клиента в каждом процессе, например
+        запуск фоновых потоков, которые не переживают форк.
+        """
+        self._on_connect.append(callback)
+
+    def database(self, name: str) -> 'ForkSafeDatabase':
+        return ForkSafeDatabase(self, name)
+
+    def initiate_replica_set(self):
+        """
+        Инициализирует replica set, если он ещё не инициализирован.
+
+        Узел без replica set не отвечает клиенту с параметром replicaset, поэтому команда выполняется
+        через прямое подключение к узлу. Достаточно вызвать метод один раз в мастере до форка воркеров.
+        """
+        timeouts = {option: value for option, value in self.options.items()
+                    if option in ('connectTimeoutMS', 'serverSelectionTimeoutMS')}
+        client = self.client_class(self.host, self.port, **timeouts)
+        try:
+            client.admin.command('replSetInitiate')
+        except PyMongoError:
+            logger.info('Replica set already initiated')
+        finally:
+            client.close()
+
+    def pool_stats(self) -> dict:
+        """
+        Статистика пула соединений текущего процесса.
+
+        :return: число открытых и занятых соединений, размер пула и доля занятых соединений
+        :rtype: dict
+        """
+        stats = self.pool_listener.stats()
+        stats['max_pool_size'] = self.options.get('maxPoolSize', DEFAULT_MAX_POOL_SIZE)
+        stats['utilization'] = stats['in_use'] / stats['max_pool_size'] if stats['max_pool_size'] else None
+        return stats
+
+
+class ForkSafeDatabase(object):
+    """
+    База монго, которая обращается к клиенту текущего процесса.
+    """
+
+    def __init__(self, manager: ConnectionManager, name: str):
+        self.manager = manager
+        self.name = name
+
+    def __getitem__(self, collection_name: str) -> 'ForkSafeCollection':
+        return ForkSafeCollection(self.manager, self.name, collection_name)
+
+    def __getattr__(self, attribute: str):
+        return getattr(self.manager.client[self.name], attribute)
+
+
+class ForkSafeCollection(object):
+    """
+    Коллекция монго, которая обращается к клиенту текущего процесса.
+    """
 
-class CustomMongoClient(MongoClient):
-    """Класс для подключения к базе данных монго и автоматической инициализации replica set."""
+    def __init__(self, manager: ConnectionManager, database_name: str, name: str):
+        self.manager = manager
+        self.database_name = database_name
+        self.name = name
 
-    def __init__(self, host: str, port: int, replica_set: str):
-        super().__init__(host, port, replicaset=replica_set)
-        _initiate_replica_set(host, port)
+    def __getattr__(self, attribute: str):
+        return getattr(self.manager.client[self.database_name][self.name], attribute)
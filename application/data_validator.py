@@ -1,35 +1,108 @@
 import os
+from typing import Tuple
 
-import jsonschema
 from bson import json_util
-from jsonschema import ValidationError
+from jsonschema import Draft7Validator, FormatChecker, ValidationError
+from jsonschema.exceptions import best_match
 import iso8601
 
-from utils.parser import parse_hours
+from application import fast_validators
+from utils.parser import parse_hours, parse_intervals
 
 
 class DataValidator(object):
-    def __init__(self):
-        self.data_schema = self.__load_schema('data_schema.json')
-        self.courier_schema = self.__load_schema('courier_schema.json')
-        self.order_schema = self.__load_schema('order_schema.json')
-        self.complete_schema = self.__load_schema('complete_schema.json')
-        self.assign_schema = self.__load_schema('assign_schema.json')
-        self.courier_patch_schema = self.__load_schema('courier_patch_schema.json')
+    """
+    Класс для проверки входных данных обработчиков по JSON-схемам.
+
+    Валидаторы схем создаются один раз при инициализации. Для курьеров и заказов можно включить
+    быстрые проверки, написанные вручную по тем же схемам.
+    """
+
+    def __init__(self, fast_path: bool = False):
+        format_checker = FormatChecker()
+        self.data_validator = self.__load_validator('data_schema.json', format_checker)
+        self.courier_validator = self.__load_validator('courier_schema.json', format_checker)
+        self.order_validator = self.__load_validator('order_schema.json', format_checker)
+        self.complete_validator = self.__load_validator('complete_schema.json', format_checker)
+        self.assign_validator = self.__load_validator('assign_schema.json', format_checker)
+        self.assign_batch_validator = self.__load_validator('assign_batch_schema.json', format_checker)
+        self.courier_patch_validator = self.__load_validator('courier_patch_schema.json', format_checker)
+        self.courier_patch_item_validator = self.__patch_item_validator(self.courier_patch_validator, format_checker)
+
+        if fast_path:
+            self.is_valid_courier = fast_validators.is_valid_courier
+            self.is_valid_order = fast_validators.is_valid_order
+        else:
+            self.is_valid_courier = self.courier_validator.is_valid
+            self.is_valid_order = self.order_validator.is_valid
 
     @staticmethod
-    def __load_schema(schema_name: str):
+    def __load_validator(schema_name: str, format_checker: FormatChecker) -> Draft7Validator:
         with open(os.path.join(os.path.dirname(__file__), 'schemas', schema_name)) as f:
-            return json_util.loads(f.read())
+            schema = json_util.loads(f.read())
+        Draft7Validator.check_schema(schema)
+        return Draft7Validator(schema, format_checker=format_checker)
+
+    @staticmethod
+    def __patch_item_validator(patch_validator: Draft7Validator, format_checker: FormatChecker) -> Draft7Validator:
+        # Элемент пакетного изменения - та же схема изменения курьера с обязательным идентификатором
+        schema = dict(patch_validator.schema)
+        schema['properties'] = {'courier_id': {'type': 'integer', 'minimum': 1}, **schema['properties']}
+        schema['required'] = ['courier_id']
+        schema['minProperties'] = schema.get('minProperties', 0) + 1
+        return Draft7Validator(schema, format_checker=format_checker)
+
+    @staticmethod
+    def __check(validator: Draft7Validator, instance):
+        error = best_match(validator.iter_errors(instance))
+        if error is not None:
+            raise error
+
+    @staticmethod
+    def _invalid_items(items: list, is_valid, id_field: str) -> list:
+        return [{'id': item.get(id_field) if isinstance(item, dict) else None}
+                for item in items if not is_valid(item)]
+
+    @staticmethod
+    def __split_valid(items: list, is_valid) -> Tuple[list, list]:
+        valid_items = []
+        invalid_items = []
+        for item in items:
+            if is_valid(item):
+                valid_items.append(item)
+            else:
+                invalid_items.append(item)
+        return valid_items, invalid_items
+
+    def validate_couriers_chunk(self, couriers: list) -> Tuple[list, list]:
+        """
+        Проверяет пачку курьеров без прерывания на первом некорректном.
+
+        Рабочие часы корректных курьеров разбираются так же, как в validate_couriers.
+        :param list couriers: курьеры
+        :return: списки корректных и некорректных курьеров
+        :rtype: Tuple[list, list]
+        """
+        valid_couriers, invalid_couriers = self.__split_valid(couriers, self.is_valid_courier)
+        parse_hours({'data': valid_couriers}, 'working_hours')
+        return valid_couriers, invalid_couriers
+
+    def validate_orders_chunk(self, orders: list) -> Tuple[list, list]:
+        """
+        Проверяет пачку заказов без прерывания на первом некорректном.
+
+        Часы доставки корректных заказов разбираются так же, как в validate_orders.
+        :param list orders: заказы
+        :return: списки корректных и некорректных заказов
+        :rtype: Tuple[list, list]
+        """
+        valid_orders, invalid_orders = self.__split_valid(orders, self.is_valid_order)
+        parse_hours({'data': valid_orders}, 'delivery_hours')
+        return valid_orders, invalid_orders
 
     def validate_couriers(self, couriers_data: dict):
-        jsonschema.validate(couriers_data, self.data_schema)
-        errors = []
-        for courier in couriers_data['data']:
-            try:
-                jsonschema.validate(courier, self.courier_schema)
-            except ValidationError:
-                errors.append({'id': courier['courier_id']})
+        self.__check(self.data_validator, couriers_data)
+        errors = self._invalid_items(couriers_data['data'], self.is_valid_courier, 'courier_id')
         if errors:
             raise ValidationError({'couriers': errors})
 
@@ -39,13 +112,8 @@ class DataValidator(object):
         parse_hours(couriers_data, 'working_hours')
 
     def validate_orders(self, orders_data: dict):
-        jsonschema.validate(orders_data, self.data_schema)
-        errors = []
-        for order in orders_data['data']:
-            try:
-                jsonschema.validate(order, self.order_schema)
-            except ValidationError as e:
-                errors.append({'id': order['order_id']})
+        self.__check(self.data_validator, orders_data)
+        errors = self._invalid_items(orders_data['data'], self.is_valid_order, 'order_id')
         if errors:
             raise ValidationError({'orders': errors})
 
@@ -55,11 +123,55 @@ class DataValidator(object):
         parse_hours(orders_data, 'delivery_hours')
 
     def validate_complete(self, complete_data: dict):
-        jsonschema.validate(complete_data, self.complete_schema, format_checker=jsonschema.FormatChecker())
+        self.__check(self.complete_validator, complete_data)
         complete_data['complete_time'] = iso8601.parse_date(complete_data['complete_time'])
 
+    def validate_complete_batch(self, complete_batch_data: dict):
+        """
+        Проверяет пакет выполненных заказов за один проход по всем элементам.
+
+        Время выполнения разбирается так же, как в validate_complete.
+        :param dict complete_batch_data: тройки courier_id, order_id, complete_time в поле data
+        :raises ValidationError: со списком идентификаторов заказов с некорректными данными
+        """
+        self.__check(self.data_validator, complete_batch_data)
+        errors = self._invalid_items(complete_batch_data['data'], self.complete_validator.is_valid, 'order_id')
+        if errors:
+            raise ValidationError({'orders': errors})
+
+        order_ids = {complete_data['order_id'] for complete_data in complete_batch_data['data']}
+        if len(order_ids) != len(complete_batch_data['data']):
+            raise ValidationError('Orders ids are not unique')
+        for complete_data in complete_batch_data['data']:
+            complete_data['complete_time'] = iso8601.parse_date(complete_data['complete_time'])
+
     def validate_assign(self, assign_data: dict):
-        jsonschema.validate(assign_data, self.assign_schema)
+        self.__check(self.assign_validator, assign_data)
+
+    def validate_assign_batch(self, assign_batch_data: dict):
+        self.__check(self.assign_batch_validator, assign_batch_data)
 
     def validate_courier_patch(self, patch_data: dict):
-        jsonschema.validate(patch_data, self.courier_patch_schema)
+        self.__check(self.courier_patch_validator, patch_data)
+        if 'working_hours' in patch_data:
+            patch_data['working_hours'] = parse_intervals(patch_data['working_hours'])
+
+    def validate_couriers_patch(self, patches_data: dict):
+        """
+        Проверяет пакет изменений курьеров за один проход по всем элементам.
+
+        Рабочие часы разбираются так же, как в validate_courier_patch.
+        :param dict patches_data: изменения в поле data, у каждого указан courier_id
+        :raises ValidationError: со списком идентификаторов некорректных изменений
+        """
+        self.__check(self.data_validator, patches_data)
+        errors = self._invalid_items(patches_data['data'], self.courier_patch_item_validator.is_valid, 'courier_id')
+        if errors:
+            raise ValidationError({'couriers': errors})
+
+        courier_ids = {patch_data['courier_id'] for patch_data in patches_data['data']}
+        if len(courier_ids) != len(patches_data['data']):
+            raise ValidationError('Couriers ids are not unique')
+        for patch_data in patches_data['data']:
+            if 'working_hours' in patch_data:
+                patch_data['working_hours'] = parse_intervals(patch_data['working_hours'])
@@ -1,3 +1,4 @@
+import asyncio
 import logging
 from functools import wraps
 from typing import Tuple
@@ -21,29 +22,51 @@ def make_error_response(logger: logging.Logger, message: str, status_code: int)
     return {'message': message}, status_code
 
 
+def make_exception_response(logger: logging.Logger, e: Exception):
+    """
+    Преобразует исключение обработчика в ответ сервиса.
+
+    :param logging.Logger logger: логгер, которым логируется ошибка
+    :param Exception e: исключение
+    :return: ответ сервиса
+    """
+    if isinstance(e, ValidationError):
+        return {'validation_error': e.message}
+    if isinstance(e, BadRequest):
+        return make_error_response(logger, 'Error when parsing JSON: ' + str(e), 400)
+    if isinstance(e, PyMongoError):
+        return make_error_response(logger, 'Database error: ' + str(e), 400)
+    if isinstance(e, ValueError):
+        return make_error_response(logger, 'Value error: ' + str(e), 400)
+    return make_error_response(logger, str(e), 400)
+
+
 def handle_exceptions(logger: logging.Logger):
     """
     Декоратор, оборачивающий указанную функцию в блок обработки ошибок.
 
     Логирует все появившиеся ошибки с помощью логгера, переданного на вход.
+    Подходит как для обычных обработчиков, так и для асинхронных.
     :param logging.Logger logger: логгер, которым логируется возникающие ошибки
     """
 
     def decorator(f):
+        if asyncio.iscoroutinefunction(f):
+            @wraps(f)
+            async def async_wrap(*args, **kwargs):
+                try:
+                    return await f(*args, **kwargs)
+                except Exception as e:
+                    return make_exception_response(logger, e)
+
+            return async_wrap
+
         @wraps(f)
         def wrap(*args, **kwargs):
             try:
                 return f(*args, **kwargs)
-            except ValidationError as e:
-                return {'validation_error': e.message}
-            except BadRequest as e:
-                return make_error_response(logger, 'Error when parsing JSON: ' + str(e), 400)
-            except PyMongoError as e:
-                return make_error_response(logger, 'Database error: ' + str(e), 400)
-            except ValueError as e:
-                return make_error_response(logger, 'Value error: ' + str(e), 400)
             except Exception as e:
-                return make_error_response(logger, str(e), 400)
+                return make_exception_response(logger, e)
 
         return wrap
 
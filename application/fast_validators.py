@@ -0,0 +1,50 @@
+import re
+
+# Проверки повторяют схемы courier_schema.json и order_schema.json так, как их проверяет Draft7Validator,
+# но без обхода схемы и создания объектов ошибок
+_HOURS_PATTERN = re.compile('^(0[0-9]|1[0-9]|2[0-3]):[0-5][0-9]-(0[0-9]|1[0-9]|2[0-3]):[0-5][0-9]$')
+_COURIER_FIELDS = {'courier_id', 'courier_type', 'regions', 'working_hours'}
+_ORDER_FIELDS = {'order_id', 'weight', 'region', 'delivery_hours'}
+_COURIER_TYPES = ('foot', 'bike', 'car')
+
+
+def _is_integer(value) -> bool:
+    value_type = type(value)
+    return value_type is int or value_type is float and value.is_integer()
+
+
+def _is_number(value) -> bool:
+    value_type = type(value)
+    return value_type is int or value_type is float
+
+
+def _is_positive_integer(value) -> bool:
+    return _is_integer(value) and value >= 1
+
+
+def _is_hours_list(value) -> bool:
+    return type(value) is list and all(type(hours) is str and _HOURS_PATTERN.search(hours) for hours in value)
+
+
+def _is_multiple_of_hundredth(value) -> bool:
+    quotient = value / 0.01
+    return int(quotient) == quotient
+
+
+def is_valid_courier(courier) -> bool:
+    return (type(courier) is dict
+            and courier.keys() == _COURIER_FIELDS
+            and _is_positive_integer(courier['courier_id'])
+            and type(courier['courier_type']) is str and courier['courier_type'] in _COURIER_TYPES
+            and type(courier['regions']) is list and all(map(_is_positive_integer, courier['regions']))
+            and _is_hours_list(courier['working_hours']))
+
+
+def is_valid_order(order) -> bool:
+    return (type(order) is dict
+            and order.keys() == _ORDER_FIELDS
+            and _is_positive_integer(order['order_id'])
+            and _is_number(order['weight']) and 0.01 <= order['weight'] <= 50
+            and _is_multiple_of_hundredth(order['weight'])
+            and _is_positive_integer(order['region'])
+            and _is_hours_list(order['delivery_hours']))
@@ -0,0 +1,464 @@
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from jsonschema import ValidationError
+from pymongo import ReturnDocument, UpdateMany, UpdateOne
+from pymongo.client_session import ClientSession
+from pymongo.database import Database
+from pymongo.errors import PyMongoError
+from pymongo.results import BulkWriteResult, UpdateResult
+
+from application.courier_cache import CourierCache
+from application.data_validator import DataValidator
+from application.ingestion import IngestionMode
+from application.metrics import Metrics
+from application.order_book import OrderBook
+from application.repository import ASSIGNED_ORDER_FIELDS, COMPLETED_ORDER_FIELDS, COURIER_INFO_FIELDS, \
+    PATCHED_COURIER_FIELDS, apply_courier_patches, close_active_assign, find_courier, find_couriers, \
+    find_free_orders, find_orders, find_orders_in_progress, mark_order_completed, order_exists, record_completion
+from application.steps import Fetch, Steps
+from utils.assignment import changed_constraints, couriers_to_recheck, courier_capacity, plan_assignments, \
+    plan_unassign, select_orders
+from utils.courier_stats import closed_assign_update, completion_update, courier_earnings, courier_rating, \
+    delivery_duration, region_key, to_utc
+from utils.preparer import UNASSIGN_ORDERS, format_courier, prepare_active_assign, prepare_assign, \
+    prepare_assign_time_merge, prepare_couriers, prepare_orders
+from utils.utils import split_orders
+
+Response = Tuple[dict, int]
+
+
+class RequestHandlers(object):
+    """
+    Логика обработчиков сервиса от проверки входных данных до ответа.
+
+    Обработчики возвращают шаги (см. application.steps), поэтому одни и те же обработчики выполняются
+    приложением make_app поверх pymongo и приложением make_async_app поверх motor: приложения только
+    разбирают запрос и выполняют шаги. Книга заказов и чтения с реплик доступны только синхронному приложению.
+    """
+
+    def __init__(self, db: Database, data_validator: DataValidator, metrics: Metrics, courier_cache: CourierCache,
+                 ingestion: IngestionMode, order_book: Optional[OrderBook] = None, read_preference=None):
+        self.db = db
+        self.data_validator = data_validator
+        self.metrics = metrics
+        self.courier_cache = courier_cache
+        self.ingestion = ingestion
+        self.order_book = order_book
+        self.read_preference = read_preference
+
+    def merge_assign_time(self, courier_id: int, list_orders: list) -> Steps[str]:
+        """
+        Объединяет заказы курьера в работе в одно назначение с самым ранним временем, см. prepare_assign_time_merge.
+
+        :param int courier_id: идентификатор курьера
+        :param list list_orders: заказы курьера в работе
+        :return: время назначения
+        :rtype: str
+        """
+        assign_time, merge = prepare_assign_time_merge(courier_id, list_orders)
+        if merge is not None:
+            yield self.db['orders'].update_many(**merge)
+        return assign_time
+
+    def close_assign(self, courier: dict) -> Steps[None]:
+        """
+        Завершает текущий развоз курьера и начисляет за него оплату, если в нём был выполнен хотя бы один заказ.
+
+        :param dict courier: курьер
+        """
+        update = closed_assign_update((yield from close_active_assign(self.db, courier['_id'])))
+        if update is not None:
+            yield self.db['couriers'].update_one(filter={'_id': courier['_id']}, update=update)
+
+    def unassign_invalid_orders(self, patched: list) -> Steps[None]:
+        """
+        Снимает с курьеров заказы в работе, которые перестали подходить после изменения их профилей.
+
+        Для всех курьеров выполняется не больше одного чтения заказов и одного обновления. Если изменились
+        только районы, заказы не читаются: районы проверяет сам запрос снятия заказов. С книгой заказов
+        снятые заказы нужно в неё вернуть, поэтому заказы читаются всегда.
+        :param list patched: пары из курьера после изменения и непустого результата changed_constraints
+        """
+        rechecked = couriers_to_recheck(patched, read_orders=self.order_book is not None)
+        list_orders = []
+        if rechecked:
+            list_orders = yield from find_orders_in_progress(self.db, {'$in': list(rechecked)}, ASSIGNED_ORDER_FIELDS)
+        unassign_filter, un_orders = plan_unassign(patched, rechecked, list_orders)
+        if unassign_filter is None:
+            return
+
+        db_response: UpdateResult = yield self.db['orders'].update_many(filter=unassign_filter, update=UNASSIGN_ORDERS)
+        if db_response.modified_count == 0:
+            return
+        if self.order_book is not None:
+            # Заказ, который параллельно успели выполнить, не назначится: его не пропустит условие по статусу
+            self.order_book.add(un_orders)
+        # Счётчики заказов в развозах пересчитываются одной агрегацией, развоз без заказов закрывается
+        active_couriers = [courier for courier, _ in patched if courier.get('active_assign') is not None]
+        if not active_couriers:
+            return
+        active_ids = [courier['_id'] for courier in active_couriers]
+        groups = yield Fetch(self.db['orders'].aggregate([
+            {'$match': {'status': 'in_progress', 'courier_id': {'$in': active_ids}}},
+            {'$group': {'_id': '$courier_id', 'count': {'$sum': 1}}}]))
+        outstanding = {group['_id']: group['count'] for group in groups}
+        yield self.db['couriers'].bulk_write([
+            UpdateOne({'_id': courier['_id'], 'active_assign': {'$ne': None}},
+                      {'$set': {'active_assign.outstanding': outstanding.get(courier['_id'], 0)}})
+            for courier in active_couriers], ordered=False)
+        for courier in active_couriers:
+            if courier['_id'] not in outstanding:
+                yield from self.close_assign(courier)
+
+    def add_couriers(self, couriers_data: dict) -> Steps[Response]:
+        with self.metrics.stage('validate'):
+            self.data_validator.validate_couriers(couriers_data)
+        with self.metrics.stage('prepare'):
+            data_to_insert = prepare_couriers(couriers_data)
+
+        failed_positions = yield from self.ingestion.insert(self.db['couriers'], data_to_insert)
+        if failed_positions:
+            # Остальные курьеры пакета вставлены, в ответе только те, которые вставить не удалось
+            raise ValidationError({'couriers': [{'id': data_to_insert[position]['_id']}
+                                                for position in failed_positions]})
+
+        couriers_list = []
+        for courier in couriers_data['data']:
+            couriers_list.append({'id': courier['courier_id']})
+        response = {'couriers': couriers_list}
+        return response, 201
+
+    def patch_couriers(self, patches_data: dict) -> Steps[Response]:
+        with self.metrics.stage('validate'):
+            self.data_validator.validate_couriers_patch(patches_data)
+        patches = {patch_data.pop('courier_id'): patch_data for patch_data in patches_data['data']}
+
+        couriers = yield from find_couriers(self.db, patches, PATCHED_COURIER_FIELDS)
+        couriers = yield from apply_courier_patches(self.db, couriers, patches)
+
+        patched = []
+        for courier_id, courier in couriers.items():
+            self.courier_cache.invalidate(courier_id)
+            changed = changed_constraints(courier, patches[courier_id])
+            courier.update(patches[courier_id])
+            if changed:
+                patched.append((courier, changed))
+        yield from self.unassign_invalid_orders(patched)
+
+        response = {'couriers': [format_courier(couriers[courier_id]) for courier_id in patches
+                                 if courier_id in couriers]}
+        errors = [{'id': courier_id} for courier_id in patches if courier_id not in couriers]
+        if errors:
+            response['errors'] = errors
+            return response, 400
+        return response, 201
+
+    def get_courier(self, courier_id: int) -> Steps[Response]:
+        courier = yield from find_courier(self.db, courier_id, COURIER_INFO_FIELDS, self.read_preference)
+        if courier is None:
+            raise PyMongoError('Courier with specified id not found')
+
+        response = format_courier(courier)
+        rating = courier_rating(courier.get('delivery_stats', {}))
+        if rating is not None:
+            response['rating'] = rating
+        response['earnings'] = courier_earnings(courier.get('completed_assigns', {}))
+        return response, 200
+
+    def patch_courier(self, courier_id: int, patch_data: dict) -> Steps[Response]:
+        with self.metrics.stage('validate'):
+            self.data_validator.validate_courier_patch(patch_data)
+
+        courier: dict = yield self.db['couriers'].find_one_and_update(
+            filter={'_id': courier_id}, update={'$set': patch_data}, projection=PATCHED_COURIER_FIELDS,
+            return_document=ReturnDocument.BEFORE)
+        if courier is None:
+            raise PyMongoError('Courier with specified id not found')
+        self.courier_cache.invalidate(courier_id)
+        changed = changed_constraints(courier, patch_data)
+        courier.update(patch_data)
+        if changed:
+            yield from self.unassign_invalid_orders([(courier, changed)])
+
+        return format_courier(courier), 201
+
+    def add_orders(self, orders_data: dict) -> Steps[Response]:
+        with self.metrics.stage('validate'):
+            self.data_validator.validate_orders(orders_data)
+        with self.metrics.stage('prepare'):
+            data_to_insert = prepare_orders(orders_data)
+
+        failed_positions = yield from self.ingestion.insert(self.db['orders'], data_to_insert)
+        if self.order_book is not None:
+            failed = set(failed_positions)
+            self.order_book.add(order for position, order in enumerate(data_to_insert) if position not in failed)
+        if failed_positions:
+            # Остальные заказы пакета вставлены, в ответе только те, которые вставить не удалось
+            raise ValidationError({'orders': [{'id': data_to_insert[position]['_id']}
+                                              for position in failed_positions]})
+
+        orders_list = []
+        for order in orders_data['data']:
+            orders_list.append({'id': order['order_id']})
+        response = {'orders': orders_list}
+        return response, 201
+
+    def assign_orders(self, assign_id_data: dict, session: Optional[ClientSession] = None) -> Steps[Response]:
+        """
+        :param dict assign_id_data: тело запроса
+        :param ClientSession session: причинно согласованная сессия, в которой выигранные заказы
+            перечитываются после записи, если чтения направляются на реплики
+        """
+        with self.metrics.stage('validate'):
+            self.data_validator.validate_assign(assign_id_data)
+
+        courier = yield from self.courier_cache.fetch(assign_id_data['courier_id'])
+        if courier is None:
+            raise PyMongoError('Courier with specified id not found')
+
+        max_weight = courier_capacity(courier['courier_type'])
+        matching_orders = {
+            'status': 'not_assigned',
+            'weight': {'$lte': max_weight},
+            'region': {'$in': courier['regions']},
+        }
+        # Повторный запрос занятого курьера читает только его заказы в работе, свободные заказы
+        # читаются, только если назначать нечего
+        list_orders = yield from find_orders_in_progress(self.db, courier['_id'])
+        if len(list_orders):
+            assign_time = list_orders[0]['assign_time']
+        else:
+            if self.order_book is not None and self.order_book.ready:
+                with self.metrics.stage('order_book'):
+                    av_orders = self.order_book.candidates(courier['regions'], courier['working_hours'], max_weight)
+            else:
+                free_orders = yield from find_free_orders(self.db, matching_orders)
+                with self.metrics.stage('split_orders'):
+                    av_orders, _ = split_orders(free_orders, courier['working_hours'])
+            with self.metrics.stage('select_orders'):
+                av_orders = select_orders(av_orders, max_weight)
+            if len(av_orders) == 0:
+                return {'orders': []}, 201
+            assign_time = datetime.utcnow().isoformat("T") + "Z"  # <-- get time in UTC
+            update_data = prepare_assign(courier['_id'], assign_time)
+            av_order_ids = list(map(lambda x: x['_id'], av_orders))
+            # Заказ достаётся только тому, кто первым сменил его статус: заказы, которые параллельно
+            # назначил другой процесс, условию по статусу уже не соответствуют
+            db_response: UpdateResult = yield self.db['orders'].update_many(
+                filter={'_id': {'$in': av_order_ids}, 'status': 'not_assigned'}, update=update_data,
+                session=session)
+            if self.order_book is not None:
+                # Ни один из выбранных заказов больше не свободен: их забрал этот или параллельный запрос
+                self.order_book.remove(av_order_ids)
+            if db_response.modified_count == len(av_order_ids):
+                list_orders = av_orders
+            else:
+                # Часть заказов забрали параллельные запросы, поэтому выигранные заказы перечитываются
+                list_orders = yield from find_orders_in_progress(self.db, courier['_id'],
+                                                                 read_preference=self.read_preference, session=session)
+                if len(list_orders) == 0:
+                    return {'orders': []}, 201
+                assign_time = yield from self.merge_assign_time(courier['_id'], list_orders)
+            if db_response.modified_count:
+                yield self.db['couriers'].update_one(
+                    filter={'_id': courier['_id']},
+                    update=prepare_active_assign(courier, assign_time, db_response.modified_count))
+        orders_id = []
+        for order in list_orders:
+            orders_id.append({'id': order['_id']})
+        response = {'orders': orders_id, 'assign_time': assign_time}
+        return response, 201
+
+    def assign_orders_batch(self, assign_batch_data: dict,
+                            session: Optional[ClientSession] = None) -> Steps[Response]:
+        with self.metrics.stage('validate'):
+            self.data_validator.validate_assign_batch(assign_batch_data)
+        courier_ids = assign_batch_data['courier_ids']
+
+        couriers = list((yield from self.courier_cache.fetch_many(courier_ids)).values())
+        if len(couriers) != len(courier_ids):
+            raise PyMongoError('Courier with specified id not found')
+
+        orders_by_courier = defaultdict(list)
+        for order in (yield from find_orders_in_progress(self.db, {'$in': courier_ids})):
+            orders_by_courier[order['courier_id']].append(order)
+        assign_times = {courier_id: orders[0]['assign_time'] for courier_id, orders in orders_by_courier.items()}
+
+        free_couriers = [courier for courier in couriers if courier['_id'] not in orders_by_courier]
+        # Свободные заказы читаются одним запросом и только для курьеров пакета без заказов в работе
+        free_orders = []
+        if free_couriers:
+            max_weight = max(courier_capacity(courier['courier_type']) for courier in free_couriers)
+            regions = list({region for courier in free_couriers for region in courier['regions']})
+            if self.order_book is not None and self.order_book.ready:
+                with self.metrics.stage('order_book'):
+                    free_orders = self.order_book.find(regions, max_weight)
+            else:
+                free_orders = yield from find_free_orders(self.db, {
+                    'status': 'not_assigned',
+                    'weight': {'$lte': max_weight},
+                    'region': {'$in': regions},
+                })
+        with self.metrics.stage('plan_assignments'):
+            plan = {courier_id: orders for courier_id, orders in plan_assignments(free_couriers, free_orders).items()
+                    if len(orders)}
+        if len(plan):
+            assign_time = datetime.utcnow().isoformat("T") + "Z"  # <-- get time in UTC
+            requests = []
+            for courier_id, orders in plan.items():
+                requests.append(UpdateMany(
+                    filter={'_id': {'$in': [order['_id'] for order in orders]}, 'status': 'not_assigned'},
+                    update=prepare_assign(courier_id, assign_time)))
+            db_response: BulkWriteResult = yield self.db['orders'].bulk_write(requests, ordered=False, session=session)
+            if self.order_book is not None:
+                self.order_book.remove(order['_id'] for orders in plan.values() for order in orders)
+            if db_response.modified_count == sum(len(orders) for orders in plan.values()):
+                orders_by_courier.update(plan)
+                assign_times.update((courier_id, assign_time) for courier_id in plan)
+                claimed = {courier_id: len(orders) for courier_id, orders in plan.items()}
+            else:
+                # Часть заказов забрали параллельные запросы, поэтому выигранные заказы перечитываются
+                orders_by_courier = defaultdict(list)
+                for order in (yield from find_orders_in_progress(self.db, {'$in': courier_ids},
+                                                                 read_preference=self.read_preference,
+                                                                 session=session)):
+                    orders_by_courier[order['courier_id']].append(order)
+                # Заказы, назначенные этим запросом, отличаются временем назначения
+                claimed = {courier_id: sum(order['assign_time'] == assign_time for order in orders)
+                           for courier_id, orders in orders_by_courier.items()}
+                assign_times = {}
+                for courier_id, orders in orders_by_courier.items():
+                    assign_times[courier_id] = yield from self.merge_assign_time(courier_id, orders)
+            couriers_requests = [UpdateOne(filter={'_id': courier['_id']}, update=prepare_active_assign(
+                                     courier, assign_times[courier['_id']], claimed[courier['_id']]))
+                                 for courier in free_couriers if claimed.get(courier['_id'])]
+            if len(couriers_requests):
+                yield self.db['couriers'].bulk_write(couriers_requests, ordered=False)
+
+        couriers_list = []
+        for courier_id in courier_ids:
+            courier_response = {'courier_id': courier_id,
+                                'orders': [{'id': order['_id']} for order in orders_by_courier.get(courier_id, [])]}
+            if courier_id in assign_times:
+                courier_response['assign_time'] = assign_times[courier_id]
+            couriers_list.append(courier_response)
+        return {'couriers': couriers_list}, 201
+
+    def complete_order(self, complete_data: dict) -> Steps[Response]:
+        with self.metrics.stage('validate'):
+            self.data_validator.validate_complete(complete_data)
+
+        courier = yield from self.courier_cache.fetch(complete_data['courier_id'])
+        if courier is None:
+            raise PyMongoError('Courier with specified id not found')
+
+        db_response: dict = yield from mark_order_completed(self.db, complete_data['order_id'],
+                                                            complete_data['courier_id'],
+                                                            complete_data['complete_time'])
+        if db_response is None:
+            filter_data = {
+                '_id': complete_data['order_id'],
+                'courier_id': complete_data['courier_id'],
+                'status': 'completed'
+            }
+            if not (yield from order_exists(self.db, filter_data, self.read_preference)):
+                raise PyMongoError('Order with specified id not found')
+            return {'order_id': complete_data['order_id']}, 201
+        # Длительность доставки отсчитывается от предыдущего выполненного заказа развоза,
+        # а для первого заказа от времени назначения
+        complete_time = to_utc(complete_data['complete_time'])
+
+        def update_courier(courier: dict) -> dict:
+            active_assign = courier.get('active_assign') or {}
+            duration = delivery_duration(complete_time, active_assign.get('last_complete_time'),
+                                         db_response['assign_time'])
+            return completion_update(courier, db_response['region'], duration, complete_time)
+
+        courier = yield from record_completion(self.db, courier['_id'], update_courier)
+        if courier is None:
+            raise PyMongoError('Courier with specified id not found')
+        active_assign = courier.get('active_assign') or {}
+
+        # У развозов, начатых до появления счётчика заказов, окончание проверяется по заказам в работе
+        if active_assign.get('outstanding', 0) < 1 and not (yield from order_exists(
+                self.db, {'courier_id': courier['_id'], 'status': 'in_progress'})):
+            yield from self.close_assign(courier)
+
+        return {'order_id': db_response['_id']}, 201
+
+    def complete_orders_batch(self, complete_batch_data: dict) -> Steps[Response]:
+        with self.metrics.stage('validate'):
+            self.data_validator.validate_complete_batch(complete_batch_data)
+        completions = complete_batch_data['data']
+
+        couriers = yield from find_couriers(self.db, {item['courier_id'] for item in completions}, {'active_assign': 1})
+        orders = yield from find_orders(self.db, [item['order_id'] for item in completions], COMPLETED_ORDER_FIELDS)
+
+        # Заказы, уже выполненные этим курьером, считаются выполненными повторно, как в complete_order
+        completed: Dict[int, List[tuple]] = defaultdict(list)
+        order_ids = []
+        errors = []
+        for item in completions:
+            order = orders.get(item['order_id'])
+            if item['courier_id'] not in couriers or order is None or order['courier_id'] != item['courier_id'] \
+                    or order['status'] not in ('in_progress', 'completed'):
+                errors.append({'id': item['order_id']})
+                continue
+            order_ids.append({'id': item['order_id']})
+            if order['status'] == 'in_progress':
+                completed[item['courier_id']].append((to_utc(item['complete_time']), item, order))
+
+        if completed:
+            # Метка запроса отличает заказы, которые отметил этот запрос, от отмеченных параллельно
+            batch_id = ObjectId()
+            db_response: BulkWriteResult = yield self.db['orders'].bulk_write([
+                UpdateOne({'_id': order['_id'], 'courier_id': courier_id, 'status': 'in_progress'},
+                          {'$set': {'complete_time': item['complete_time'], 'status': 'completed',
+                                    'complete_batch': batch_id}})
+                for courier_id, items in completed.items() for _, item, order in items], ordered=False)
+            if db_response.modified_count < sum(len(items) for items in completed.values()):
+                # Между чтением и записью часть заказов отметили выполненными другие запросы:
+                # в статистике курьера учитываются только заказы, отмеченные этим запросом
+                completed_ids = [order['_id'] for items in completed.values() for _, _, order in items]
+                marked = {order['_id'] for order in (yield Fetch(self.db['orders'].find(
+                    filter={'_id': {'$in': completed_ids}, 'complete_batch': batch_id}, projection={'_id': 1})))}
+                completed = {courier_id: [completion for completion in items if completion[2]['_id'] in marked]
+                             for courier_id, items in completed.items()}
+                completed = {courier_id: items for courier_id, items in completed.items() if items}
+
+        if completed:
+            # Выполнения одного курьера учитываются в порядке времени, как при последовательных запросах
+            requests = []
+            for courier_id, items in completed.items():
+                items.sort(key=lambda completion: completion[0])
+                previous_time = (couriers[courier_id].get('active_assign') or {}).get('last_complete_time')
+                increments = defaultdict(int, {'active_assign.completed': len(items),
+                                               'active_assign.outstanding': -len(items)})
+                for complete_time, _, order in items:
+                    duration = delivery_duration(complete_time, previous_time, order['assign_time'])
+                    region = region_key(order['region'])
+                    increments[f'delivery_stats.{region}.sum'] += duration
+                    increments[f'delivery_stats.{region}.count'] += 1
+                    previous_time = complete_time if previous_time is None else max(to_utc(previous_time),
+                                                                                    complete_time)
+                requests.append(UpdateOne({'_id': courier_id},
+                                          {'$max': {'active_assign.last_complete_time': previous_time},
+                                           '$inc': dict(increments)}))
+            yield self.db['couriers'].bulk_write(requests, ordered=False)
+
+            # Курьеры, у которых остались заказы в работе, находятся одной агрегацией
+            busy_ids = {group['_id'] for group in (yield Fetch(self.db['orders'].aggregate([
+                {'$match': {'status': 'in_progress', 'courier_id': {'$in': list(completed)}}},
+                {'$group': {'_id': '$courier_id'}}])))}
+            for courier_id in completed:
+                if courier_id not in busy_ids:
+                    yield from self.close_assign(couriers[courier_id])
+
+        response = {'orders': order_ids}
+        if errors:
+            response['errors'] = errors
+            return response, 400
+        return response, 201
@@ -0,0 +1,231 @@
+import json
+import logging
+import os
+import threading
+from concurrent.futures import Executor, ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import ASCENDING, ReturnDocument
+from pymongo.database import Database
+
+from application.data_validator import DataValidator
+from application.ingestion import CHUNK_SIZE, ingest_chunk
+from application.order_book import OrderBook
+from application.steps import run
+from utils.preparer import prepare_orders
+
+logger = logging.getLogger(__name__)
+
+# Сколько ошибок хранится в описании задачи, остальные только подсчитываются
+MAX_REPORTED_ERRORS = 1000
+
+# На сколько секунд процесс захватывает задачу; захват продлевается после каждой пачки. Задачу процесса,
+# который завершился во время обработки, после окончания захвата продолжает другой процесс
+LEASE_SECONDS = 60
+
+# Ограничение на размер сохраняемой пачки в байтах с запасом до предельного размера документа монго (16 МБ).
+# Объект, который больше ограничения, не сохраняется и учитывается как ошибка
+MAX_CHUNK_BYTES = 4 * 1024 * 1024
+
+
+def encode_chunks(items: Iterable[Tuple[int, object]]) -> Iterator[List[Tuple[int, Optional[str]]]]:
+    """
+    Кодирует объекты в JSON и делит их на пачки не больше CHUNK_SIZE объектов и MAX_CHUNK_BYTES байт.
+
+    Объекты хранятся строками, поэтому ключи с $ и точками не мешают сохранению пачки; такие объекты
+    не проходят проверку при обработке и попадают в ошибки. Вместо слишком большого объекта сохраняется None.
+    :param items: пары из номера объекта во входных данных и самого объекта
+    :return: пачки пар из номера объекта и его JSON
+    """
+    chunk = []
+    chunk_bytes = 0
+    for line_number, item in items:
+        encoded = json.dumps(item, ensure_ascii=False)
+        size = len(encoded.encode())
+        if size > MAX_CHUNK_BYTES:
+            encoded = None
+            size = 0
+        if chunk and (len(chunk) >= CHUNK_SIZE or chunk_bytes + size > MAX_CHUNK_BYTES):
+            yield chunk
+            chunk = []
+            chunk_bytes = 0
+        chunk.append((line_number, encoded))
+        chunk_bytes += size
+    if chunk:
+        yield chunk
+
+
+def decode_chunk(chunk: dict) -> List[Tuple[int, object]]:
+    # Пачки, сохранённые до кодирования объектов, хранят объекты как есть
+    if not chunk.get('encoded'):
+        return chunk['items']
+    return [(line_number, json.loads(item) if item is not None else None) for line_number, item in chunk['items']]
+
+
+def create_import_job(db: Database, items: Iterable[Tuple[int, object]]) -> ObjectId:
+    """
+    Сохраняет загружаемые заказы пачками и создаёт задачу импорта.
+
+    :param Database db: база данных сервиса
+    :param items: пары из номера объекта во входных данных и самого объекта
+    :return: идентификатор задачи
+    :rtype: ObjectId
+    """
+    import_id = ObjectId()
+    total = 0
+    chunks = 0
+    for chunk in encode_chunks(items):
+        db['import_chunks'].insert_one({'import_id': import_id, 'seq': chunks, 'encoded': True, 'items': chunk})
+        total += len(chunk)
+        chunks += 1
+    db['imports'].insert_one({
+        '_id': import_id,
+        'kind': 'orders',
+        'status': 'pending',
+        'total': total,
+        'chunks': chunks,
+        'processed': 0,
+        'next_seq': 0,
+        'inserted': 0,
+        'errors_count': 0,
+        'errors': [],
+        'created_at': datetime.utcnow(),
+        'started_at': None,
+        'finished_at': None,
+        'lease_owner': None,
+        'locked_until': None,
+    })
+    return import_id
+
+
+def lease_expired(job: dict) -> bool:
+    return job['status'] == 'running' and job.get('locked_until') is not None \
+        and job['locked_until'] < datetime.utcnow()
+
+
+def format_import_job(job: dict) -> dict:
+    """
+    Формирует ответ о состоянии задачи импорта.
+
+    Пропускная способность считается как число обработанных объектов в секунду с момента начала обработки.
+    :param dict job: задача импорта
+    :return: состояние задачи
+    :rtype: dict
+    """
+    throughput = None
+    if job['started_at'] is not None:
+        seconds = ((job['finished_at'] or datetime.utcnow()) - job['started_at']).total_seconds()
+        throughput = round(job['processed'] / seconds, 2) if seconds > 0 else None
+    return {'id': str(job['_id']),
+            'status': job['status'],
+            'total': job['total'],
+            'processed': job['processed'],
+            'inserted': job['inserted'],
+            'throughput': throughput,
+            'errors_count': job['errors_count'],
+            'errors': job['errors']}
+
+
+class ImportWorker(object):
+    """
+    Пул фоновой обработки задач импорта.
+
+    Задачи хранятся в монго, поэтому их может взять любой процесс сервиса: задача переводится
+    из статуса pending в running одним атомарным обновлением вместе с захватом на LEASE_SECONDS.
+    Задачу в статусе running с истёкшим захватом продолжает следующий процесс: пачки обрабатываются
+    по порядку, а номер следующей пачки меняется вместе со счётчиками, поэтому каждая пачка учитывается один раз.
+    Заказы помечаются идентификатором задачи и номером объекта, поэтому заказы пачки, вставленные прежним
+    владельцем, при повторной обработке считаются вставленными, а не ошибками.
+
+    Если исполнитель не передан, пул потоков создаётся в каждом процессе при первой задаче: потоки пула,
+    созданного до форка, в воркере не работают.
+    """
+
+    def __init__(self, db: Database, data_validator: DataValidator, executor: Optional[Executor] = None,
+                 order_book: Optional[OrderBook] = None):
+        self.db = db
+        self.data_validator = data_validator
+        self.order_book = order_book
+        self._executor = executor
+        self._pool = None
+        self._pool_pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is not None:
+            return self._executor
+        with self._lock:
+            if self._pool_pid != os.getpid():
+                self._pool = ThreadPoolExecutor(max_workers=2)
+                self._pool_pid = os.getpid()
+            return self._pool
+
+    def submit(self):
+        self.executor.submit(self.process_pending)
+
+    def claim(self) -> Optional[dict]:
+        """
+        Захватывает самую старую задачу в очереди или задачу, захват которой истёк.
+
+        :return: задача или None, если обрабатывать нечего
+        :rtype: Optional[dict]
+        """
+        now = datetime.utcnow()
+        job = self.db['imports'].find_one_and_update(
+            filter={'$or': [{'status': 'pending'}, {'status': 'running', 'locked_until': {'$lt': now}}]},
+            update={'$set': {'status': 'running', 'lease_owner': ObjectId(),
+                             'locked_until': now + timedelta(seconds=LEASE_SECONDS)}},
+            sort=[('created_at', ASCENDING)],
+            return_document=ReturnDocument.AFTER)
+        if job is not None and job['started_at'] is None:
+            self.db['imports'].update_one({'_id': job['_id']}, {'$set': {'started_at': now}})
+            job['started_at'] = now
+        return job
+
+    def process_pending(self):
+        while True:
+            job = self.claim()
+            if job is None:
+                return
+            try:
+                self.process_job(job)
+            except Exception as e:
+                logger.exception('Import %s failed', job['_id'])
+                self.db['imports'].update_one(
+                    {'_id': job['_id'], 'lease_owner': job['lease_owner']},
+                    {'$set': {'status': 'failed', 'message': str(e), 'finished_at': datetime.utcnow()}})
+
+    def process_job(self, job: dict):
+        owner = {'_id': job['_id'], 'lease_owner': job['lease_owner']}
+        next_seq = job.get('next_seq')
+        if next_seq is None:
+            # У задач, созданных до появления захвата, номера следующей пачки нет
+            next_seq = 0
+            self.db['imports'].update_one(owner, {'$set': {'next_seq': next_seq}})
+        # Пачки, учтённые предыдущим владельцем, могли остаться, если он завершился до их удаления
+        self.db['import_chunks'].delete_many({'import_id': job['_id'], 'seq': {'$lt': next_seq}})
+        for seq in range(next_seq, job['chunks']):
+            chunk = self.db['import_chunks'].find_one({'import_id': job['_id'], 'seq': seq})
+            # Пачки нет, если её уже учли и удалили
+            items = decode_chunk(chunk) if chunk is not None else []
+            inserted, errors = run(ingest_chunk(items, self.db['orders'], self.data_validator.validate_orders_chunk,
+                                                prepare_orders, 'order_id', source={'import_id': job['_id']}))
+            if self.order_book is not None:
+                self.order_book.refresh([order['id'] for order in inserted])
+            db_response = self.db['imports'].update_one(
+                {**owner, 'next_seq': seq},
+                {'$inc': {'processed': len(items), 'inserted': len(inserted), 'errors_count': len(errors)},
+                 '$push': {'errors': {'$each': errors, '$slice': MAX_REPORTED_ERRORS}},
+                 '$set': {'next_seq': seq + 1,
+                          'locked_until': datetime.utcnow() + timedelta(seconds=LEASE_SECONDS)}})
+            if db_response.matched_count == 0:
+                # Захват истёк, и задачу продолжил другой процесс
+                logger.warning('Import %s lease lost', job['_id'])
+                return
+            if chunk is not None:
+                self.db['import_chunks'].delete_one({'_id': chunk['_id']})
+        self.db['imports'].update_one(
+            owner, {'$set': {'status': 'completed', 'finished_at': datetime.utcnow(), 'locked_until': None}})
@@ -0,0 +1,97 @@
+import os
+import sys
+from typing import Iterator, List
+
+from pymongo import ASCENDING, IndexModel
+from pymongo.database import Database
+
+# Индексы под запросы обработчиков из application/service.py
+INDEXES = {
+    'orders': [
+        # Заказы курьера в работе и выполненные заказы курьера
+        IndexModel([('courier_id', ASCENDING), ('status', ASCENDING)], name='courier_id_status'),
+        # Поиск свободных заказов для назначения
+        IndexModel([('region', ASCENDING), ('weight', ASCENDING)], name='not_assigned_region_weight',
+                   partialFilterExpression={'status': 'not_assigned'}),
+    ],
+    'import_chunks': [
+        # Пачки задачи импорта по порядку
+        IndexModel([('import_id', ASCENDING), ('seq', ASCENDING)], name='import_id_seq'),
+    ],
+}
+
+# Запросы обработчиков с характерными значениями параметров, используются для проверки планов
+ROUTE_QUERIES = [
+    ('POST /orders/assign: orders in progress', 'orders', {'status': 'in_progress', 'courier_id': 1}),
+    ('POST /orders/assign: matching orders', 'orders',
+     {'status': 'not_assigned', 'weight': {'$lte': 50}, 'region': {'$in': [1, 2, 3]}}),
+    ('POST /orders/assign: courier', 'couriers', {'_id': 1}),
+    ('POST /orders/assign/batch: orders in progress', 'orders',
+     {'status': 'in_progress', 'courier_id': {'$in': [1, 2]}}),
+    ('POST /orders/assign/batch: couriers', 'couriers', {'_id': {'$in': [1, 2]}}),
+    ('PATCH /couriers: orders in progress', 'orders', {'status': 'in_progress', 'courier_id': {'$in': [1, 2]}}),
+    ('PATCH /couriers: orders to unassign', 'orders',
+     {'status': 'in_progress', '$or': [{'courier_id': 1, 'region': {'$nin': [1, 2]}}, {'_id': {'$in': [1, 2]}}]}),
+    ('POST /orders/complete: completed order', 'orders', {'_id': 1, 'status': 'completed'}),
+    ('POST /orders/complete: order of courier', 'orders', {'_id': 1, 'courier_id': 1, 'status': 'in_progress'}),
+    ('POST /orders/complete: courier orders count', 'orders', {'courier_id': 1, 'status': 'in_progress'}),
+]
+
+
+def ensure_indexes(db: Database):
+    """
+    Создаёт индексы, необходимые обработчикам сервиса.
+
+    Операция идемпотентна: уже существующие индексы с теми же параметрами не пересоздаются.
+    :param Database db: база данных сервиса
+    """
+    for collection_name, indexes in INDEXES.items():
+        db[collection_name].create_indexes(indexes)
+
+
+def _plan_stages(plan: dict) -> Iterator[str]:
+    if 'queryPlan' in plan:
+        plan = plan['queryPlan']
+    yield plan['stage']
+    if 'inputStage' in plan:
+        yield from _plan_stages(plan['inputStage'])
+    for stage in plan.get('inputStages', []):
+        yield from _plan_stages(stage)
+
+
+def explain_route_queries(db: Database) -> List[dict]:
+    """
+    Строит планы выполнения всех запросов из ROUTE_QUERIES.
+
+    :param Database db: база данных сервиса
+    :return: список из описаний запросов, стадий выигравшего плана и признака полного сканирования
+    :rtype: List[dict]
+    """
+    result = []
+    for route, collection_name, query in ROUTE_QUERIES:
+        explanation = db[collection_name].find(query).explain()
+        stages = list(_plan_stages(explanation['queryPlanner']['winningPlan']))
+        result.append({'route': route, 'collection': collection_name, 'query': query,
+                       'stages': stages, 'collscan': 'COLLSCAN' in stages})
+    return result
+
+
+def main():
+    from application.custom_mongo_client import ConnectionManager
+
+    connections = ConnectionManager.from_environ(os.environ)
+    connections.initiate_replica_set()
+    db = connections.database(os.environ['DATABASE_NAME'])
+    ensure_indexes(db)
+    plans = explain_route_queries(db)
+    for plan in plans:
+        print(f"{plan['route']}\n    {plan['collection']}.find({plan['query']})\n    {' <- '.join(plan['stages'])}")
+    collscans = [plan['route'] for plan in plans if plan['collscan']]
+    if collscans:
+        print('COLLSCAN found: ' + ', '.join(collscans))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
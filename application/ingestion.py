@@ -0,0 +1,220 @@
+import json
+from itertools import islice
+from typing import Callable, Iterable, Iterator, List, Mapping, Optional, Tuple, Union
+
+from pymongo.collection import Collection
+from pymongo.errors import BulkWriteError, PyMongoError
+from pymongo.write_concern import WriteConcern
+
+from application.steps import Fetch, Steps, run
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+# Размер пачки, которая проверяется, подготавливается и вставляется за один раз
+CHUNK_SIZE = 1000
+
+
+def iter_ndjson(lines: Iterable[bytes], loads: Callable = json.loads,
+                start: int = 1) -> Iterator[Tuple[int, object]]:
+    """
+    Разбирает поток в формате NDJSON построчно.
+
+    :param lines: строки потока
+    :param loads: функция разбора одной строки JSON
+    :param int start: номер первой строки
+    :return: пары из номера строки и разобранного объекта; для строк с некорректным JSON объект равен None
+    """
+    for line_number, line in enumerate(lines, start=start):
+        if not line.strip():
+            continue
+        try:
+            yield line_number, loads(line)
+        except ValueError:
+            yield line_number, None
+
+
+def iter_chunks(items: Iterable, chunk_size: int) -> Iterator[list]:
+    iterator = iter(items)
+    chunk = list(islice(iterator, chunk_size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(iterator, chunk_size))
+
+
+def insert_unordered(collection: Collection, documents: List[dict]) -> Steps[List[int]]:
+    """
+    Вставляет документы без остановки на первой ошибке.
+
+    :param Collection collection: коллекция для вставки
+    :param List[dict] documents: документы
+    :return: позиции документов, которые не удалось вставить
+    :rtype: List[int]
+    """
+    if not documents:
+        return []
+    try:
+        yield collection.insert_many(documents, ordered=False)
+    except BulkWriteError as e:
+        return [error['index'] for error in e.details['writeErrors']]
+    return []
+
+
+class IngestionMode(object):
+    """
+    Режим вставки пакетов POST /couriers и POST /orders.
+
+    В упорядоченном режиме (по умолчанию) пакет вставляется одним insert_many: первый повторяющийся
+    идентификатор прерывает вставку, и обработчик отвечает ошибкой базы данных. В неупорядоченном режиме
+    пакет вставляется пачками по chunk_size без остановки на ошибках, а обработчик возвращает
+    идентификаторы, которые не удалось вставить, в формате ошибок проверки данных.
+    """
+
+    def __init__(self, ordered: bool = True, chunk_size: int = None,
+                 write_concern: Optional[Union[int, str]] = None):
+        """
+        :param bool ordered: вставлять пакет одним упорядоченным insert_many
+        :param int chunk_size: размер пачки в неупорядоченном режиме, по умолчанию CHUNK_SIZE
+        :param write_concern: w для вставки, например 1 или 'majority', None - настройка клиента
+        """
+        self.ordered = ordered
+        self.chunk_size = chunk_size
+        self.write_concern = write_concern
+
+    @classmethod
+    def from_environ(cls, environ: Mapping[str, str]) -> 'IngestionMode':
+        """
+        Создаёт режим по переменным окружения INGEST_MODE (ordered или unordered),
+        INGEST_CHUNK_SIZE и INGEST_WRITE_CONCERN (1 или majority).
+
+        :param environ: переменные окружения
+        :rtype: IngestionMode
+        """
+        chunk_size = environ.get('INGEST_CHUNK_SIZE')
+        write_concern = environ.get('INGEST_WRITE_CONCERN') or None
+        if write_concern is not None and write_concern != 'majority':
+            write_concern = int(write_concern)
+        return cls(ordered=environ.get('INGEST_MODE', 'ordered') != 'unordered',
+                   chunk_size=int(chunk_size) if chunk_size else None, write_concern=write_concern)
+
+    def target(self, collection: Collection) -> Collection:
+        """
+        Возвращает коллекцию для вставки с write concern режима.
+
+        :param Collection collection: коллекция
+        :rtype: Collection
+        """
+        if self.write_concern is None:
+            return collection
+        return collection.with_options(write_concern=WriteConcern(w=self.write_concern))
+
+    def insert(self, collection: Collection, documents: List[dict]) -> Steps[List[int]]:
+        """
+        Вставляет пакет документов.
+
+        :param Collection collection: коллекция для вставки
+        :param List[dict] documents: документы
+        :return: позиции документов, которые не удалось вставить; в упорядоченном режиме ошибка вставки
+            выбрасывается исключением
+        :rtype: List[int]
+        """
+        collection = self.target(collection)
+        if self.ordered:
+            if not (yield collection.insert_many(documents)).acknowledged:
+                raise PyMongoError('Operation was not acknowledged')
+            return []
+        chunk_size = self.chunk_size or CHUNK_SIZE
+        failed_positions = []
+        for start in range(0, len(documents), chunk_size):
+            chunk_failed = yield from insert_unordered(collection, documents[start:start + chunk_size])
+            failed_positions.extend(start + position for position in chunk_failed)
+        return failed_positions
+
+
+def inserted_before(collection: Collection, documents: List[dict], positions: Iterable[int]) -> Steps[List[int]]:
+    """
+    Находит документы, которые уже вставлены с той же меткой источника.
+
+    :param Collection collection: коллекция для вставки
+    :param List[dict] documents: документы с меткой источника в поле source
+    :param positions: позиции документов, которые не удалось вставить
+    :return: позиции документов, вставленных прежде
+    :rtype: List[int]
+    """
+    positions = list(positions)
+    found = yield Fetch(collection.find({'_id': {'$in': [documents[position]['_id'] for position in positions]}},
+                                        {'source': 1}))
+    sources = {document['_id']: document.get('source') for document in found}
+    return [position for position in positions
+            if sources.get(documents[position]['_id']) == documents[position]['source']]
+
+
+def ingest_chunk(chunk: List[Tuple[int, object]], collection: Collection, validate_chunk: Callable,
+                 prepare: Callable, id_field: str,
+                 source: Optional[dict] = None) -> Steps[Tuple[List[dict], List[dict]]]:
+    """
+    Проверяет, подготавливает и вставляет одну пачку объектов.
+
+    :param chunk: пары из номера строки и объекта; для строк с некорректным JSON объект равен None
+    :param Collection collection: коллекция для вставки
+    :param validate_chunk: функция, разделяющая пачку на корректные и некорректные объекты
+    :param prepare: функция, подготавливающая объекты к вставке
+    :param str id_field: поле с идентификатором объекта
+    :param Optional[dict] source: метка загрузки; документы помечаются ею вместе с номером строки, и при повторной
+        обработке пачки документы, вставленные с той же меткой и строкой, не считаются ошибками
+    :return: списки идентификаторов вставленных объектов и ошибок, упорядоченных по номеру строки
+    :rtype: Tuple[List[dict], List[dict]]
+    """
+    line_numbers = {}
+    items = []
+    errors = []
+    for line_number, item in chunk:
+        if isinstance(item, dict):
+            items.append(item)
+            line_numbers[id(item)] = line_number
+        else:
+            errors.append({'id': None, 'line': line_number})
+
+    valid_items, invalid_items = validate_chunk(items)
+    errors.extend({'id': item.get(id_field), 'line': line_numbers[id(item)]} for item in invalid_items)
+
+    inserted = []
+    documents = prepare({'data': valid_items})
+    if source is not None:
+        for document, item in zip(documents, valid_items):
+            document['source'] = {**source, 'line': line_numbers[id(item)]}
+    failed_positions = set((yield from insert_unordered(collection, documents)))
+    if failed_positions and source is not None:
+        failed_positions.difference_update((yield from inserted_before(collection, documents, failed_positions)))
+    for position, item in enumerate(valid_items):
+        if position in failed_positions:
+            errors.append({'id': item[id_field], 'line': line_numbers[id(item)]})
+        else:
+            inserted.append({'id': item[id_field]})
+    errors.sort(key=lambda error: error['line'])
+    return inserted, errors
+
+
+def ingest_ndjson(lines: Iterable[bytes], collection: Collection, validate_chunk: Callable,
+                  prepare: Callable, id_field: str, chunk_size: int = None,
+                  loads: Callable = json.loads) -> Tuple[List[dict], List[dict]]:
+    """
+    Загружает объекты из потока NDJSON пачками ограниченного размера.
+
+    В памяти одновременно находится не больше одной пачки объектов.
+    :param lines: строки потока
+    :param Collection collection: коллекция для вставки
+    :param validate_chunk: функция, разделяющая пачку на корректные и некорректные объекты
+    :param prepare: функция, подготавливающая объекты к вставке
+    :param str id_field: поле с идентификатором объекта
+    :param int chunk_size: размер пачки, по умолчанию CHUNK_SIZE
+    :param loads: функция разбора одной строки JSON
+    :return: списки идентификаторов вставленных объектов и ошибок
+    :rtype: Tuple[List[dict], List[dict]]
+    """
+    inserted = []
+    errors = []
+    for chunk in iter_chunks(iter_ndjson(lines, loads), chunk_size or CHUNK_SIZE):
+        chunk_inserted, chunk_errors = run(ingest_chunk(chunk, collection, validate_chunk, prepare, id_field))
+        inserted.extend(chunk_inserted)
+        errors.extend(chunk_errors)
+    return inserted, errors
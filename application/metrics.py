@@ -0,0 +1,293 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from pymongo import monitoring
+
+PROMETHEUS_MIMETYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Границы корзин гистограмм в секундах: от долей миллисекунды для этапов до секунд для медленных запросов
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Как часто процесс сохраняет свои метрики для объединения с метриками других процессов, в секундах
+SNAPSHOT_INTERVAL = 5
+
+# Снимок, который не обновлялся столько секунд, принадлежит завершившемуся процессу и удаляется
+SNAPSHOT_TTL = 3 * SNAPSHOT_INTERVAL
+
+ROUTE_METRIC = 'http_request_duration_seconds'
+STAGE_METRIC = 'http_request_stage_duration_seconds'
+MONGO_METRIC = 'mongo_command_duration_seconds'
+CACHE_METRIC = 'courier_cache_requests_total'
+CACHE_INVALIDATIONS_METRIC = 'courier_cache_invalidations_total'
+MONGO_POOL_METRIC = 'mongo_pool_connections'
+MONGO_POOL_WAIT_METRIC = 'mongo_pool_checkout_wait_seconds'
+
+HELP = {
+    ROUTE_METRIC: 'Request duration by handler and status code.',
+    STAGE_METRIC: 'Duration of request handling stages by handler and stage.',
+    MONGO_METRIC: 'Mongo command duration by handler, command and outcome.',
+    CACHE_METRIC: 'Courier cache lookups by result.',
+    CACHE_INVALIDATIONS_METRIC: 'Courier cache invalidations by source.',
+    MONGO_POOL_METRIC: 'Mongo connections of all processes by state (open, in_use).',
+    MONGO_POOL_WAIT_METRIC: 'Time spent waiting for a pooled Mongo connection by outcome.',
+}
+
+COUNTERS = {CACHE_METRIC, CACHE_INVALIDATIONS_METRIC}
+
+# Значения, которые растут и уменьшаются; при объединении процессов суммируются, как и счётчики
+GAUGES = {MONGO_POOL_METRIC}
+
+# Обработчик текущего запроса, к нему относятся этапы и команды монго
+_current_handler = ContextVar('current_handler', default='none')
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Metrics(object):
+    """
+    Гистограммы длительностей обработчиков, этапов обработки и команд монго, а также счётчики.
+
+    Каждая гистограмма хранит число наблюдений по корзинам, сумму и количество. Запись наблюдения
+    стоит одного бинарного поиска и короткой блокировки, поэтому метрики можно не отключать.
+    Если задан каталог, каждый процесс периодически сохраняет туда свои метрики,
+    а ответ /metrics объединяет метрики всех процессов сервиса.
+    """
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._series: Dict[str, Dict[Labels, List[float]]] = {name: {} for name in HELP}
+        self._series_pid = os.getpid()
+        self._writer_pid = None
+
+    def observe(self, name: str, labels: Labels, seconds: float):
+        if self._series_pid != os.getpid():
+            self.__reset_inherited_series()
+        position = bisect_left(BUCKETS, seconds)
+        with self._lock:
+            series = self._series[name].get(labels)
+            if series is None:
+                # Счётчики корзин, затем сумма и количество наблюдений
+                series = self._series[name][labels] = [0] * (len(BUCKETS) + 2)
+            if position < len(BUCKETS):
+                series[position] += 1
+            series[-2] += seconds
+            series[-1] += 1
+        if self.directory is not None and self._writer_pid != os.getpid():
+            self.__start_writer()
+
+    def increment(self, name: str, labels: Labels, value: int = 1):
+        if self._series_pid != os.getpid():
+            self.__reset_inherited_series()
+        with self._lock:
+            series = self._series[name].setdefault(labels, [0])
+            series[0] += value
+        if self.directory is not None and self._writer_pid != os.getpid():
+            self.__start_writer()
+
+    @contextmanager
+    def stage(self, stage: str):
+        """
+        Замеряет этап обработки текущего запроса.
+
+        :param str stage: название этапа
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(STAGE_METRIC, (('handler', _current_handler.get()), ('stage', stage)),
+                         time.perf_counter() - started)
+
+    def instrument(self, f):
+        """
+        Декоратор обработчика, замеряющий длительность запроса с кодом ответа.
+
+        Оборачивает обработчик вместе с handle_exceptions, поэтому видит и ответы с ошибками.
+        Подходит как для обычных обработчиков, так и для асинхронных.
+        """
+
+        def observe_response(response, started: float):
+            status = response[1] if isinstance(response, tuple) else 200
+            self.observe(ROUTE_METRIC, (('handler', f.__name__), ('status', str(status))),
+                         time.perf_counter() - started)
+
+        if asyncio.iscoroutinefunction(f):
+            @wraps(f)
+            async def async_wrap(*args, **kwargs):
+                token = _current_handler.set(f.__name__)
+                started = time.perf_counter()
+                try:
+                    response = await f(*args, **kwargs)
+                finally:
+                    _current_handler.reset(token)
+                observe_response(response, started)
+                return response
+
+            return async_wrap
+
+        @wraps(f)
+        def wrap(*args, **kwargs):
+            token = _current_handler.set(f.__name__)
+            started = time.perf_counter()
+            try:
+                response = f(*args, **kwargs)
+            finally:
+                _current_handler.reset(token)
+            observe_response(response, started)
+            return response
+
+        return wrap
+
+    def snapshot(self) -> dict:
+        if self._series_pid != os.getpid():
+            self.__reset_inherited_series()
+        with self._lock:
+            return {name: {json.dumps(labels): list(values) for labels, values in series.items()}
+                    for name, series in self._series.items()}
+
+    def collect(self) -> dict:
+        """
+        Возвращает метрики этого процесса, объединённые с сохранёнными метриками остальных процессов.
+
+        Снимки завершившихся процессов и снимки, которые не обновлялись дольше SNAPSHOT_TTL, удаляются,
+        иначе перезапущенные воркеры учитывались бы вместе со своими предшественниками.
+        :rtype: dict
+        """
+        if self.directory is None:
+            return self.snapshot()
+        self.write_snapshot()
+        snapshots = []
+        expired = time.time() - SNAPSHOT_TTL
+        for filename in os.listdir(self.directory):
+            if not filename.endswith('.json'):
+                continue
+            path = os.path.join(self.directory, filename)
+            try:
+                pid = filename[:-len('.json')]
+                if os.path.getmtime(path) < expired or (pid.isdigit() and not _process_alive(int(pid))):
+                    os.remove(path)
+                    continue
+                with open(path) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return merge_snapshots(snapshots)
+
+    def render(self) -> str:
+        return render_snapshot(self.collect())
+
+    def write_snapshot(self):
+        path = os.path.join(self.directory, f'{os.getpid()}.json')
+        with open(path + '.tmp', 'w') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(path + '.tmp', path)
+
+    def __reset_inherited_series(self):
+        # После форка ряды родителя уже учтены в его снимке, процесс начинает свои ряды с нуля
+        with self._lock:
+            if self._series_pid != os.getpid():
+                self._series = {name: {} for name in HELP}
+                self._series_pid = os.getpid()
+
+    def __start_writer(self):
+        with self._lock:
+            if self._writer_pid == os.getpid():
+                return
+            self._writer_pid = os.getpid()
+
+        def write_periodically():
+            while True:
+                time.sleep(SNAPSHOT_INTERVAL)
+                self.write_snapshot()
+
+        threading.Thread(target=write_periodically, daemon=True).start()
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """
+    Слушатель команд pymongo, записывающий длительность каждой команды в метрики.
+
+    Подключается при создании клиента через параметр event_listeners.
+    """
+
+    def __init__(self, metrics: Metrics):
+        self.metrics = metrics
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self.__observe(event, 'success')
+
+    def failed(self, event):
+        self.__observe(event, 'failure')
+
+    def __observe(self, event, outcome: str):
+        labels = (('handler', _current_handler.get()), ('command', event.command_name), ('outcome', outcome))
+        self.metrics.observe(MONGO_METRIC, labels, event.duration_micros / 1e6)
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Процесс существует, но принадлежит другому пользователю
+        pass
+    return True
+
+
+def merge_snapshots(snapshots: Iterable[dict]) -> dict:
+    merged = {name: {} for name in HELP}
+    for snapshot in snapshots:
+        for name, series in snapshot.items():
+            for labels, values in series.items():
+                current = merged.setdefault(name, {}).get(labels)
+                merged[name][labels] = values if current is None else [a + b for a, b in zip(current, values)]
+    return merged
+
+
+def _format_labels(labels: Iterable[Tuple[str, str]]) -> str:
+    pairs = (key + '="' + value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+             for key, value in labels)
+    return '{' + ','.join(pairs) + '}'
+
+
+def render_snapshot(snapshot: dict) -> str:
+    """
+    Формирует ответ в текстовом формате Prometheus.
+
+    :param dict snapshot: метрики в виде словаря имя -> метки -> значения
+    :rtype: str
+    """
+    lines = []
+    for name, series in sorted(snapshot.items()):
+        lines.append(f'# HELP {name} {HELP.get(name, name)}')
+        if name in COUNTERS or name in GAUGES:
+            lines.append(f'# TYPE {name} {"counter" if name in COUNTERS else "gauge"}')
+            for labels, values in sorted(series.items()):
+                lines.append(f'{name}{_format_labels(tuple(pair) for pair in json.loads(labels))} {values[0]}')
+            continue
+        lines.append(f'# TYPE {name} histogram')
+        for labels, values in sorted(series.items()):
+            labels = [tuple(pair) for pair in json.loads(labels)]
+            cumulative = 0
+            for bound, count in zip(BUCKETS, values):
+                cumulative += count
+                lines.append(f'{name}_bucket{_format_labels(labels + [("le", str(bound))])} {cumulative}')
+            lines.append(f'{name}_bucket{_format_labels(labels + [("le", "+Inf")])} {values[-1]}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {values[-2]}')
+            lines.append(f'{name}_count{_format_labels(labels)} {values[-1]}')
+    return '\n'.join(lines) + '\n'
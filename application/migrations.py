@@ -0,0 +1,68 @@
+import os
+import sys
+
+from pymongo import UpdateOne
+from pymongo.database import Database
+
+from utils.parser import pack_legacy_interval
+
+# Поля с интервалами, которые до упаковки в целые числа хранились парами datetime
+INTERVAL_FIELDS = {
+    'couriers': 'working_hours',
+    'orders': 'delivery_hours',
+}
+
+BATCH_SIZE = 1000
+
+
+def pack_legacy_intervals(intervals) -> list:
+    """
+    Переводит список интервалов в упакованный формат; уже упакованные интервалы остаются как есть.
+
+    :param intervals: интервалы документа
+    :return: список упакованных интервалов
+    :rtype: list
+    """
+    return [pack_legacy_interval(interval) if isinstance(interval, (list, tuple)) else interval
+            for interval in intervals]
+
+
+def migrate_intervals(db: Database, batch_size: int = BATCH_SIZE) -> dict:
+    """
+    Переводит интервалы документов, записанных до упаковки интервалов, в упакованный формат.
+
+    Обновление документа выполняется только если интервалы не изменились с момента чтения, поэтому
+    миграцию можно запускать на работающем сервисе и повторно.
+    :param Database db: база данных
+    :param int batch_size: число обновлений в одном bulk_write
+    :return: число переведённых документов по коллекциям
+    :rtype: dict
+    """
+    migrated = {}
+    for collection_name, field in INTERVAL_FIELDS.items():
+        collection = db[collection_name]
+        migrated[collection_name] = 0
+        requests = []
+        for document in collection.find({field: {'$elemMatch': {'$type': 'array'}}}, {field: 1}):
+            requests.append(UpdateOne({'_id': document['_id'], field: document[field]},
+                                      {'$set': {field: pack_legacy_intervals(document[field])}}))
+            if len(requests) == batch_size:
+                migrated[collection_name] += collection.bulk_write(requests, ordered=False).modified_count
+                requests = []
+        if requests:
+            migrated[collection_name] += collection.bulk_write(requests, ordered=False).modified_count
+    return migrated
+
+
+def main():
+    from application.custom_mongo_client import ConnectionManager
+
+    connections = ConnectionManager.from_environ(os.environ)
+    db = connections.database(os.environ['DATABASE_NAME'])
+    for collection_name, count in migrate_intervals(db).items():
+        print(f'{collection_name}: {count} documents migrated')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
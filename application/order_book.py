@@ -0,0 +1,259 @@
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left, bisect_right, insort
+from collections import defaultdict
+from typing import Dict, Iterable, List, Tuple
+
+from pymongo.collection import Collection
+from pymongo.errors import PyMongoError
+
+from application.repository import SCAN_BATCH_SIZE
+from utils.assignment import COURIER_CAPACITY
+from utils.parser import unpack_interval
+
+logger = logging.getLogger(__name__)
+
+# Поля свободного заказа, по которым подбираются заказы для назначения
+ORDER_FIELDS = ('weight', 'region', 'delivery_hours')
+
+# Верхние границы корзин веса: в корзину попадают заказы тяжелее предыдущей границы,
+# поэтому курьеру подходят все заказы корзин до его грузоподъёмности включительно
+WEIGHT_BUCKETS = tuple(sorted(set(COURIER_CAPACITY.values())))
+
+# Изменения заказов, после которых заказ мог стать свободным или перестать быть свободным
+ORDER_CHANGES = [{'$match': {'$or': [
+    {'operationType': {'$in': ['insert', 'replace', 'delete']}},
+    {'updateDescription.updatedFields.status': {'$exists': True}},
+]}}]
+
+# Пауза перед повторным подключением к потоку изменений после ошибки, в секундах
+RETRY_DELAY = 1
+
+
+class OrderBook(object):
+    """
+    Свободные заказы в памяти процесса, сгруппированные по району и корзине веса.
+
+    Обработчик назначения берёт отсюда кандидатов вместо чтения всех свободных заказов районов курьера,
+    а в монго только атомарно забирает выбранные заказы. Для каждой корзины интервалы доставки хранятся
+    отсортированными по началу вместе с наибольшей длиной интервала, поэтому интервалы, содержащие рабочий
+    интервал курьера, находятся двумя бинарными поисками: такой интервал начинается не позже рабочего
+    и не раньше, чем за наибольшую длину до его начала. Книга может отставать от монго: заказ,
+    который уже забрал другой процесс, просто не пройдёт условие по статусу при назначении.
+    Обработчики этого процесса обновляют книгу сразу, изменения из других процессов приходят
+    по потоку изменений коллекции заказов. Пока книга не загружена, ready равно False
+    и обработчики читают заказы из монго.
+    """
+
+    def __init__(self, collection: Collection):
+        self.collection = collection
+        self.ready = False
+        # Район -> корзина веса -> идентификатор заказа -> заказ
+        self._regions: Dict[int, Dict[int, Dict[int, dict]]] = defaultdict(lambda: defaultdict(dict))
+        # Район -> корзина веса -> отсортированные тройки (начало, конец, идентификатор заказа) интервалов доставки
+        self._windows: Dict[int, Dict[int, List[Tuple[int, int, int]]]] = defaultdict(lambda: defaultdict(list))
+        # Район -> корзина веса -> наибольшая длина интервала доставки в минутах; при удалении заказов
+        # не уменьшается, пока корзина не опустеет, и остаётся верхней границей
+        self._max_lengths: Dict[int, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+        # Идентификатор заказа -> (район, корзина веса)
+        self._locations: Dict[int, tuple] = {}
+        self._lock = threading.Lock()
+        self._watcher_pid = None
+        self._projection = {field: 1 for field in ORDER_FIELDS}
+
+    def __len__(self):
+        with self._lock:
+            return len(self._locations)
+
+    def __contains__(self, order_id: int) -> bool:
+        with self._lock:
+            return order_id in self._locations
+
+    def add(self, orders: Iterable[dict]):
+        """
+        Добавляет свободные заказы или заменяет уже добавленные.
+
+        :param orders: заказы с полями _id, weight, region и delivery_hours
+        """
+        with self._lock:
+            for order in orders:
+                self.__discard(order['_id'])
+                bucket = bisect_left(WEIGHT_BUCKETS, order['weight'])
+                if bucket == len(WEIGHT_BUCKETS):
+                    # Заказ тяжелее любого курьера назначить нельзя
+                    continue
+                self._regions[order['region']][bucket][order['_id']] = {
+                    '_id': order['_id'], **{field: order[field] for field in ORDER_FIELDS}}
+                self._locations[order['_id']] = (order['region'], bucket)
+                windows = self._windows[order['region']][bucket]
+                max_lengths = self._max_lengths[order['region']]
+                for packed in order['delivery_hours']:
+                    begin, end = unpack_interval(packed)
+                    insort(windows, (begin, end, order['_id']))
+                    max_lengths[bucket] = max(max_lengths[bucket], end - begin)
+
+    def remove(self, order_ids: Iterable[int]):
+        with self._lock:
+            for order_id in order_ids:
+                self.__discard(order_id)
+
+    def refresh(self, order_ids: List[int]):
+        """
+        Перечитывает заказы из монго: свободные добавляются в книгу, остальные удаляются.
+
+        :param order_ids: идентификаторы заказов
+        """
+        if not order_ids:
+            return
+        orders = list(self.collection.find({'_id': {'$in': order_ids}, 'status': 'not_assigned'}, self._projection))
+        free_ids = {order['_id'] for order in orders}
+        self.remove(order_id for order_id in order_ids if order_id not in free_ids)
+        self.add(orders)
+
+    def find(self, regions: Iterable[int], capacity: float) -> List[dict]:
+        """
+        Возвращает свободные заказы указанных районов, вес которых не превышает грузоподъёмность.
+
+        Возвращаемые словари общие для всех запросов, изменять их нельзя.
+        :param regions: районы
+        :param capacity: грузоподъёмность курьера в килограммах
+        :rtype: List[dict]
+        """
+        last_bucket = min(bisect_left(WEIGHT_BUCKETS, capacity), len(WEIGHT_BUCKETS) - 1)
+        orders = []
+        with self._lock:
+            for region in set(regions):
+                buckets = self._regions.get(region)
+                if buckets is None:
+                    continue
+                for bucket in range(last_bucket):
+                    orders.extend(buckets[bucket].values())
+                # Последняя корзина может быть тяжелее грузоподъёмности, если та не совпадает с границей корзины
+                orders.extend(order for order in buckets[last_bucket].values() if order['weight'] <= capacity)
+        return orders
+
+    def candidates(self, regions: Iterable[int], working_hours: list, capacity: float) -> List[dict]:
+        """
+        Возвращает свободные заказы, которые можно назначить курьеру: как split_orders
+        для заказов районов курьера, вес которых не превышает грузоподъёмность.
+
+        Просматриваются только интервалы доставки, начинающиеся не раньше, чем за наибольшую длину
+        интервала корзины до начала рабочего интервала. Возвращаемые словари общие для всех запросов,
+        изменять их нельзя.
+        :param regions: районы курьера
+        :param list working_hours: упакованные рабочие интервалы курьера
+        :param capacity: грузоподъёмность курьера в килограммах
+        :rtype: List[dict]
+        """
+        last_bucket = min(bisect_left(WEIGHT_BUCKETS, capacity), len(WEIGHT_BUCKETS) - 1)
+        working = [unpack_interval(packed) for packed in working_hours]
+        matched = {}
+        with self._lock:
+            for region in set(regions):
+                buckets = self._regions.get(region)
+                if buckets is None:
+                    continue
+                for bucket in range(last_bucket + 1):
+                    windows = self._windows[region][bucket]
+                    if not windows:
+                        continue
+                    orders = buckets[bucket]
+                    max_length = self._max_lengths[region][bucket]
+                    for begin, end in working:
+                        # Интервал доставки содержит рабочий, если начинается не позже и заканчивается не раньше него
+                        first = bisect_left(windows, (begin - max_length,))
+                        last = bisect_right(windows, (begin, float('inf')))
+                        for i in range(first, last):
+                            _, window_end, order_id = windows[i]
+                            if window_end < end or order_id in matched:
+                                continue
+                            order = orders[order_id]
+                            if bucket < last_bucket or order['weight'] <= capacity:
+                                matched[order_id] = order
+        return list(matched.values())
+
+    def load(self):
+        """
+        Заменяет содержимое книги свободными заказами из монго и отмечает книгу готовой к использованию.
+        """
+        regions = defaultdict(lambda: defaultdict(dict))
+        windows = defaultdict(lambda: defaultdict(list))
+        max_lengths = defaultdict(lambda: defaultdict(int))
+        locations = {}
+        # Книга собирается без блокировки, а интервалы каждой корзины сортируются один раз
+        for order in self.collection.find({'status': 'not_assigned'}, self._projection, batch_size=SCAN_BATCH_SIZE):
+            bucket = bisect_left(WEIGHT_BUCKETS, order['weight'])
+            if bucket == len(WEIGHT_BUCKETS):
+                continue
+            regions[order['region']][bucket][order['_id']] = {
+                '_id': order['_id'], **{field: order[field] for field in ORDER_FIELDS}}
+            locations[order['_id']] = (order['region'], bucket)
+            for packed in order['delivery_hours']:
+                begin, end = unpack_interval(packed)
+                windows[order['region']][bucket].append((begin, end, order['_id']))
+                max_lengths[order['region']][bucket] = max(max_lengths[order['region']][bucket], end - begin)
+        for buckets in windows.values():
+            for bucket_windows in buckets.values():
+                bucket_windows.sort()
+        with self._lock:
+            self._regions, self._windows, self._max_lengths, self._locations = regions, windows, max_lengths, locations
+        self.ready = True
+
+    def apply(self, change: dict):
+        """
+        Применяет к книге событие потока изменений коллекции заказов.
+
+        :param dict change: событие с полным документом заказа (full_document='updateLookup')
+        """
+        order = change.get('fullDocument')
+        if change['operationType'] != 'delete' and order is not None and order.get('status') == 'not_assigned':
+            self.add([order])
+        else:
+            self.remove([change['documentKey']['_id']])
+
+    def start_watching(self):
+        """
+        Запускает в фоновом потоке загрузку книги и чтение потока изменений коллекции заказов.
+
+        Поток запускается один раз в каждом процессе, поэтому метод можно вызывать до форка воркеров.
+        """
+        with self._lock:
+            if self._watcher_pid == os.getpid():
+                return
+            self._watcher_pid = os.getpid()
+        threading.Thread(target=self.watch, daemon=True).start()
+
+    def watch(self):
+        resume_token = None
+        while True:
+            try:
+                with self.collection.watch(ORDER_CHANGES, full_document='updateLookup',
+                                           resume_after=resume_token) as stream:
+                    # Книга загружается после открытия потока, чтобы не пропустить изменения между ними
+                    if resume_token is None:
+                        self.load()
+                    for change in stream:
+                        resume_token = stream.resume_token
+                        self.apply(change)
+            except PyMongoError:
+                logger.exception('Order change stream failed')
+                # Без потока изменений книга устаревает, поэтому до повторной загрузки не используется
+                self.ready = False
+                resume_token = None
+                time.sleep(RETRY_DELAY)
+
+    def __discard(self, order_id: int):
+        location = self._locations.pop(order_id, None)
+        if location is not None:
+            region, bucket = location
+            order = self._regions[region][bucket].pop(order_id)
+            windows = self._windows[region][bucket]
+            for packed in order['delivery_hours']:
+                begin, end = unpack_interval(packed)
+                position = bisect_left(windows, (begin, end, order_id))
+                if position < len(windows) and windows[position] == (begin, end, order_id):
+                    del windows[position]
+            if not windows:
+                self._max_lengths[region][bucket] = 0
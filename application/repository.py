@@ -0,0 +1,248 @@
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Union
+
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.client_session import ClientSession
+from pymongo.collection import Collection
+from pymongo.database import Database
+from pymongo.read_preferences import ReadPreference
+
+from application.steps import Fetch, Steps
+
+# Функции чтения и записи возвращают шаги (см. application.steps), поэтому выполняются и с pymongo, и с motor
+
+# Поля заказа в работе, нужные для повторной проверки после изменения профиля курьера
+ASSIGNED_ORDER_FIELDS = {'courier_id': 1, 'region': 1, 'weight': 1, 'delivery_hours': 1}
+
+# Поля заказа в работе, нужные для ответа обработчиков назначения
+IN_PROGRESS_ORDER_FIELDS = {'status': 1, 'courier_id': 1, 'assign_time': 1}
+
+# Поля свободного заказа, нужные для подбора заказов при назначении
+FREE_ORDER_FIELDS = {'weight': 1, 'region': 1, 'delivery_hours': 1}
+
+# Поля заказа, нужные для отметки о выполнении и статистики доставок
+COMPLETED_ORDER_FIELDS = {'courier_id': 1, 'status': 1, 'assign_time': 1, 'region': 1}
+
+# Поля курьера, нужные для изменения профиля и закрытия развоза
+PATCHED_COURIER_FIELDS = {'courier_type': 1, 'regions': 1, 'working_hours': 1, 'active_assign': 1}
+
+# Поля курьера для ответа GET /couriers/$courier_id
+COURIER_INFO_FIELDS = {'courier_type': 1, 'regions': 1, 'working_hours': 1, 'delivery_stats': 1,
+                       'completed_assigns': 1}
+
+# Поля курьера, нужные для закрытия развоза
+ACTIVE_ASSIGN_FIELDS = {'courier_type': 1, 'active_assign': 1}
+
+# Размер пачки курсора для запросов, которые могут вернуть много заказов
+SCAN_BATCH_SIZE = 1000
+
+CourierCondition = Union[int, dict]
+
+
+def read_from(db: Database, collection_name: str, read_preference=None) -> Collection:
+    """
+    Возвращает коллекцию, чтения из которой направляются по указанному read preference.
+
+    :param Database db: база данных сервиса
+    :param str collection_name: имя коллекции
+    :param read_preference: например ReadPreference.SECONDARY_PREFERRED, None - настройка клиента
+    :rtype: Collection
+    """
+    collection = db[collection_name]
+    if read_preference is None:
+        return collection
+    return collection.with_options(read_preference=read_preference)
+
+
+@contextmanager
+def causal_session(db: Database, enabled: bool = True):
+    """
+    Открывает причинно согласованную сессию: чтения в ней с любого узла видят записи, сделанные в ней раньше.
+
+    Нужна, когда после записи те же данные читаются не с первичного узла.
+    :param Database db: база данных сервиса
+    :param bool enabled: если False, сессия не открывается и возвращается None
+    """
+    if not enabled:
+        yield None
+        return
+    with db.client.start_session(causal_consistency=True) as session:
+        yield session
+
+
+def find_courier(db: Database, courier_id: int, projection: dict,
+                 read_preference=None) -> Steps[Optional[dict]]:
+    """
+    Читает курьера.
+
+    Реплика может ещё не получить только что добавленного курьера, поэтому курьер,
+    не найденный не на первичном узле, перечитывается с первичного.
+    :param Database db: база данных сервиса
+    :param int courier_id: идентификатор курьера
+    :param dict projection: поля курьера
+    :param read_preference: узлы для чтения, None - настройка клиента
+    :rtype: Optional[dict]
+    """
+    courier = yield read_from(db, 'couriers', read_preference).find_one({'_id': courier_id}, projection)
+    if courier is None and read_preference not in (None, ReadPreference.PRIMARY):
+        courier = yield read_from(db, 'couriers', ReadPreference.PRIMARY).find_one({'_id': courier_id}, projection)
+    return courier
+
+
+def find_couriers(db: Database, courier_ids: Iterable[int], projection: dict) -> Steps[Dict[int, dict]]:
+    """
+    Читает курьеров одним запросом.
+
+    :param Database db: база данных сервиса
+    :param courier_ids: идентификаторы курьеров
+    :param dict projection: поля курьера
+    :return: словарь идентификатор -> курьер для найденных курьеров
+    :rtype: Dict[int, dict]
+    """
+    couriers = yield Fetch(db['couriers'].find(filter={'_id': {'$in': list(courier_ids)}}, projection=projection))
+    return {courier['_id']: courier for courier in couriers}
+
+
+def apply_courier_patches(db: Database, couriers: Dict[int, dict],
+                          patches: Dict[int, dict]) -> Steps[Dict[int, dict]]:
+    """
+    Изменяет курьеров одним bulk_write, как find_one_and_update с ReturnDocument.BEFORE для каждого.
+
+    Изменение курьера применяется, только если изменяемые поля не поменялись с момента чтения. Курьеры,
+    которых параллельно изменил другой запрос, перечитываются, и изменение повторяется с новыми значениями.
+    :param Database db: база данных сервиса
+    :param dict couriers: прочитанные курьеры по идентификатору
+    :param dict patches: изменения по идентификатору курьера
+    :return: курьеры до применённого изменения по идентификатору; удалённые курьеры отсутствуют
+    :rtype: Dict[int, dict]
+    """
+    before = {}
+    pending = couriers
+    while pending:
+        db_response = yield db['couriers'].bulk_write([
+            UpdateOne({'_id': courier_id, **{field: courier.get(field) for field in patches[courier_id]}},
+                      {'$set': patches[courier_id]})
+            for courier_id, courier in pending.items()], ordered=False)
+        if db_response.matched_count == len(pending):
+            before.update(pending)
+            break
+        current = yield from find_couriers(db, pending, PATCHED_COURIER_FIELDS)
+        # Курьер, поля которого уже равны новым значениям, изменён этим запросом или другим с теми же значениями:
+        # во втором случае заказы курьера уже проверил другой запрос, и повторная проверка ничего не снимет
+        applied = {courier_id for courier_id, courier in current.items()
+                   if all(courier.get(field) == value for field, value in patches[courier_id].items())}
+        before.update((courier_id, pending[courier_id]) for courier_id in applied)
+        pending = {courier_id: courier for courier_id, courier in current.items() if courier_id not in applied}
+    return before
+
+
+def close_active_assign(db: Database, courier_id: int) -> Steps[Optional[dict]]:
+    """
+    Удаляет у курьера текущий развоз, если в нём не осталось невыполненных заказов.
+
+    :param Database db: база данных сервиса
+    :param int courier_id: идентификатор курьера
+    :return: тип курьера и удалённый развоз или None, если развоза не было
+    :rtype: Optional[dict]
+    """
+    # Развоз, в который параллельное назначение успело добавить заказы, не закрывается
+    return (yield db['couriers'].find_one_and_update(
+        filter={'_id': courier_id, 'active_assign': {'$ne': None}, 'active_assign.outstanding': {'$not': {'$gt': 0}}},
+        update={'$unset': {'active_assign': ''}},
+        projection=ACTIVE_ASSIGN_FIELDS, return_document=ReturnDocument.BEFORE))
+
+
+def record_completion(db: Database, courier_id: int, build_update) -> Steps[Optional[dict]]:
+    """
+    Учитывает выполнение заказа одним обновлением документа курьера.
+
+    Обновление применяется, только если развоз курьера не изменился с момента чтения: иначе параллельное
+    выполнение или назначение могло бы потеряться или закрыться вместе с этим развозом. При промахе курьер
+    перечитывается и обновление строится заново.
+    :param Database db: база данных сервиса
+    :param int courier_id: идентификатор курьера
+    :param build_update: функция, строящая обновление по курьеру до изменения
+    :return: курьер до изменения или None, если курьера нет
+    :rtype: Optional[dict]
+    """
+    while True:
+        courier = yield db['couriers'].find_one({'_id': courier_id}, ACTIVE_ASSIGN_FIELDS)
+        if courier is None:
+            return None
+        db_response = yield db['couriers'].update_one(
+            {'_id': courier_id, 'active_assign': courier.get('active_assign')}, build_update(courier))
+        if db_response.matched_count:
+            return courier
+
+
+def find_orders(db: Database, order_ids: Iterable[int], projection: dict) -> Steps[Dict[int, dict]]:
+    orders = yield Fetch(db['orders'].find(filter={'_id': {'$in': list(order_ids)}}, projection=projection))
+    return {order['_id']: order for order in orders}
+
+
+def find_orders_in_progress(db: Database, courier_id: CourierCondition, projection: dict = None,
+                            read_preference=None,
+                            session: Optional[ClientSession] = None) -> Steps[List[dict]]:
+    """
+    Читает заказы курьеров в работе.
+
+    :param Database db: база данных сервиса
+    :param courier_id: идентификатор курьера или условие на него, например {'$in': [...]}
+    :param dict projection: поля заказа, по умолчанию IN_PROGRESS_ORDER_FIELDS
+    :param read_preference: узлы для чтения, None - настройка клиента
+    :param ClientSession session: сессия, записи которой должно увидеть чтение
+    :rtype: List[dict]
+    """
+    return (yield Fetch(read_from(db, 'orders', read_preference).find(
+        filter={'status': 'in_progress', 'courier_id': courier_id},
+        projection=projection or IN_PROGRESS_ORDER_FIELDS, session=session)))
+
+
+def find_free_orders(db: Database, matching_orders: dict) -> Steps[List[dict]]:
+    """
+    Читает свободные заказы, подходящие под условие.
+
+    Запрос может вернуть все свободные заказы районов курьера, поэтому выполняется,
+    только если у курьера нет заказов в работе.
+    :param Database db: база данных сервиса
+    :param dict matching_orders: условие на свободные заказы
+    :rtype: List[dict]
+    """
+    return (yield Fetch(db['orders'].find(filter=matching_orders, projection=FREE_ORDER_FIELDS,
+                                          batch_size=SCAN_BATCH_SIZE)))
+
+
+def order_exists(db: Database, filter_data: dict, read_preference=None) -> Steps[bool]:
+    """
+    Проверяет, есть ли заказ, подходящий под условие.
+
+    Заказ, не найденный не на первичном узле, перепроверяется на первичном, чтобы отставание
+    реплики не превращало существующий заказ в ошибку.
+    :param Database db: база данных сервиса
+    :param dict filter_data: условие на заказ
+    :param read_preference: узлы для чтения, None - настройка клиента
+    :rtype: bool
+    """
+    if (yield read_from(db, 'orders', read_preference).find_one(filter_data, {'_id': 1})) is not None:
+        return True
+    if read_preference in (None, ReadPreference.PRIMARY):
+        return False
+    return (yield read_from(db, 'orders', ReadPreference.PRIMARY).find_one(filter_data, {'_id': 1})) is not None
+
+
+def mark_order_completed(db: Database, order_id: int, courier_id: int,
+                         complete_time: str) -> Steps[Optional[dict]]:
+    """
+    Отмечает заказ курьера в работе выполненным.
+
+    :param Database db: база данных сервиса
+    :param int order_id: идентификатор заказа
+    :param int courier_id: идентификатор курьера
+    :param str complete_time: время выполнения
+    :return: заказ после изменения с полями COMPLETED_ORDER_FIELDS или None, если заказа нет в работе у курьера
+    :rtype: Optional[dict]
+    """
+    return (yield db['orders'].find_one_and_update(
+        filter={'_id': order_id, 'courier_id': courier_id, 'status': 'in_progress'},
+        update={'$set': {'complete_time': complete_time, 'status': 'completed'}},
+        projection=COMPLETED_ORDER_FIELDS, return_document=ReturnDocument.AFTER))
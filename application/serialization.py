@@ -0,0 +1,100 @@
+import json
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional, Tuple
+
+from bson import ObjectId
+from flask import Flask, Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+JSON_MIMETYPE = 'application/json'
+
+
+def format_datetime(value: datetime) -> str:
+    """
+    Форматирует время в RFC 3339 так же, как время назначения в ответах сервиса.
+
+    Время без часового пояса, в каком виде его возвращает монго, считается временем в UTC.
+    :param datetime value: время
+    :rtype: str
+    """
+    if value.tzinfo is None or value.utcoffset() == timedelta(0):
+        return value.replace(tzinfo=None).isoformat() + 'Z'
+    return value.isoformat()
+
+
+def _default(value):
+    # Значения из документов монго, которые не сериализуются стандартными средствами
+    if isinstance(value, datetime):
+        return format_datetime(value)
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def _json_dumps(value) -> bytes:
+    return json.dumps(value, default=_default, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+def _orjson_dumps(value) -> bytes:
+    return orjson.dumps(value, default=_default,
+                        option=orjson.OPT_NAIVE_UTC | orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS)
+
+
+def _ujson_dumps(value) -> bytes:
+    # Параметр default есть в ujson начиная с версии 5.0
+    return ujson.dumps(value, default=_default, ensure_ascii=False).encode()
+
+
+# Реализации в порядке предпочтения: имя -> (сериализация в байты, разбор байтов)
+BACKENDS: Dict[str, Tuple[Callable, Callable]] = {}
+if orjson is not None:
+    BACKENDS['orjson'] = (_orjson_dumps, orjson.loads)
+if ujson is not None:
+    BACKENDS['ujson'] = (_ujson_dumps, ujson.loads)
+BACKENDS['json'] = (_json_dumps, json.loads)
+
+
+class JsonSerializer(object):
+    """
+    Сериализация тел запросов и ответов сервиса.
+
+    По умолчанию используется самая быстрая из установленных библиотек: orjson, ujson
+    или стандартный модуль json. Все реализации одинаково сериализуют datetime и ObjectId.
+    """
+
+    def __init__(self, backend: Optional[str] = None):
+        if backend is None:
+            backend = next(iter(BACKENDS))
+        if backend not in BACKENDS:
+            raise ValueError(f'JSON backend {backend} is not available, available: {", ".join(BACKENDS)}')
+        self.backend = backend
+        self.dumps, self.loads = BACKENDS[backend]
+
+    def response(self, body, response_class=Response):
+        return response_class(self.dumps(body), mimetype=JSON_MIMETYPE)
+
+
+class JsonFlask(Flask):
+    """
+    Flask, сериализующий словари и списки, которые возвращают обработчики, через JsonSerializer.
+    """
+
+    def __init__(self, *args, serializer: JsonSerializer = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.serializer = serializer or JsonSerializer()
+
+    def make_response(self, rv):
+        if isinstance(rv, tuple) and len(rv) and isinstance(rv[0], (dict, list)):
+            rv = (self.serializer.response(rv[0], self.response_class),) + rv[1:]
+        elif isinstance(rv, (dict, list)):
+            rv = self.serializer.response(rv, self.response_class)
+        return super().make_response(rv)
@@ -1,216 +1,187 @@
 import logging
-from collections import defaultdict
-from datetime import datetime
-from multiprocessing import Lock
+from typing import Callable
 
+from bson import ObjectId
 from flask import Flask, request
-from pymongo import ReturnDocument
 from pymongo.database import Database
 from pymongo.errors import PyMongoError
-from pymongo.results import InsertOneResult
 from werkzeug.exceptions import BadRequest
 
+from application.courier_cache import CourierCache
 from application.data_validator import DataValidator
 from application.exception_handler import handle_exceptions
+from application.handlers import RequestHandlers
+from application.imports import ImportWorker, create_import_job, format_import_job, lease_expired
+from application.indexes import ensure_indexes
+from application.ingestion import NDJSON_MIMETYPE, IngestionMode, ingest_ndjson, iter_ndjson
+from application.metrics import PROMETHEUS_MIMETYPE, Metrics
+from application.order_book import OrderBook
+from application.repository import causal_session
+from application.serialization import JsonFlask, JsonSerializer
+from application.steps import run
 from utils.preparer import prepare_couriers, prepare_orders
-from utils.utils import split_orders
 
 logger = logging.getLogger(__name__)
 
 
-def make_app(db: Database, data_validator: DataValidator) -> Flask:
-    app = Flask(__name__)
+def make_app(db: Database, data_validator: DataValidator, import_worker: ImportWorker = None,
+             metrics: Metrics = None, courier_cache: CourierCache = None, serializer: JsonSerializer = None,
+             order_book: OrderBook = None, read_preference=None, ingestion: IngestionMode = None,
+             on_connect: Callable = None) -> Flask:
+    app = JsonFlask(__name__, serializer=serializer)
+    # Чтения, которым допустимо отставание реплики (карточка курьера, проверка уже выполненного заказа),
+    # направляются по read_preference, например ReadPreference.SECONDARY_PREFERRED. Заказы, которые
+    # перечитываются сразу после назначения, читаются так же, но в одной причинно согласованной сессии с записью
+    secondary_reads = read_preference is not None
+    if metrics is None:
+        metrics = Metrics()
+    if courier_cache is None:
+        courier_cache = CourierCache(db['couriers'], metrics=metrics)
+    if import_worker is None:
+        import_worker = ImportWorker(db, data_validator, order_book=order_book)
+    if ingestion is None:
+        ingestion = IngestionMode()
+    handlers = RequestHandlers(db, data_validator, metrics, courier_cache, ingestion, order_book, read_preference)
+
+    def start():
+        ensure_indexes(db)
+        # Задачи, оставшиеся в очереди после перезапуска сервиса, подбираются сразу
+        import_worker.submit()
+
+    # С gunicorn --preload приложение создаётся в мастере, где нельзя обращаться к монго и запускать потоки:
+    # тогда запуск откладывается до подключения в каждом воркере (ConnectionManager.on_connect)
+    if on_connect is None:
+        start()
+    else:
+        on_connect(start)
+
+    def get_json():
+        try:
+            return app.serializer.loads(request.get_data(cache=False))
+        except ValueError as e:
+            raise BadRequest(f'Failed to decode JSON object: {e}')
+
+    def parse_json():
+        if not request.is_json:
+            raise BadRequest('Content-Type must be application/json')
+        with metrics.stage('parse_json'):
+            return get_json()
+
+    def ingest_ndjson_request(collection_name: str, validate_chunk, prepare, id_field: str):
+        ids_list, errors = ingest_ndjson(request.stream, ingestion.target(db[collection_name]), validate_chunk,
+                                         prepare, id_field, ingestion.chunk_size, app.serializer.loads)
+        response = {collection_name: ids_list}
+        if errors:
+            response['errors'] = errors
+            return response, 400
+        return response, 201
 
-    locks = defaultdict(Lock)
+    @app.route('/metrics', methods=['GET'])
+    def get_metrics():
+        return metrics.render(), 200, {'Content-Type': PROMETHEUS_MIMETYPE}
 
     @app.route('/couriers', methods=['POST'])
+    @metrics.instrument
     @handle_exceptions(logger)
     def add_couriers():
 
-        if not request.is_json:
-            raise BadRequest('Content-Type must be application/json')
+        if request.mimetype == NDJSON_MIMETYPE:
+            return ingest_ndjson_request('couriers', data_validator.validate_couriers_chunk, prepare_couriers,
+                                         'courier_id')
 
-        couriers_data = request.get_json()
-        data_validator.validate_couriers(couriers_data)
-        data_to_insert = prepare_couriers(couriers_data)
+        return run(handlers.add_couriers(parse_json()))
 
-        with locks['post_couriers']:
-            db_response: InsertOneResult = db['couriers'].insert_many(data_to_insert)
+    @app.route('/couriers', methods=['PATCH'])
+    @metrics.instrument
+    @handle_exceptions(logger)
+    def patch_couriers():
+        return run(handlers.patch_couriers(parse_json()))
 
-            if db_response.acknowledged:
-                couriers_list = []
-                for courier in couriers_data['data']:
-                    couriers_list.append({'id': courier['courier_id']})
-                response = {'couriers': couriers_list}
-                return response, 201
-            else:
-                raise PyMongoError('Operation was not acknowledged')
+    @app.route('/couriers/<int:courier_id>', methods=['GET'])
+    @metrics.instrument
+    @handle_exceptions(logger)
+    def get_courier(courier_id):
+        return run(handlers.get_courier(courier_id))
 
     @app.route('/couriers/<int:courier_id>', methods=['PATCH'])
+    @metrics.instrument
     @handle_exceptions(logger)
     def patch_courier(courier_id):
-        if not request.is_json:
-            raise BadRequest('Content-Type must be application/json')
-
-        patch_data = request.get_json()
-        data_validator.validate_courier_patch(patch_data)
-
-        update_data = {
-            '$set': {f'$.{key}': val for key, val in patch_data.items()}
-        }
-        courier: dict = db['couriers'].find_one_and_update(
-            filter={'_id': courier_id}, update=update_data, return_document=ReturnDocument.AFTER)
-        if courier is None:
-            raise PyMongoError('Courier with specified id not found')
-
-        assigned_orders = {
-            'status': 'in_progress',
-            'courier_id': courier_id
-        }
-        list_orders = list(db['orders'].find(filter=assigned_orders))
-        if len(list_orders) == 0:
-            return courier, 201
-        av_orders, un_orders = split_orders(list_orders, courier['working_hours'])
-        max_weight = 10 * (courier['courier_type'] == 'foot') + 15 * (
-                courier['courier_type'] == 'bike') + 50 * (courier['courier_type'] == 'car')
-        for order in av_orders:
-            if order['weight'] > max_weight or order['region'] not in courier['regions']:
-                un_orders.append(order['_id'])
-        update_data = {
-            'status': 'not_assigned',
-            'assign_time': None,
-            'courier_id': None
-        }
-        db['orders'].update_many(
-            filter={'_id': {'$in': un_orders}}, update=update_data)
-
-        return courier, 201
+        return run(handlers.patch_courier(courier_id, parse_json()))
 
     @app.route('/orders', methods=['POST'])
+    @metrics.instrument
     @handle_exceptions(logger)
     def add_orders():
 
-        if not request.is_json:
-            raise BadRequest('Content-Type must be application/json')
+        if request.mimetype == NDJSON_MIMETYPE:
+            response = ingest_ndjson_request('orders', data_validator.validate_orders_chunk, prepare_orders,
+                                             'order_id')
+            if order_book is not None:
+                order_book.refresh([order['id'] for order in response[0]['orders']])
+            return response
 
-        orders_data = request.get_json()
-        data_validator.validate_orders(orders_data)
-        data_to_insert = prepare_orders(orders_data)
+        return run(handlers.add_orders(parse_json()))
 
-        with locks['post_orders']:
+    @app.route('/imports/orders', methods=['POST'])
+    @metrics.instrument
+    @handle_exceptions(logger)
+    def import_orders():
+
+        if request.mimetype == NDJSON_MIMETYPE:
+            items = iter_ndjson(request.stream, app.serializer.loads)
+        elif request.is_json:
+            with metrics.stage('parse_json'):
+                import_data = get_json()
+            if not isinstance(import_data, dict) or not isinstance(import_data.get('data'), list):
+                raise BadRequest('Field data must be a list')
+            items = enumerate(import_data['data'], start=1)
+        else:
+            raise BadRequest('Content-Type must be application/json or application/x-ndjson')
 
-            db_response: InsertOneResult = db['orders'].insert_many(data_to_insert)
+        import_id = create_import_job(db, items)
+        import_worker.submit()
+        return {'import_id': str(import_id)}, 202
 
-            if db_response.acknowledged:
-                orders_list = []
-                for order in orders_data['data']:
-                    orders_list.append({'id': order['order_id']})
-                response = {'orders': orders_list}
-                return response, 201
-            else:
-                raise PyMongoError('Operation was not acknowledged')
+    @app.route('/imports/<import_id>', methods=['GET'])
+    @metrics.instrument
+    @handle_exceptions(logger)
+    def get_import(import_id):
+        job = db['imports'].find_one({'_id': ObjectId(import_id)}) if ObjectId.is_valid(import_id) else None
+        if job is None:
+            raise PyMongoError('Import with specified id not found')
+        if lease_expired(job):
+            # Процесс, обрабатывавший задачу, завершился: задачу продолжит этот процесс
+            import_worker.submit()
+        return format_import_job(job), 200
 
     @app.route('/orders/assign', methods=['POST'])
+    @metrics.instrument
     @handle_exceptions(logger)
     def assign_orders():
+        assign_id_data = parse_json()
+        # Заказы, которые перечитываются сразу после назначения, читаются в одной сессии с записью
+        with causal_session(db, secondary_reads) as session:
+            return run(handlers.assign_orders(assign_id_data, session))
 
-        if not request.is_json:
-            raise BadRequest('Content-Type must be application/json')
-
-        assign_id_data = request.get_json()
-        data_validator.validate_orders(assign_id_data)
-
-        courier = db['couriers'].find_one({'_id': assign_id_data['courier_id']})
-        if courier is None:
-            raise PyMongoError('Courier with specified id not found')
-
-        assigned_orders = {
-            'status': 'in_progress',
-            'courier_id': courier['_id']
-        }
-        list_orders = list(db['orders'].find(filter=assigned_orders))
-        if len(list_orders):
-            assign_time = list_orders[0]['assign_time']
-        else:
-            max_weight = 10 * (courier['courier_type'] == 'foot') + 15 * (
-                    courier['courier_type'] == 'bike') + 50 * (courier['courier_type'] == 'car')
-            matching_orders = {
-                'status': 'not_assigned',
-                'weight': {'$lte': max_weight},
-                'region': {'$in': courier['regions']},
-            }
-            list_orders = list(db['orders'].find(filter=matching_orders))
-            if len(list_orders) == 0:
-                return {'orders': []}, 201
-            av_orders, _ = split_orders(list_orders, courier['working_hours'])
-            if len(av_orders) == 0:
-                return {'orders': []}, 201
-            else:
-                assign_time = datetime.utcnow().isoformat("T") + "Z"  # <-- get time in UTC
-                update_data = {
-                    '$set': {
-                        'courier_id': courier['_id'],
-                        'status': 'in_progress',
-                        'assign_time': assign_time,
-                    }
-                }
-                av_order_ids = list(map(lambda x: x['_id'], av_orders))
-                db['orders'].update_many(
-                    filter={'_id': {'$in': av_order_ids}}, update=update_data)
-                list_orders = list(db['orders'].find(filter=assigned_orders))
-        orders_id = []
-        for order in list_orders:
-            orders_id.append({'id': order['_id']})
-        response = {'orders': orders_id, 'assign_time': assign_time}
-        return response, 201
+    @app.route('/orders/assign/batch', methods=['POST'])
+    @metrics.instrument
+    @handle_exceptions(logger)
+    def assign_orders_batch():
+        assign_batch_data = parse_json()
+        with causal_session(db, secondary_reads) as session:
+            return run(handlers.assign_orders_batch(assign_batch_data, session))
 
     @app.route('/orders/complete', methods=['POST'])
+    @metrics.instrument
     @handle_exceptions(logger)
     def complete_order():
+        return run(handlers.complete_order(parse_json()))
 
-        if not request.is_json:
-            raise BadRequest('Content-Type must be application/json')
-
-        complete_data = request.get_json()
-        data_validator.validate_orders(complete_data)
-
-        if db['couriers'].find_one({'_id': complete_data['courier_id']}) is None:
-            raise PyMongoError('Courier with specified id not found')
-
-        if db['orders'].find({'_id': complete_data['order_id'], 'status': 'completed'}) is None:
-            return complete_data['order_id'], 201
-        update_data = {
-            '$set': {
-                'complete_time': complete_data['complete_time'],
-                'status': 'completed'
-            }
-        }
-        filter_data = {
-            '_id': complete_data['order_id'],
-            'courier_id': complete_data['courier_id'],
-            'status': 'in_progress'
-        }
-        db_response: dict = db['orders'].find_one_and_update(
-            filter=filter_data, update=update_data, return_document=ReturnDocument.AFTER)
-        if db_response is None:
-            filter_data = {
-                '_id': complete_data['order_id'],
-                'courier_id': complete_data['courier_id'],
-                'status': 'completed'
-            }
-            db_response: dict = db['orders'].find_one(filter=filter_data)
-            if db_response is None:
-                raise PyMongoError('Order with specified id not found')
-            return {'order_id': db_response['_id']}, 201
-        orders_count = db['orders'].find({'courier_id': complete_data['courier_id'],
-                                          'status': 'in_progress'}).count()
-        if orders_count == 0:
-            db_response_courier: dict = db['couriers'].find_one_and_update(
-                filter={'_id': complete_data['courier_id']},
-                update={'$inc': {'assigns': 1}}, return_document=ReturnDocument.AFTER)
-            if db_response_courier is None:
-                raise PyMongoError('Courier with specified id not found')
-
-        return {'order_id': db_response['_id']}, 201
+    @app.route('/orders/complete/batch', methods=['POST'])
+    @metrics.instrument
+    @handle_exceptions(logger)
+    def complete_orders_batch():
+        return run(handlers.complete_orders_batch(parse_json()))
 
     return app
@@ -0,0 +1,63 @@
+from typing import Generator, TypeVar
+
+T = TypeVar('T')
+
+# Шаги запроса к монго: генератор, который отдаёт вызовы драйвера и получает обратно их результаты.
+# Один и тот же генератор выполняется и поверх pymongo (run), и поверх motor (run_async): у motor вызов
+# возвращает awaitable, а у pymongo сразу результат. Курсоры отдаются обёрнутыми в Fetch.
+# Шаги вложенных функций подключаются через yield from
+Steps = Generator[object, object, T]
+
+
+class Fetch(object):
+    """
+    Чтение всех документов курсора: list(cursor) у pymongo и await cursor.to_list(None) у motor.
+    """
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+
+def run(steps: Steps[T]) -> T:
+    """
+    Выполняет шаги поверх синхронного драйвера.
+
+    :param steps: шаги
+    :return: результат шагов
+    """
+    value = None
+    error = None
+    while True:
+        try:
+            call = steps.send(value) if error is None else steps.throw(error)
+        except StopIteration as stop:
+            return stop.value
+        try:
+            value = list(call.cursor) if isinstance(call, Fetch) else call
+            error = None
+        except Exception as e:
+            value = None
+            error = e
+
+
+async def run_async(steps: Steps[T]) -> T:
+    """
+    Выполняет шаги поверх асинхронного драйвера.
+
+    Ошибка драйвера передаётся в шаги, как и при run, поэтому шаги обрабатывают её одинаково.
+    :param steps: шаги
+    :return: результат шагов
+    """
+    value = None
+    error = None
+    while True:
+        try:
+            call = steps.send(value) if error is None else steps.throw(error)
+        except StopIteration as stop:
+            return stop.value
+        try:
+            value = await call.cursor.to_list(None) if isinstance(call, Fetch) else await call
+            error = None
+        except Exception as e:
+            value = None
+            error = e
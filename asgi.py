@@ -0,0 +1,34 @@
+import os
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from application.async_service import make_async_app
+from application.courier_cache import CourierCache
+from application.custom_mongo_client import ConnectionManager
+from application.data_validator import DataValidator
+from application.ingestion import IngestionMode
+from application.metrics import Metrics, MongoCommandListener
+
+db_name = os.environ['DATABASE_NAME']
+# Как в index.py: каталог для объединения метрик воркеров и режим вставки пакетов
+metrics_dir = os.environ.get('METRICS_DIR')
+ingestion = IngestionMode.from_environ(os.environ)
+
+metrics = Metrics(metrics_dir)
+connections = ConnectionManager.from_environ(os.environ)
+connections.initiate_replica_set()
+client = AsyncIOMotorClient(connections.host, connections.port, event_listeners=[MongoCommandListener(metrics)],
+                            **connections.client_options())
+db = client[db_name]
+data_validator = DataValidator(fast_path=True)
+courier_cache = CourierCache(db['couriers'], metrics=metrics)
+app = make_async_app(db, data_validator, metrics=metrics, courier_cache=courier_cache, ingestion=ingestion)
+
+
+@app.before_serving
+async def watch_couriers():
+    app.add_background_task(courier_cache.watch_async)
+
+
+if __name__ == '__main__':
+    app.run()
@@ -0,0 +1,24 @@
+import random
+import timeit
+
+from utils.assignment import COURIER_CAPACITY, select_orders
+
+
+def make_orders(count: int, max_weight: float, seed: int = 0):
+    rnd = random.Random(seed)
+    return [{'_id': i + 1, 'weight': rnd.randrange(1, int(max_weight * 100) + 1) / 100} for i in range(count)]
+
+
+def main():
+    print(f'{"orders":>8} {"max weight":>10} {"courier":>8} {"ms":>8}')
+    for count in (100, 1000, 10000):
+        for max_weight in (1, 10, 50):
+            orders = make_orders(count, max_weight)
+            for courier_type, capacity in COURIER_CAPACITY.items():
+                repeat = 10
+                seconds = timeit.timeit(lambda: select_orders(orders, capacity), number=repeat) / repeat
+                print(f'{count:>8} {max_weight:>10} {courier_type:>8} {seconds * 1000:>8.3f}')
+
+
+if __name__ == '__main__':
+    main()
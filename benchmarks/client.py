@@ -0,0 +1,31 @@
+import http.client
+import json
+import time
+from typing import Tuple
+from urllib.parse import urlsplit
+
+
+def send(url: str, method: str, path: str, data: dict) -> Tuple[int, object, float]:
+    """
+    Отправляет JSON запрос сервису.
+
+    :param str url: адрес сервиса, например http://localhost:8080
+    :param str method: HTTP метод
+    :param str path: путь обработчика
+    :param dict data: тело запроса
+    :return: код ответа, разобранное тело ответа и длительность запроса в секундах
+    :rtype: Tuple[int, object, float]
+    """
+    parts = urlsplit(url)
+    connection = http.client.HTTPConnection(parts.hostname, parts.port)
+    started = time.perf_counter()
+    connection.request(method, path, body=json.dumps(data), headers={'Content-Type': 'application/json'})
+    response = connection.getresponse()
+    body = response.read()
+    seconds = time.perf_counter() - started
+    connection.close()
+    try:
+        body = json.loads(body)
+    except ValueError:
+        body = None
+    return response.status, body, seconds
@@ -0,0 +1,87 @@
+import random
+from typing import List
+
+COURIER_TYPES = ['foot', 'bike', 'car']
+
+# Рабочий день курьеров и часы доставки укладываются в этот промежуток, в минутах
+DAY_BEGIN = 6 * 60
+DAY_END = 23 * 60
+
+
+def format_minutes(minutes: int) -> str:
+    return f'{minutes // 60:02}:{minutes % 60:02}'
+
+
+def random_intervals(rnd: random.Random, count: int, min_length: int, max_length: int) -> List[str]:
+    """
+    Генерирует непересекающиеся интервалы времени в формате HH:MM-HH:MM.
+
+    :param random.Random rnd: генератор случайных чисел
+    :param int count: наибольшее число интервалов
+    :param int min_length: наименьшая длина интервала в минутах
+    :param int max_length: наибольшая длина интервала в минутах
+    :return: интервалы, упорядоченные по началу
+    :rtype: List[str]
+    """
+    intervals = []
+    begin = DAY_BEGIN
+    for _ in range(count):
+        begin += rnd.randrange(0, 120, 5)
+        end = begin + rnd.randrange(min_length, max_length + 1, 5)
+        if end > DAY_END:
+            break
+        intervals.append(f'{format_minutes(begin)}-{format_minutes(end)}')
+        begin = end
+    return intervals
+
+
+def random_weight(rnd: random.Random) -> float:
+    """
+    Генерирует вес заказа: в основном небольшой, как у обычных заказов, но встречаются и тяжёлые.
+
+    Схема заказа проверяет кратность 0.01 делением чисел с плавающей точкой, поэтому веса,
+    не проходящие эту проверку (например, 0.29), пропускаются.
+    :param random.Random rnd: генератор случайных чисел
+    :rtype: float
+    """
+    while True:
+        weight = round(min(max(rnd.expovariate(1 / 3), 0.01), 50), 2)
+        quotient = weight / 0.01
+        if int(quotient) == quotient:
+            return weight
+
+
+def make_couriers(count: int, regions: int, seed: int = 0, first_id: int = 1) -> List[dict]:
+    """
+    Генерирует курьеров с одним-тремя рабочими интервалами и несколькими районами.
+
+    :param int count: число курьеров
+    :param int regions: число районов
+    :param int seed: начальное значение генератора
+    :param int first_id: идентификатор первого курьера
+    :rtype: List[dict]
+    """
+    rnd = random.Random(seed)
+    return [{'courier_id': first_id + i,
+             'courier_type': rnd.choice(COURIER_TYPES),
+             'regions': sorted(rnd.sample(range(1, regions + 1), rnd.randint(1, min(regions, 5)))),
+             'working_hours': random_intervals(rnd, rnd.randint(1, 3), 60, 240)}
+            for i in range(count)]
+
+
+def make_orders(count: int, regions: int, seed: int = 0, first_id: int = 1) -> List[dict]:
+    """
+    Генерирует заказы с одним-двумя интервалами доставки.
+
+    :param int count: число заказов
+    :param int regions: число районов
+    :param int seed: начальное значение генератора
+    :param int first_id: идентификатор первого заказа
+    :rtype: List[dict]
+    """
+    rnd = random.Random(seed + 1)
+    return [{'order_id': first_id + i,
+             'weight': random_weight(rnd),
+             'region': rnd.randint(1, regions),
+             'delivery_hours': random_intervals(rnd, rnd.randint(1, 2), 120, 600)}
+            for i in range(count)]
@@ -0,0 +1,203 @@
+import argparse
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import Callable, List, Tuple
+
+import iso8601
+import mongomock
+from pymongo import MongoClient, ReadPreference
+from werkzeug.serving import make_server
+
+from application.data_validator import DataValidator
+from application.service import make_app
+from benchmarks.client import send
+from benchmarks.datasets import COURIER_TYPES, make_couriers, make_orders, random_intervals
+from benchmarks.results import compare_results, load_results, save_results, summarize
+
+
+def start_server(db, read_preference=None) -> Tuple[str, object]:
+    """
+    Запускает сервис в фоновом потоке на свободном порту.
+
+    :param db: база данных сервиса, pymongo или mongomock
+    :param read_preference: read preference чтений, которым допустимо отставание реплики, см. make_app
+    :return: адрес сервиса и сервер, который нужно остановить после замеров
+    """
+    app = make_app(db, DataValidator(fast_path=True), read_preference=read_preference)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f'http://127.0.0.1:{server.server_port}', server
+
+
+def run_phase(url: str, requests: List[Tuple[str, str, dict]], concurrency: int,
+              on_response: Callable = None) -> dict:
+    """
+    Выполняет запросы одного обработчика с заданным числом одновременных запросов.
+
+    :param str url: адрес сервиса
+    :param requests: тройки (метод, путь, тело запроса)
+    :param int concurrency: число одновременных запросов
+    :param on_response: функция, которой передаются тело запроса и ответ
+    :return: статистика по запросам
+    :rtype: dict
+    """
+    def execute(request):
+        method, path, data = request
+        status, body, seconds = send(url, method, path, data)
+        # Ошибки проверки данных возвращаются с кодом 200
+        failed = status >= 400 or (isinstance(body, dict) and 'validation_error' in body)
+        if not failed and on_response is not None:
+            on_response(data, body)
+        return seconds, failed
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        responses = list(executor.map(execute, requests))
+    seconds = time.perf_counter() - started
+    return summarize([latency for latency, _ in responses], seconds, sum(failed for _, failed in responses))
+
+
+def primary_operations(client: MongoClient) -> int:
+    """
+    Возвращает число операций чтения и команд, выполненных первичным узлом с его запуска.
+
+    Разница значений до и после замеров показывает нагрузку на первичный узел.
+    :param MongoClient client: клиент набора реплик или отдельного mongod
+    :rtype: int
+    """
+    counters = client.admin.command('serverStatus')['opcounters']
+    return sum(counters[name] for name in ('query', 'getmore', 'command'))
+
+
+def batches(items: list, batch_size: int) -> List[list]:
+    return [items[i:i + batch_size] for i in range(0, len(items), batch_size)]
+
+
+def run_load_test(url: str, couriers: int, orders: int, regions: int, concurrency: int,
+                  batch_size: int = 100, seed: int = 0, first_id: int = 1) -> dict:
+    """
+    Нагружает все обработчики сервиса по очереди на сгенерированных данных.
+
+    Назначения выполняются для всех курьеров, выполнение для всех назначенных заказов,
+    затем для каждого курьера запрашивается карточка и изменяется профиль.
+    :param str url: адрес сервиса
+    :param int couriers: число курьеров
+    :param int orders: число заказов
+    :param int regions: число районов
+    :param int concurrency: число одновременных запросов
+    :param int batch_size: число объектов в одном запросе добавления
+    :param int seed: начальное значение генератора
+    :param int first_id: идентификатор первого курьера и первого заказа
+    :return: словарь обработчик -> статистика
+    :rtype: dict
+    """
+    rnd = random.Random(seed)
+    couriers_data = make_couriers(couriers, regions, seed, first_id)
+    orders_data = make_orders(orders, regions, seed, first_id)
+    results = {}
+
+    results['POST /couriers'] = run_phase(
+        url, [('POST', '/couriers', {'data': batch}) for batch in batches(couriers_data, batch_size)], concurrency)
+    results['POST /orders'] = run_phase(
+        url, [('POST', '/orders', {'data': batch}) for batch in batches(orders_data, batch_size)], concurrency)
+
+    assigned = []
+    lock = threading.Lock()
+
+    def on_assign(data, body):
+        if body.get('orders'):
+            with lock:
+                assigned.append((data['courier_id'], body['assign_time'], [order['id'] for order in body['orders']]))
+
+    results['POST /orders/assign'] = run_phase(
+        url, [('POST', '/orders/assign', {'courier_id': courier['courier_id']}) for courier in couriers_data],
+        concurrency, on_assign)
+
+    complete_requests = []
+    for courier_id, assign_time, order_ids in assigned:
+        complete_time = iso8601.parse_date(assign_time)
+        for order_id in order_ids:
+            complete_time += timedelta(minutes=rnd.randint(5, 40))
+            complete_requests.append(('POST', '/orders/complete', {
+                'courier_id': courier_id, 'order_id': order_id,
+                'complete_time': complete_time.isoformat().replace('+00:00', 'Z')}))
+    results['POST /orders/complete'] = run_phase(url, complete_requests, concurrency)
+    results['GET /couriers/<id>'] = run_phase(
+        url, [('GET', f'/couriers/{courier["courier_id"]}', None) for courier in couriers_data], concurrency)
+
+    patch_requests = []
+    for courier in couriers_data:
+        patch_data = rnd.choice([
+            {'courier_type': rnd.choice(COURIER_TYPES)},
+            {'regions': sorted(rnd.sample(range(1, regions + 1), rnd.randint(1, min(regions, 5))))},
+            {'working_hours': random_intervals(rnd, rnd.randint(1, 3), 60, 240)},
+        ])
+        patch_requests.append(('PATCH', f'/couriers/{courier["courier_id"]}', patch_data))
+    results['PATCH /couriers/<id>'] = run_phase(url, patch_requests, concurrency)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Нагрузочное тестирование обработчиков сервиса.')
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument('--url', help='адрес уже запущенного сервиса')
+    target.add_argument('--mongo-uri', help='адрес локального mongod, по умолчанию используется mongomock')
+    parser.add_argument('--db-name', default='benchmark', help='база для --mongo-uri, очищается перед запуском')
+    parser.add_argument('--couriers', type=int, default=1000)
+    parser.add_argument('--orders', type=int, default=10000)
+    parser.add_argument('--regions', type=int, default=20)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--batch-size', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--first-id', type=int, default=1)
+    parser.add_argument('--secondary-reads', action='store_true',
+                        help='читать карточки курьеров и выполненные заказы с реплик (secondaryPreferred)')
+    parser.add_argument('--output', help='файл для сохранения результатов в JSON')
+    parser.add_argument('--baseline', help='результаты предыдущего запуска для сравнения')
+    args = parser.parse_args()
+
+    # Логи сервиса и сервера разработки искажают замеры
+    logging.disable(logging.CRITICAL)
+    server = None
+    client = None
+    url = args.url
+    if url is None:
+        if args.mongo_uri is not None:
+            client = MongoClient(args.mongo_uri)
+            client.drop_database(args.db_name)
+        else:
+            client = mongomock.MongoClient()
+        read_preference = ReadPreference.SECONDARY_PREFERRED if args.secondary_reads else None
+        url, server = start_server(client[args.db_name], read_preference)
+
+    primary_before = primary_operations(client) if args.mongo_uri is not None else None
+    try:
+        results = run_load_test(url, args.couriers, args.orders, args.regions, args.concurrency,
+                                args.batch_size, args.seed, args.first_id)
+    finally:
+        if server is not None:
+            server.shutdown()
+
+    print(f'{"route":<24} {"requests":>8} {"errors":>6} {"rps":>8} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8}')
+    for route, stats in results.items():
+        print(f'{route:<24} {stats["requests"]:>8} {stats["errors"]:>6} {stats["rps"] or 0:>8.1f} '
+              f'{stats["p50_ms"]:>8.1f} {stats["p95_ms"]:>8.1f} {stats["p99_ms"]:>8.1f}')
+
+    params = {key: value for key, value in vars(args).items() if key not in ('output', 'baseline')}
+    params['target'] = 'url' if args.url else 'mongod' if args.mongo_uri else 'mongomock'
+    if primary_before is not None:
+        # Сравнение запусков с --secondary-reads и без него показывает, сколько чтений ушло с первичного узла
+        params['primary_operations'] = primary_operations(client) - primary_before
+        print(f'primary operations: {params["primary_operations"]}')
+    if args.output:
+        save_results(args.output, 'load_test', params, results)
+    if args.baseline:
+        print('\n'.join(compare_results(load_results(args.baseline), {'results': results})))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+import argparse
+import copy
+import timeit
+
+from application.data_validator import DataValidator
+from benchmarks.datasets import make_couriers, make_orders
+from benchmarks.results import compare_results, load_results, save_results
+from utils.parser import parse_hours, parse_intervals
+from utils.preparer import prepare_orders
+from utils.utils import split_orders
+
+
+def measure(function, repeat: int, number: int = 1, setup=None) -> dict:
+    """
+    Замеряет функцию несколько раз и возвращает лучшее и медианное время одного вызова.
+
+    :param function: замеряемая функция, получает результат setup, если он задан
+    :param int repeat: число замеров
+    :param int number: число вызовов в одном замере
+    :param setup: функция, готовящая свежие входные данные перед каждым замером
+    :return: время в миллисекундах
+    :rtype: dict
+    """
+    timings = []
+    for _ in range(repeat):
+        argument = setup() if setup is not None else None
+        call = (lambda: function(argument)) if setup is not None else function
+        timings.append(timeit.timeit(call, number=number) / number)
+    timings.sort()
+    return {'best_ms': round(timings[0] * 1000, 4), 'median_ms': round(timings[len(timings) // 2] * 1000, 4)}
+
+
+def run_micro_benchmarks(orders: int, regions: int, repeat: int) -> dict:
+    """
+    Замеряет разбор часов, проверку входных данных и отбор заказов по времени.
+
+    :param int orders: число заказов в одном вызове
+    :param int regions: число районов
+    :param int repeat: число замеров
+    :return: словарь замер -> время
+    :rtype: dict
+    """
+    orders_data = {'data': make_orders(orders, regions)}
+    couriers_data = {'data': make_couriers(max(orders // 10, 1), regions)}
+    parsed_orders = copy.deepcopy(orders_data)
+    parse_hours(parsed_orders, 'delivery_hours')
+    prepared_orders = prepare_orders(parsed_orders)
+    working_hours = parse_intervals(couriers_data['data'][0]['working_hours'])
+
+    validator = DataValidator()
+    fast_validator = DataValidator(fast_path=True)
+    results = {
+        'parse_hours': measure(lambda data: parse_hours(data, 'delivery_hours'), repeat,
+                               setup=lambda: copy.deepcopy(orders_data)),
+        'split_orders': measure(lambda: split_orders(prepared_orders, working_hours), repeat),
+        'DataValidator.validate_orders': measure(validator.validate_orders, repeat,
+                                                 setup=lambda: copy.deepcopy(orders_data)),
+        'DataValidator.validate_orders fast_path': measure(fast_validator.validate_orders, repeat,
+                                                           setup=lambda: copy.deepcopy(orders_data)),
+        'DataValidator.validate_couriers': measure(validator.validate_couriers, repeat,
+                                                   setup=lambda: copy.deepcopy(couriers_data)),
+        'DataValidator.validate_couriers fast_path': measure(fast_validator.validate_couriers, repeat,
+                                                             setup=lambda: copy.deepcopy(couriers_data)),
+    }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Микробенчмарки разбора часов, проверки данных и split_orders.')
+    parser.add_argument('--orders', type=int, default=10000)
+    parser.add_argument('--regions', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=7)
+    parser.add_argument('--output', help='файл для сохранения результатов в JSON')
+    parser.add_argument('--baseline', help='результаты предыдущего запуска для сравнения')
+    args = parser.parse_args()
+
+    results = run_micro_benchmarks(args.orders, args.regions, args.repeat)
+    print(f'{"benchmark":<44} {"best ms":>10} {"median ms":>10}')
+    for name, stats in results.items():
+        print(f'{name:<44} {stats["best_ms"]:>10.3f} {stats["median_ms"]:>10.3f}')
+
+    if args.output:
+        params = {'orders': args.orders, 'regions': args.regions, 'repeat': args.repeat}
+        save_results(args.output, 'micro', params, results)
+    if args.baseline:
+        print('\n'.join(compare_results(load_results(args.baseline), {'results': results},
+                                        metrics=('best_ms', 'median_ms'))))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+import json
+import subprocess
+import sys
+from datetime import datetime
+from typing import List
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """
+    Возвращает перцентиль по методу ближайшего ранга.
+
+    :param List[float] sorted_values: отсортированные значения
+    :param float q: перцентиль от 0 до 100
+    :rtype: float
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(int(-(-q * len(sorted_values) // 100)), 1)
+    return sorted_values[rank - 1]
+
+
+def summarize(latencies: List[float], seconds: float, errors: int = 0) -> dict:
+    """
+    Считает статистику по длительностям запросов.
+
+    :param List[float] latencies: длительности запросов в секундах
+    :param float seconds: общее время выполнения запросов
+    :param int errors: число неуспешных запросов
+    :return: число запросов, ошибок, запросы в секунду и перцентили в миллисекундах
+    :rtype: dict
+    """
+    latencies = sorted(latencies)
+    return {'requests': len(latencies),
+            'errors': errors,
+            'rps': round(len(latencies) / seconds, 2) if seconds > 0 else None,
+            'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+            'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 3)}
+
+
+def _git_revision() -> str:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save_results(path: str, kind: str, params: dict, results: dict):
+    """
+    Сохраняет результаты запуска вместе с параметрами, временем и ревизией кода.
+
+    :param str path: файл для сохранения
+    :param str kind: вид бенчмарка
+    :param dict params: параметры запуска
+    :param dict results: словарь имя замера -> статистика
+    """
+    with open(path, 'w') as f:
+        json.dump({'kind': kind,
+                   'created_at': datetime.utcnow().isoformat() + 'Z',
+                   'revision': _git_revision(),
+                   'params': params,
+                   'results': results}, f, indent=2)
+
+
+def load_results(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare_results(baseline: dict, current: dict, metrics=('p50_ms', 'p95_ms', 'p99_ms', 'rps')) -> List[str]:
+    """
+    Формирует построчное сравнение двух запусков.
+
+    :param dict baseline: сохранённый ранее запуск
+    :param dict current: текущий запуск
+    :param metrics: сравниваемые показатели
+    :return: строки сравнения
+    :rtype: List[str]
+    """
+    lines = [f'{"name":<32} {"metric":>8} {"baseline":>10} {"current":>10} {"change":>8}']
+    for name, stats in current['results'].items():
+        baseline_stats = baseline['results'].get(name)
+        if baseline_stats is None:
+            continue
+        for metric in metrics:
+            old, new = baseline_stats.get(metric), stats.get(metric)
+            if not old or new is None:
+                continue
+            lines.append(f'{name:<32} {metric:>8} {old:>10.3f} {new:>10.3f} {(new - old) / old:>+8.1%}')
+    return lines
+
+
+def main():
+    if len(sys.argv) != 3:
+        print('usage: python -m benchmarks.results BASELINE.json CURRENT.json')
+        return 2
+    print('\n'.join(compare_results(load_results(sys.argv[1]), load_results(sys.argv[2]))))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
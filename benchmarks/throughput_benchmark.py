@@ -0,0 +1,74 @@
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.client import send
+
+# Идентификаторы каждого запуска начинаются с нового блока, чтобы запуски не пересекались в одной базе
+ID_BLOCK = 10 ** 6
+
+
+def post(url: str, path: str, data: dict) -> float:
+    status, _, seconds = send(url, 'POST', path, data)
+    if status >= 400:
+        raise RuntimeError(f'{path}: HTTP {status}')
+    return seconds
+
+
+def make_requests(first_id: int, count: int, couriers: int) -> list:
+    """
+    Готовит смешанную нагрузку: добавление заказов и назначение заказов курьерам по кругу.
+
+    :param int first_id: первый идентификатор заказа этого запуска
+    :param int count: число запросов
+    :param int couriers: число курьеров
+    :return: список пар (путь, тело запроса)
+    :rtype: list
+    """
+    requests = []
+    for i in range(count):
+        if i % 2 == 0:
+            order = {'order_id': first_id + i, 'weight': 1 + i % 5, 'region': 1 + i % 10,
+                     'delivery_hours': ['09:00-18:00']}
+            requests.append(('/orders', {'data': [order]}))
+        else:
+            requests.append(('/orders/assign', {'courier_id': first_id + i % couriers}))
+    return requests
+
+
+def run(url: str, first_id: int, count: int, couriers: int, concurrency: int) -> dict:
+    couriers_data = [{'courier_id': first_id + i, 'courier_type': 'car', 'regions': list(range(1, 11)),
+                      'working_hours': ['10:00-12:00']} for i in range(couriers)]
+    post(url, '/couriers', {'data': couriers_data})
+
+    requests = make_requests(first_id, count, couriers)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = sorted(executor.map(lambda request: post(url, *request), requests))
+    seconds = time.perf_counter() - started
+    return {'url': url,
+            'requests': count,
+            'rps': count / seconds,
+            'p50_ms': latencies[len(latencies) // 2] * 1000,
+            'p99_ms': latencies[min(len(latencies) - 1, len(latencies) * 99 // 100)] * 1000}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Сравнение пропускной способности нескольких запущенных экземпляров сервиса.')
+    parser.add_argument('urls', nargs='+', help='адреса сервисов, например http://localhost:8080')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--couriers', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=64)
+    args = parser.parse_args()
+
+    first_id = int(time.time()) % 1000 * ID_BLOCK + 1
+    print(f'{"url":<28} {"requests":>8} {"rps":>8} {"p50 ms":>8} {"p99 ms":>8}')
+    for i, url in enumerate(args.urls):
+        result = run(url, first_id + i * ID_BLOCK // len(args.urls), args.requests, args.couriers, args.concurrency)
+        print(f'{result["url"]:<28} {result["requests"]:>8} {result["rps"]:>8.1f} '
+              f'{result["p50_ms"]:>8.1f} {result["p99_ms"]:>8.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,8 @@
+# Настройки gunicorn, подключаются параметром -c gunicorn.conf.py
+
+
+def post_fork(server, worker):
+    # С --preload приложение загружено в мастере без подключения к монго. Воркер подключается сразу
+    # после форка: создаются индексы, подбираются задачи импорта и запускаются фоновые потоки воркера
+    import index
+    index.connections.client
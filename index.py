@@ -1,17 +1,41 @@
 import os
 
-from application.custom_mongo_client import CustomMongoClient
+from pymongo import ReadPreference
+
+from application.courier_cache import CourierCache
+from application.custom_mongo_client import ConnectionManager
 from application.data_validator import DataValidator
+from application.ingestion import IngestionMode
+from application.metrics import Metrics, MongoCommandListener
+from application.order_book import OrderBook
 from application.service import make_app
 
-db_uri = os.environ['DATABASE_URI']
 db_name = os.environ['DATABASE_NAME']
-replica_set = os.environ['REPLICA_SET']
+# Каталог, через который воркеры gunicorn объединяют метрики; без него каждый воркер отдаёт только свои
+metrics_dir = os.environ.get('METRICS_DIR')
+# Книга свободных заказов в памяти воркера, требует потока изменений (набора реплик)
+use_order_book = os.environ.get('ORDER_BOOK') == '1'
+# Карточки курьеров и проверки уже выполненных заказов читаются с реплик, если они доступны
+read_preference = ReadPreference.SECONDARY_PREFERRED if os.environ.get('SECONDARY_READS') == '1' else None
+# Вставка пакетов POST /couriers и POST /orders: INGEST_MODE, INGEST_CHUNK_SIZE, INGEST_WRITE_CONCERN
+ingestion = IngestionMode.from_environ(os.environ)
 
-client = CustomMongoClient(db_uri, 27017, replica_set)
-db = client[db_name]
-data_validator = DataValidator()
-app = make_app(db, data_validator)
+metrics = Metrics(metrics_dir)
+# Размер пула, таймауты, read preference и write concern задаются переменными MONGO_*, см. ENV_OPTIONS.
+# Клиент создаётся в каждом воркере после форка, поэтому приложение можно загружать с gunicorn --preload
+connections = ConnectionManager.from_environ(os.environ, metrics=metrics,
+                                             event_listeners=[MongoCommandListener(metrics)])
+connections.initiate_replica_set()
+db = connections.database(db_name)
+data_validator = DataValidator(fast_path=True)
+courier_cache = CourierCache(db['couriers'], metrics=metrics)
+connections.on_connect(courier_cache.start_watching)
+order_book = None
+if use_order_book:
+    order_book = OrderBook(db['orders'])
+    connections.on_connect(order_book.start_watching)
+app = make_app(db, data_validator, metrics=metrics, courier_cache=courier_cache, order_book=order_book,
+               read_preference=read_preference, ingestion=ingestion, on_connect=connections.on_connect)
 
 if __name__ == '__main__':
     app.run()
@@ -0,0 +1,88 @@
+import unittest
+from unittest.mock import patch
+
+from bson import json_util
+from mongomock.collection import Collection
+
+from tests import test_utils
+from utils.parser import parse_hours
+from utils.preparer import prepare_couriers, prepare_orders
+
+
+class AssignBatchPostTests(unittest.TestCase):
+    @classmethod
+    def setUp(cls):
+        cls.app, cls.db, cls.validator = test_utils.set_up_service()
+
+        orders_data = test_utils.read_data('orders.json')
+        parse_hours(orders_data, 'delivery_hours')
+        cls.db['orders'].insert_many(prepare_orders(orders_data))
+
+        couriers_data = test_utils.read_data('couriers.json')
+        parse_hours(couriers_data, 'working_hours')
+        cls.db['couriers'].insert_many(prepare_couriers(couriers_data))
+
+    def post_batch(self, courier_ids: list):
+        headers = [('Content-Type', 'application/json')]
+        return self.app.post('/orders/assign/batch', data=json_util.dumps({'courier_ids': courier_ids}),
+                             headers=headers)
+
+    def test_successful_batch_assign_should_return_orders_of_each_courier(self):
+        http_response = self.post_batch([1, 2, 3])
+        response_data = http_response.get_json()
+
+        self.assertEqual(201, http_response.status_code)
+        self.assertEqual([1, 2, 3], [courier['courier_id'] for courier in response_data['couriers']])
+        assigned = {courier['courier_id']: [order['id'] for order in courier['orders']]
+                    for courier in response_data['couriers']}
+        self.assertEqual([], assigned[3])
+        self.assertEqual([1, 3], sorted(assigned[1] + assigned[2]))
+        self.assertNotIn('assign_time', response_data['couriers'][2])
+        for courier_id, order_ids in assigned.items():
+            for order_id in order_ids:
+                order = self.db['orders'].find_one({'_id': order_id})
+                self.assertEqual('in_progress', order['status'])
+                self.assertEqual(courier_id, order['courier_id'])
+
+    def test_batch_assign_should_not_assign_order_to_two_couriers(self):
+        self.db['couriers'].update_one({'_id': 2}, {'$set': {'regions': [12, 22]}})
+        response_data = self.post_batch([1, 2]).get_json()
+        order_ids = [order['id'] for courier in response_data['couriers'] for order in courier['orders']]
+        self.assertEqual(len(order_ids), len(set(order_ids)))
+
+    def test_batch_assign_should_keep_orders_in_progress(self):
+        headers = [('Content-Type', 'application/json')]
+        single_response = self.app.post('/orders/assign', data=json_util.dumps({'courier_id': 1}),
+                                        headers=headers).get_json()
+
+        response_data = self.post_batch([2, 1]).get_json()
+
+        self.assertEqual([{'id': 1}, {'id': 3}], response_data['couriers'][1]['orders'])
+        self.assertEqual(single_response['orders'], response_data['couriers'][1]['orders'])
+        self.assertEqual(single_response['assign_time'], response_data['couriers'][1]['assign_time'])
+
+    def test_batch_assign_should_be_idempotency(self):
+        first_response = self.post_batch([1, 2]).get_json()
+        second_response = self.post_batch([1, 2]).get_json()
+        self.assertEqual(first_response, second_response)
+
+    def test_batch_of_busy_couriers_should_not_read_free_orders(self):
+        response_data = self.post_batch([1, 2, 3]).get_json()
+        busy_ids = [courier['courier_id'] for courier in response_data['couriers'] if courier['orders']]
+        assigned = self.post_batch(busy_ids).get_json()
+
+        with patch.object(Collection, 'find', autospec=True, side_effect=Collection.find) as find:
+            http_response = self.post_batch(busy_ids)
+
+        self.assertEqual(assigned, http_response.get_json())
+        self.assertEqual([{'status': 'in_progress', 'courier_id': {'$in': busy_ids}}],
+                         [call[1]['filter'] for call in find.call_args_list if call[0][0].name == 'orders'])
+
+    def test_should_return_bad_request_when_courier_not_found(self):
+        http_response = self.post_batch([1, 50])
+        self.assertEqual(400, http_response.status_code)
+        self.assertIn('Courier with specified id not found', http_response.get_data(as_text=True))
+
+
+if __name__ == '__main__':
+    unittest.main()
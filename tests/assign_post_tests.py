@@ -1,13 +1,16 @@
 import unittest
 from datetime import datetime
+from unittest.mock import patch
 
 from bson import json_util
+from mongomock.collection import Collection
 from parameterized import parameterized
 
 
 from tests import test_utils
 from utils.parser import parse_hours
-from utils.preparer import prepare_orders, prepare_couriers
+from utils.preparer import prepare_order, prepare_orders, prepare_couriers
+from utils.utils import split_orders
 
 
 class AssignPostTests(unittest.TestCase):
@@ -83,6 +86,82 @@ class AssignPostTests(unittest.TestCase):
         self.assertEqual(201, http_response.status_code)
         self.assertEqual([{'id': 1}, {'id': 3}], response_data['orders'])
 
+    def test_assign_should_not_exceed_courier_capacity(self):
+        headers = [('Content-Type', 'application/json')]
+        courier = {'data': [{'courier_id': 4, 'courier_type': 'foot', 'regions': [5, 22, 12], 'working_hours': ['10:00-11:00']}]}
+        self.add_courier(courier)
+        orders_data = {'data': [{'order_id': order_id, 'delivery_hours': ['09:00-18:00']} for order_id in range(10, 14)]}
+        parse_hours(orders_data, 'delivery_hours')
+        self.db['orders'].insert_many([prepare_order(order['order_id'], weight=4, region=12,
+                                                     delivery_hours=order['delivery_hours'])
+                                       for order in orders_data['data']])
+
+        http_response = self.app.post('/orders/assign', data=json_util.dumps({'courier_id': 4}), headers=headers)
+
+        order_ids = [order['id'] for order in http_response.get_json()['orders']]
+        weights = [self.db['orders'].find_one({'_id': order_id})['weight'] for order_id in order_ids]
+        self.assertEqual(4, len(order_ids))
+        self.assertIn(1, order_ids)
+        self.assertIn(3, order_ids)
+        self.assertAlmostEqual(8.24, sum(weights))
+
+    def test_assign_should_not_reread_orders_when_all_orders_claimed(self):
+        headers = [('Content-Type', 'application/json')]
+        courier = {'data': [{'courier_id': 4, 'courier_type': 'foot', 'regions': [5, 22, 12], 'working_hours': ['10:00-11:00']}]}
+        self.add_courier(courier)
+        with patch.object(Collection, 'find', autospec=True, side_effect=Collection.find) as find:
+            http_response = self.app.post('/orders/assign', data=json_util.dumps({'courier_id': 4}), headers=headers)
+        self.assertEqual([{'id': 1}, {'id': 3}], http_response.get_json()['orders'])
+        # Заказы курьера в работе, затем свободные заказы
+        self.assertEqual(['in_progress', 'not_assigned'], [call[1]['filter']['status'] for call in find.call_args_list
+                                                           if call[0][0].name == 'orders'])
+
+    def test_repeated_assign_should_read_only_orders_in_progress(self):
+        headers = [('Content-Type', 'application/json')]
+        courier = {'data': [{'courier_id': 4, 'courier_type': 'foot', 'regions': [5, 22, 12], 'working_hours': ['10:00-11:00']}]}
+        self.add_courier(courier)
+        self.app.post('/orders/assign', data=json_util.dumps({'courier_id': 4}), headers=headers)
+        with patch.object(Collection, 'find', autospec=True, side_effect=Collection.find) as find:
+            http_response = self.app.post('/orders/assign', data=json_util.dumps({'courier_id': 4}), headers=headers)
+        self.assertEqual([{'id': 1}, {'id': 3}], http_response.get_json()['orders'])
+        self.assertEqual([{'status': 'in_progress', 'courier_id': 4}],
+                         [call[1]['filter'] for call in find.call_args_list if call[0][0].name == 'orders'])
+
+    def test_assign_should_not_return_orders_claimed_by_another_worker(self):
+        headers = [('Content-Type', 'application/json')]
+        courier = {'data': [{'courier_id': 4, 'courier_type': 'foot', 'regions': [5, 22, 12], 'working_hours': ['10:00-11:00']}]}
+        self.add_courier(courier)
+
+        def split_orders_and_claim(orders_data, working_hours):
+            self.db['orders'].update_one({'_id': 1}, {'$set': {'status': 'in_progress', 'courier_id': 7,
+                                                               'assign_time': '2021-01-10T09:32:14.42Z'}})
+            return split_orders(orders_data, working_hours)
+
+        with patch('application.handlers.split_orders', side_effect=split_orders_and_claim):
+            http_response = self.app.post('/orders/assign', data=json_util.dumps({'courier_id': 4}), headers=headers)
+        response_data = http_response.get_json()
+        self.assertEqual(201, http_response.status_code)
+        self.assertEqual([{'id': 3}], response_data['orders'])
+        self.assertEqual(7, self.db['orders'].find_one({'_id': 1})['courier_id'])
+
+    def test_concurrent_assigns_of_one_courier_should_be_merged(self):
+        headers = [('Content-Type', 'application/json')]
+        courier = {'data': [{'courier_id': 4, 'courier_type': 'foot', 'regions': [5, 22, 12], 'working_hours': ['10:00-11:00']}]}
+        self.add_courier(courier)
+        earlier_assign_time = '2021-01-10T09:32:14.42Z'
+
+        def split_orders_and_assign(orders_data, working_hours):
+            self.db['orders'].update_one({'_id': 1}, {'$set': {'status': 'in_progress', 'courier_id': 4,
+                                                               'assign_time': earlier_assign_time}})
+            return split_orders(orders_data, working_hours)
+
+        with patch('application.handlers.split_orders', side_effect=split_orders_and_assign):
+            http_response = self.app.post('/orders/assign', data=json_util.dumps({'courier_id': 4}), headers=headers)
+        response_data = http_response.get_json()
+        self.assertEqual([{'id': 1}, {'id': 3}], response_data['orders'])
+        self.assertEqual(earlier_assign_time, response_data['assign_time'])
+        self.assertEqual(earlier_assign_time, self.db['orders'].find_one({'_id': 3})['assign_time'])
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -1,6 +1,7 @@
 import unittest
 
 from jsonschema import ValidationError
+from parameterized import parameterized
 
 from application.data_validator import DataValidator
 
@@ -28,6 +29,20 @@ class AssignValidatorTests(unittest.TestCase):
     def test_assign_should_be_incorrect_when_wrong_type_of_field(self):
         self.assert_exception({'courier_id': ''}, '\'integer\'')
 
+    def test_correct_assign_batch_should_be_valid(self):
+        self.data_validator.validate_assign_batch({'courier_ids': [1, 2]})
+
+    @parameterized.expand([
+        ({}, '\'courier_ids\' is a required property'),
+        ({'courier_ids': []}, 'should be non-empty'),
+        ({'courier_ids': [1, 1]}, 'non-unique elements'),
+        ({'courier_ids': ['']}, '\'integer\''),
+    ])
+    def test_assign_batch_should_be_incorrect(self, assign_batch_data: dict, expected_exception_message: str):
+        with self.assertRaises(ValidationError) as context:
+            self.data_validator.validate_assign_batch(assign_batch_data)
+        self.assertIn(expected_exception_message, str(context.exception.message))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,135 @@
+import itertools
+import random
+import unittest
+
+from parameterized import parameterized
+
+from utils.assignment import WEIGHT_SCALE, changed_constraints, courier_capacity, couriers_to_recheck, \
+    plan_assignments, plan_unassign, revalidate_orders, select_orders
+from utils.parser import pack_interval
+from utils.utils import split_orders
+
+
+def make_orders(weights):
+    return [{'_id': i + 1, 'weight': weight} for i, weight in enumerate(weights)]
+
+
+def total_weight(orders):
+    return sum(round(order['weight'] * WEIGHT_SCALE) for order in orders)
+
+
+def best_total_weight(orders, capacity):
+    limit = round(capacity * WEIGHT_SCALE)
+    best = 0
+    for size in range(len(orders) + 1):
+        for subset in itertools.combinations(orders, size):
+            weight = total_weight(subset)
+            if best < weight <= limit:
+                best = weight
+    return best
+
+
+class AssignmentTests(unittest.TestCase):
+    @parameterized.expand([('foot', 10), ('bike', 15), ('car', 50)])
+    def test_courier_capacity_should_depend_on_type(self, courier_type: str, capacity: int):
+        self.assertEqual(capacity, courier_capacity(courier_type))
+
+    def test_all_orders_should_be_selected_when_they_fit(self):
+        orders = make_orders([0.23, 4, 5.77])
+        self.assertEqual(orders, select_orders(orders, 10))
+
+    def test_too_heavy_orders_should_not_be_selected(self):
+        orders = make_orders([11, 3, 12.5])
+        self.assertEqual([orders[1]], select_orders(orders, 10))
+
+    def test_selection_should_be_better_than_greedy(self):
+        orders = make_orders([6, 5, 5])
+        self.assertEqual(orders[1:], select_orders(orders, 10))
+
+    @parameterized.expand([(seed,) for seed in range(20)])
+    def test_selection_should_be_optimal(self, seed: int):
+        rnd = random.Random(seed)
+        orders = make_orders([rnd.randrange(1, 800) / 100 for _ in range(rnd.randrange(1, 11))])
+        selected = select_orders(orders, 10)
+        self.assertEqual(best_total_weight(orders, 10), total_weight(selected))
+        self.assertEqual(len(selected), len({order['_id'] for order in selected}))
+
+    def test_selection_should_respect_capacity_for_many_orders(self):
+        rnd = random.Random(1)
+        orders = make_orders([rnd.randrange(1, 5000) / 100 for _ in range(10000)])
+        selected = select_orders(orders, 15)
+        self.assertEqual(15 * WEIGHT_SCALE, total_weight(selected))
+        self.assertEqual([order['_id'] for order in selected], sorted(order['_id'] for order in selected))
+
+    def test_plan_should_respect_constraints_of_single_assign(self):
+        rnd = random.Random(5)
+        orders = [{'_id': i + 1, 'weight': rnd.randrange(1, 2000) / 100, 'region': rnd.randrange(1, 4),
+                   'delivery_hours': [pack_interval(rnd.randrange(600), rnd.randrange(600, 1440))]}
+                  for i in range(300)]
+        couriers = [{'_id': i + 1, 'courier_type': rnd.choice(['foot', 'bike', 'car']),
+                     'regions': rnd.sample([1, 2, 3], 2), 'working_hours': [pack_interval(600, 660)]}
+                    for i in range(10)]
+
+        plan = plan_assignments(couriers, orders)
+
+        planned_ids = [order['_id'] for orders in plan.values() for order in orders]
+        self.assertEqual(len(planned_ids), len(set(planned_ids)))
+        for courier in couriers:
+            planned = plan[courier['_id']]
+            self.assertLessEqual(total_weight(planned), courier_capacity(courier['courier_type']) * WEIGHT_SCALE)
+            self.assertTrue(all(order['region'] in courier['regions'] for order in planned))
+            matched, _ = split_orders(planned, courier['working_hours'])
+            self.assertEqual(planned, matched)
+
+    def test_plan_for_one_courier_should_be_equal_to_single_assign(self):
+        orders = [{'_id': i + 1, 'weight': weight, 'region': 1, 'delivery_hours': [pack_interval(540, 1080)]}
+                  for i, weight in enumerate([6, 5, 5, 0.5])]
+        courier = {'_id': 1, 'courier_type': 'foot', 'regions': [1], 'working_hours': [pack_interval(600, 660)]}
+        self.assertEqual({1: select_orders(orders, 10)}, plan_assignments([courier], orders))
+
+    def test_changed_constraints_should_ignore_unchanged_fields(self):
+        courier = {'_id': 1, 'courier_type': 'bike', 'regions': [1, 2], 'working_hours': [pack_interval(600, 660)]}
+
+        self.assertEqual(set(), changed_constraints(courier, {'regions': [1, 2], 'courier_type': 'bike'}))
+        self.assertEqual({'working_hours'}, changed_constraints(courier, {'working_hours': [pack_interval(600, 700)]}))
+
+    @parameterized.expand([('foot', {'courier_type'}), ('car', set())])
+    def test_changed_constraints_should_check_weight_only_when_capacity_decreases(self, courier_type, expected):
+        courier = {'_id': 1, 'courier_type': 'bike', 'regions': [1], 'working_hours': []}
+        self.assertEqual(expected, changed_constraints(courier, {'courier_type': courier_type}))
+
+    def test_revalidate_orders_should_check_only_changed_constraints(self):
+        orders = [{'_id': i + 1, 'weight': weight, 'region': region, 'delivery_hours': [pack_interval(540, 720)]}
+                  for i, (weight, region) in enumerate([(6, 1), (5, 2), (4, 3)])]
+        courier = {'_id': 1, 'courier_type': 'foot', 'regions': [1, 2], 'working_hours': [pack_interval(780, 840)]}
+
+        self.assertEqual(orders[:2], revalidate_orders(orders, courier, {'regions'}))
+        self.assertEqual([orders[0], orders[2]], revalidate_orders(orders, courier, {'courier_type'}))
+        self.assertEqual([], revalidate_orders(orders, courier, {'working_hours'}))
+
+
+    def test_plan_unassign_should_read_orders_only_when_not_only_regions_changed(self):
+        moved = {'_id': 1, 'courier_type': 'foot', 'regions': [2], 'working_hours': []}
+        retyped = {'_id': 2, 'courier_type': 'foot', 'regions': [1], 'working_hours': []}
+        patched = [(moved, {'regions'}), (retyped, {'courier_type'})]
+        orders = [{'_id': 10, 'courier_id': 2, 'weight': 6, 'region': 1},
+                  {'_id': 11, 'courier_id': 2, 'weight': 5, 'region': 1}]
+
+        rechecked = couriers_to_recheck(patched)
+        unassign_filter, un_orders = plan_unassign(patched, rechecked, orders)
+
+        self.assertEqual([2], list(rechecked))
+        self.assertEqual([1, 2], list(couriers_to_recheck(patched, read_orders=True)))
+        self.assertEqual([orders[1]], un_orders)
+        self.assertEqual({'status': 'in_progress', '$or': [{'courier_id': 1, 'region': {'$nin': [2]}},
+                                                           {'_id': {'$in': [11]}}]}, unassign_filter)
+
+    def test_plan_unassign_should_be_empty_when_all_orders_are_kept(self):
+        courier = {'_id': 1, 'courier_type': 'foot', 'regions': [1], 'working_hours': []}
+        patched = [(courier, {'courier_type'})]
+        orders = [{'_id': 10, 'courier_id': 1, 'weight': 6, 'region': 1}]
+
+        self.assertEqual((None, []), plan_unassign(patched, couriers_to_recheck(patched), orders))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,173 @@
+import asyncio
+import unittest
+from datetime import datetime, timedelta
+
+from jsonschema import ValidationError
+
+from application.data_validator import DataValidator
+from application.ingestion import IngestionMode
+from application.metrics import Metrics
+from application.service import make_app
+from tests import test_utils
+from tests.ndjson_post_tests import to_ndjson
+from utils.parser import parse_hours
+from utils.preparer import prepare_couriers, prepare_orders
+
+
+def run(coroutine):
+    return asyncio.get_event_loop().run_until_complete(coroutine)
+
+
+class AsyncServiceTests(unittest.TestCase):
+    @classmethod
+    def setUp(cls):
+        cls.app, cls.db, cls.validator = test_utils.set_up_async_service()
+        cls.sync_app, cls.sync_db, cls.sync_validator = test_utils.set_up_service()
+
+        for db in (cls.db, cls.sync_db):
+            couriers_data = test_utils.read_data('couriers.json')
+            parse_hours(couriers_data, 'working_hours')
+            db['couriers'].insert_many(prepare_couriers(couriers_data))
+            orders_data = test_utils.read_data('orders.json')
+            parse_hours(orders_data, 'delivery_hours')
+            db['orders'].insert_many(prepare_orders(orders_data))
+
+    def request(self, method: str, url: str, **kwargs):
+        async def send():
+            http_response = await getattr(self.app, method)(url, **kwargs)
+            return http_response.status_code, await http_response.get_json()
+
+        return run(send())
+
+    def sync_request(self, method: str, url: str, **kwargs):
+        http_response = getattr(self.sync_app, method)(url, **kwargs)
+        return http_response.status_code, http_response.get_json()
+
+    def assert_same_response(self, method: str, url: str, data: dict, ignore=()):
+        status_code, response_data = self.request(method, url, json=data)
+        sync_status_code, sync_response_data = self.sync_request(method, url, json=data)
+        for key in ignore:
+            response_data.pop(key, None)
+            sync_response_data.pop(key, None)
+        self.assertEqual((sync_status_code, sync_response_data), (status_code, response_data))
+        return response_data
+
+    def test_add_couriers_and_orders_should_match_sync_app(self):
+        courier = {'courier_id': 4, 'courier_type': 'car', 'regions': [1], 'working_hours': []}
+        order = {'order_id': 4, 'weight': 1, 'region': 1, 'delivery_hours': []}
+
+        self.assertEqual({'couriers': [{'id': 4}]},
+                         self.assert_same_response('post', '/couriers', {'data': [courier]}))
+        self.assertEqual({'orders': [{'id': 4}]},
+                         self.assert_same_response('post', '/orders', {'data': [order]}))
+
+    def test_assign_and_complete_should_match_sync_app(self):
+        response_data = self.assert_same_response('post', '/orders/assign', {'courier_id': 1}, ignore=['assign_time'])
+        self.assertEqual({'orders': [{'id': 1}, {'id': 3}]}, response_data)
+
+        complete_time = (datetime.utcnow() + timedelta(minutes=10)).isoformat() + 'Z'
+        for order_id in (1, 3):
+            complete_data = {'courier_id': 1, 'order_id': order_id, 'complete_time': complete_time}
+            self.assertEqual({'order_id': order_id},
+                             self.assert_same_response('post', '/orders/complete', complete_data))
+
+        courier = self.db['couriers'].find_one({'_id': 1})
+        self.assertEqual({'foot': 1}, courier['completed_assigns'])
+        self.assertEqual(self.sync_db['couriers'].find_one({'_id': 1})['delivery_stats'].keys(),
+                         courier['delivery_stats'].keys())
+
+    def test_patch_should_unassign_orders_out_of_regions(self):
+        self.request('post', '/orders/assign', json={'courier_id': 1})
+
+        status_code, response_data = self.request('patch', '/couriers/1', json={'regions': [22]})
+
+        self.assertEqual(201, status_code)
+        self.assertEqual([22], response_data['regions'])
+        self.assertEqual('not_assigned', self.db['orders'].find_one({'_id': 1})['status'])
+        self.assertEqual('in_progress', self.db['orders'].find_one({'_id': 3})['status'])
+
+    def test_patch_of_working_hours_should_match_sync_app(self):
+        self.request('post', '/orders/assign', json={'courier_id': 1})
+        self.sync_request('post', '/orders/assign', json={'courier_id': 1})
+        for validator in (self.validator, self.sync_validator):
+            validator.validate_courier_patch.side_effect = DataValidator().validate_courier_patch
+
+        self.assert_same_response('patch', '/couriers/1', {'working_hours': ['11:35-14:05']})
+
+        for db in (self.db, self.sync_db):
+            self.assertEqual(['in_progress', 'not_assigned'],
+                             [db['orders'].find_one({'_id': order_id})['status'] for order_id in (1, 3)])
+
+    def test_errors_should_match_sync_app(self):
+        self.assert_same_response('post', '/orders/assign', {'courier_id': 5})
+        self.assert_same_response('post', '/orders/complete', {'courier_id': 1, 'order_id': 50,
+                                                               'complete_time': '2021-01-10T10:33:01.42Z'})
+
+        self.assertEqual((400, {'message': 'Error when parsing JSON: 400 Bad Request: '
+                                           'Content-Type must be application/json'}),
+                         self.request('post', '/orders', data='{}'))
+
+    def test_validation_error_should_match_sync_app(self):
+        for validator in (self.validator, self.sync_validator):
+            validator.validate_orders.side_effect = ValidationError({'orders': [{'id': 1}]})
+
+        self.assertEqual({'validation_error': {'orders': [{'id': 1}]}},
+                         self.assert_same_response('post', '/orders', {'data': []}))
+
+
+    def test_ndjson_post_should_match_sync_app(self):
+        orders = [{'order_id': 4, 'weight': 1, 'region': 1, 'delivery_hours': ['10:00-11:00']},
+                  {'order_id': 1, 'weight': 1, 'region': 1, 'delivery_hours': ['10:00-11:00']}]
+        data = to_ndjson(orders[:1]) + '\n{\n' + to_ndjson(orders[1:])
+        headers = [('Content-Type', 'application/x-ndjson')]
+
+        status_code, response_data = self.request('post', '/orders', data=data, headers=headers)
+
+        self.assertEqual(self.sync_request('post', '/orders', data=data, headers=headers), (status_code, response_data))
+        self.assertEqual({'orders': [{'id': 4}], 'errors': [{'id': None, 'line': 3}, {'id': 1, 'line': 4}]},
+                         response_data)
+
+    def test_unordered_ingestion_should_match_sync_app(self):
+        self.app, self.db, _ = test_utils.set_up_async_service(ingestion=IngestionMode(ordered=False))
+        self.sync_app = make_app(self.sync_db, self.sync_validator,
+                                 ingestion=IngestionMode(ordered=False)).test_client()
+        self.sync_db['orders'].delete_many({})
+        for db in (self.db, self.sync_db):
+            db['orders'].insert_one({'_id': 1})
+        orders = [{'order_id': order_id, 'weight': 1, 'region': 1, 'delivery_hours': []} for order_id in (1, 2)]
+
+        self.assertEqual({'validation_error': {'orders': [{'id': 1}]}},
+                         self.assert_same_response('post', '/orders', {'data': orders}))
+        self.assertEqual(1, self.db['orders'].count_documents({'_id': 2}))
+
+    def test_batch_handlers_should_match_sync_app(self):
+        status_code, response_data = self.request('post', '/orders/assign/batch', json={'courier_ids': [1, 2]})
+        sync_status_code, sync_response_data = self.sync_request('post', '/orders/assign/batch',
+                                                                 json={'courier_ids': [1, 2]})
+        for courier in response_data['couriers'] + sync_response_data['couriers']:
+            courier.pop('assign_time', None)
+        self.assertEqual((sync_status_code, sync_response_data), (status_code, response_data))
+        self.assertEqual([{'id': 1}, {'id': 3}], response_data['couriers'][0]['orders'])
+        complete_time = (datetime.utcnow() + timedelta(minutes=10)).isoformat() + 'Z'
+        completions = [{'courier_id': 1, 'order_id': order_id, 'complete_time': complete_time} for order_id in (1, 3)]
+
+        self.assertEqual({'orders': [{'id': 1}, {'id': 3}]},
+                         self.assert_same_response('post', '/orders/complete/batch', {'data': completions}))
+        self.assertEqual({'foot': 1}, self.db['couriers'].find_one({'_id': 1})['completed_assigns'])
+        self.assert_same_response('patch', '/couriers', {'data': [{'courier_id': 2, 'regions': [1]}]})
+        self.assert_same_response('get', '/couriers/1', None)
+
+    def test_assign_should_use_courier_cache_and_metrics(self):
+        metrics = Metrics()
+        self.app, self.db, _ = test_utils.set_up_async_service(metrics=metrics)
+        self.db['couriers'].insert_one({'_id': 1, 'courier_type': 'foot', 'regions': [1], 'working_hours': []})
+
+        for _ in range(2):
+            self.assertEqual((201, {'orders': []}), self.request('post', '/orders/assign', json={'courier_id': 1}))
+
+        self.assertIn('courier_cache_requests_total{result="hit"} 1', metrics.render())
+        self.assertIn('http_request_duration_seconds_count{handler="assign_orders",status="201"} 2',
+                      metrics.render())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import logging
+import unittest
+
+import mongomock
+
+from application.data_validator import DataValidator
+from benchmarks.datasets import make_couriers, make_orders
+from benchmarks.load_test import run_load_test, start_server
+from benchmarks.results import compare_results, percentile, summarize
+
+
+class BenchmarksTests(unittest.TestCase):
+    def test_generated_data_should_be_valid(self):
+        validator = DataValidator()
+
+        validator.validate_couriers({'data': make_couriers(100, 10)})
+        validator.validate_orders({'data': make_orders(1000, 10)})
+
+    def test_generated_data_should_depend_on_seed(self):
+        self.assertEqual(make_orders(10, 5, seed=1), make_orders(10, 5, seed=1))
+        self.assertNotEqual(make_orders(10, 5, seed=1), make_orders(10, 5, seed=2))
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+
+        self.assertEqual((50, 95, 99, 100), tuple(percentile(values, q) for q in (50, 95, 99, 100)))
+        self.assertEqual(7, percentile([7], 99))
+
+    def test_summarize_and_compare(self):
+        baseline = {'results': {'route': summarize([0.01, 0.02], seconds=1)}}
+        current = {'results': {'route': summarize([0.02, 0.04], seconds=1)}}
+
+        self.assertEqual({'requests': 2, 'errors': 0, 'rps': 2.0, 'p50_ms': 10.0, 'p95_ms': 20.0, 'p99_ms': 20.0},
+                         baseline['results']['route'])
+        self.assertIn('+100.0%', compare_results(baseline, current)[1])
+
+    def test_load_test_should_drive_every_route(self):
+        logging.disable(logging.CRITICAL)
+        url, server = start_server(mongomock.MongoClient()['db'])
+        try:
+            results = run_load_test(url, couriers=10, orders=100, regions=3, concurrency=1, batch_size=30)
+        finally:
+            server.shutdown()
+            logging.disable(logging.NOTSET)
+
+        self.assertEqual(['POST /couriers', 'POST /orders', 'POST /orders/assign', 'POST /orders/complete',
+                          'GET /couriers/<id>', 'PATCH /couriers/<id>'], list(results))
+        self.assertEqual([1, 4, 10, 10, 10], [results[route]['requests'] for route in
+                                              ('POST /couriers', 'POST /orders', 'POST /orders/assign',
+                                               'GET /couriers/<id>', 'PATCH /couriers/<id>')])
+        self.assertTrue(results['POST /orders/complete']['requests'] > 0)
+        self.assertEqual(0, sum(stats['errors'] for stats in results.values()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+import unittest
+from datetime import timedelta
+from unittest.mock import patch
+
+from bson import json_util
+from iso8601 import iso8601
+from mongomock.collection import Collection
+
+from application import handlers
+from tests import test_utils
+from utils.parser import parse_hours
+from utils.preparer import prepare_couriers, prepare_orders
+
+
+class CompleteBatchPostTests(unittest.TestCase):
+    @classmethod
+    def setUp(cls):
+        cls.app, cls.db, cls.validator = test_utils.set_up_service()
+
+        couriers_data = test_utils.read_data('couriers.json')
+        parse_hours(couriers_data, 'working_hours')
+        cls.db['couriers'].insert_many(prepare_couriers(couriers_data))
+
+        orders_data = test_utils.read_data('orders.json')
+        parse_hours(orders_data, 'delivery_hours')
+        cls.db['orders'].insert_many(prepare_orders(orders_data))
+
+        headers = [('Content-Type', 'application/json')]
+        response_data = cls.app.post('/orders/assign', data=json_util.dumps({'courier_id': 1}),
+                                     headers=headers).get_json()
+        cls.assign_time = iso8601.parse_date(response_data['assign_time'])
+
+    def complete_time(self, minutes: int) -> str:
+        return (self.assign_time + timedelta(minutes=minutes)).isoformat().replace('+00:00', 'Z')
+
+    def post_batch(self, completions: list):
+        headers = [('Content-Type', 'application/json')]
+        return self.app.post('/orders/complete/batch', data=json_util.dumps({'data': completions}), headers=headers)
+
+    def test_batch_should_complete_orders_and_close_assign(self):
+        http_response = self.post_batch([
+            {'courier_id': 1, 'order_id': 3, 'complete_time': self.complete_time(25)},
+            {'courier_id': 1, 'order_id': 1, 'complete_time': self.complete_time(10)},
+        ])
+
+        self.assertEqual(201, http_response.status_code)
+        self.assertEqual({'orders': [{'id': 3}, {'id': 1}]}, http_response.get_json())
+        self.assertEqual(['completed', 'completed'], [self.db['orders'].find_one({'_id': order_id})['status']
+                                                      for order_id in (1, 3)])
+        courier = self.db['couriers'].find_one({'_id': 1})
+        self.assertNotIn('active_assign', courier)
+        self.assertEqual({'foot': 1}, courier['completed_assigns'])
+        self.assertEqual({'12': {'sum': 600, 'count': 1}, '22': {'sum': 900, 'count': 1}},
+                         courier['delivery_stats'])
+
+    def test_batch_should_match_single_completions(self):
+        headers = [('Content-Type', 'application/json')]
+        self.app.post('/orders/complete', headers=headers, data=json_util.dumps(
+            {'courier_id': 1, 'order_id': 1, 'complete_time': self.complete_time(10)}))
+
+        self.post_batch([{'courier_id': 1, 'order_id': 3, 'complete_time': self.complete_time(25)}])
+
+        courier = self.db['couriers'].find_one({'_id': 1})
+        self.assertEqual({'12': {'sum': 600, 'count': 1}, '22': {'sum': 900, 'count': 1}},
+                         courier['delivery_stats'])
+        self.assertEqual({'foot': 1}, courier['completed_assigns'])
+
+    def test_batch_should_be_idempotent(self):
+        completions = [{'courier_id': 1, 'order_id': 1, 'complete_time': self.complete_time(10)}]
+        self.post_batch(completions)
+
+        http_response = self.post_batch(completions)
+
+        self.assertEqual(201, http_response.status_code)
+        self.assertEqual({'orders': [{'id': 1}]}, http_response.get_json())
+        self.assertEqual({'12': {'sum': 600, 'count': 1}}, self.db['couriers'].find_one({'_id': 1})['delivery_stats'])
+
+    def test_order_completed_between_read_and_write_should_be_counted_once(self):
+        headers = [('Content-Type', 'application/json')]
+        completion = {'courier_id': 1, 'order_id': 1, 'complete_time': self.complete_time(10)}
+        find_orders = handlers.find_orders
+
+        def find_orders_then_complete(*args, **kwargs):
+            orders = yield from find_orders(*args, **kwargs)
+            # Одиночная отметка того же заказа успевает выполниться между чтением и записью пакета
+            self.app.post('/orders/complete', data=json_util.dumps(completion), headers=headers)
+            return orders
+
+        with patch('application.handlers.find_orders', find_orders_then_complete):
+            http_response = self.post_batch([completion])
+
+        self.assertEqual(201, http_response.status_code)
+        courier = self.db['couriers'].find_one({'_id': 1})
+        self.assertEqual({'12': {'sum': 600, 'count': 1}}, courier['delivery_stats'])
+        self.assertEqual(1, courier['active_assign']['completed'])
+        self.assertEqual(1, courier['active_assign']['outstanding'])
+        self.assertEqual('in_progress', self.db['orders'].find_one({'_id': 3})['status'])
+
+    def test_incorrect_completions_should_be_reported(self):
+        http_response = self.post_batch([
+            {'courier_id': 1, 'order_id': 1, 'complete_time': self.complete_time(10)},
+            {'courier_id': 2, 'order_id': 3, 'complete_time': self.complete_time(10)},
+            {'courier_id': 1, 'order_id': 2, 'complete_time': self.complete_time(10)},
+            {'courier_id': 5, 'order_id': 50, 'complete_time': self.complete_time(10)},
+        ])
+
+        self.assertEqual(400, http_response.status_code)
+        self.assertEqual({'orders': [{'id': 1}], 'errors': [{'id': 3}, {'id': 2}, {'id': 50}]},
+                         http_response.get_json())
+        self.assertEqual('completed', self.db['orders'].find_one({'_id': 1})['status'])
+        self.assertEqual('in_progress', self.db['orders'].find_one({'_id': 3})['status'])
+        self.assertIn('active_assign', self.db['couriers'].find_one({'_id': 1}))
+
+    def test_batch_should_use_one_write_per_collection(self):
+        completions = [{'courier_id': 1, 'order_id': order_id, 'complete_time': self.complete_time(10 * order_id)}
+                       for order_id in (1, 3)]
+        with patch.object(Collection, 'bulk_write', autospec=True, side_effect=Collection.bulk_write) as bulk_write:
+            with patch.object(Collection, 'aggregate', autospec=True, side_effect=Collection.aggregate) as aggregate:
+                self.post_batch(completions)
+
+        self.assertEqual(['orders', 'couriers'], [call[0][0].name for call in bulk_write.call_args_list])
+        self.assertEqual(1, aggregate.call_count)
+
+
+if __name__ == '__main__':
+    unittest.main()
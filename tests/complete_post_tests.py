@@ -1,6 +1,8 @@
 import unittest
+from unittest.mock import patch
 
 from bson import json_util
+from mongomock.collection import Collection
 from iso8601 import iso8601
 from parameterized import parameterized
 
@@ -8,7 +10,7 @@ from tests import test_utils
 
 
 from utils.parser import parse_hours
-from utils.preparer import prepare_couriers, prepare_orders, prepare_order
+from utils.preparer import prepare_active_assign, prepare_couriers, prepare_orders, prepare_order
 
 
 class CompletePostTests(unittest.TestCase):
@@ -74,5 +76,34 @@ class CompletePostTests(unittest.TestCase):
         self.assertEqual({'order_id': 33}, response_data)
 
 
+    def test_assign_started_while_completing_last_order_should_not_be_closed(self):
+        headers = [('Content-Type', 'application/json')]
+        self.app.post('/orders/assign', data=json_util.dumps({'courier_id': 1}), headers=headers)
+        complete_data = {'courier_id': 1, 'order_id': 1, 'complete_time': '2021-01-10T10:20:01.42Z'}
+        self.app.post('/orders/complete', data=json_util.dumps(complete_data), headers=headers)
+        update_one = Collection.update_one
+        assign_time = '2021-01-10T10:30:00Z'
+        concurrent_assigns = []
+
+        def concurrent_update_one(collection, filter, update, *args, **kwargs):
+            if collection.name == 'couriers' and 'active_assign' in filter and not concurrent_assigns:
+                # Новое назначение успевает начаться между чтением курьера и обновлением
+                concurrent_assigns.append(4)
+                self.db['orders'].insert_one(prepare_order(4, region=12, status='in_progress', courier_id=1,
+                                                           assign_time=assign_time))
+                # mongomock отдаёт вложенные документы по ссылке, поэтому документ курьера сначала заменяется копией
+                collection.replace_one({'_id': 1}, collection.find_one({'_id': 1}))
+                update_one(collection, {'_id': 1}, prepare_active_assign({'courier_type': 'foot'}, assign_time, 1))
+            return update_one(collection, filter, update, *args, **kwargs)
+
+        with patch.object(Collection, 'update_one', concurrent_update_one):
+            complete_data = {'courier_id': 1, 'order_id': 3, 'complete_time': '2021-01-10T10:25:01.42Z'}
+            http_response = self.app.post('/orders/complete', data=json_util.dumps(complete_data), headers=headers)
+
+        self.assertEqual(201, http_response.status_code)
+        courier = self.db['couriers'].find_one({'_id': 1})
+        self.assertEqual(1, courier['active_assign']['outstanding'])
+        self.assertEqual(2, sum(stats['count'] for stats in courier['delivery_stats'].values()))
+
 if __name__ == '__main__':
     unittest.main()
@@ -55,6 +55,27 @@ class CompleteValidatorTests(unittest.TestCase):
         self.assertIsInstance(date_time, datetime)
         self.assertEqual(iso8601.parse_date('2021-01-10T10:33:01.42Z'), date_time)
 
+    def test_complete_batch_should_report_all_incorrect_items(self):
+        complete_batch_data = {'data': [
+            {'courier_id': 2, 'order_id': 33, 'complete_time': 'abc'},
+            {'courier_id': 2, 'order_id': 34, 'complete_time': '2021-01-10T10:33:01.42Z'},
+            {'courier_id': 2, 'order_id': 35},
+        ]}
+        with self.assertRaises(ValidationError) as context:
+            self.data_validator.validate_complete_batch(complete_batch_data)
+        self.assertEqual({'orders': [{'id': 33}, {'id': 35}]}, context.exception.message)
+
+    def test_complete_batch_should_be_incorrect_when_order_ids_not_unique(self):
+        complete_data = {'courier_id': 2, 'order_id': 33, 'complete_time': '2021-01-10T10:33:01.42Z'}
+        with self.assertRaises(ValidationError) as context:
+            self.data_validator.validate_complete_batch({'data': [complete_data, dict(complete_data)]})
+        self.assertIn('Orders ids are not unique', str(context.exception.message))
+
+    def test_complete_batch_date_time_should_be_parsed(self):
+        complete_batch_data = {'data': [{'courier_id': 2, 'order_id': 33, 'complete_time': '2021-01-10T10:33:01.42Z'}]}
+        self.data_validator.validate_complete_batch(complete_batch_data)
+        self.assertEqual(iso8601.parse_date('2021-01-10T10:33:01.42Z'), complete_batch_data['data'][0]['complete_time'])
+
 
 if __name__ == '__main__':
     unittest.main()
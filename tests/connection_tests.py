@@ -0,0 +1,150 @@
+import unittest
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+from mongomock import MongoClient
+from pymongo.errors import OperationFailure
+
+from application.custom_mongo_client import ConnectionManager, PoolStatsListener
+from application.data_validator import DataValidator
+from application.imports import ImportWorker
+from application.indexes import INDEXES
+from application.metrics import MONGO_POOL_METRIC, MONGO_POOL_WAIT_METRIC, Metrics
+from application.service import make_app
+from tests import test_utils
+
+ENVIRON = {
+    'DATABASE_URI': 'mongo',
+    'REPLICA_SET': 'rs0',
+    'MONGO_MAX_POOL_SIZE': '20',
+    'MONGO_WAIT_QUEUE_TIMEOUT_MS': '1000',
+    'MONGO_READ_PREFERENCE': 'secondaryPreferred',
+    'MONGO_WRITE_CONCERN': 'majority',
+    'MONGO_SOCKET_TIMEOUT_MS': '',
+}
+
+
+class ConnectionManagerTests(unittest.TestCase):
+    def test_settings_should_be_read_from_environ(self):
+        manager = ConnectionManager.from_environ(ENVIRON)
+
+        self.assertEqual(('mongo', 27017), (manager.host, manager.port))
+        self.assertEqual({'maxPoolSize': 20, 'waitQueueTimeoutMS': 1000, 'readPreference': 'secondaryPreferred',
+                          'w': 'majority', 'replicaset': 'rs0'}, manager.client_options())
+
+    def test_client_should_be_created_lazily_once_per_process(self):
+        client_class = MagicMock(side_effect=lambda *args, **kwargs: MagicMock())
+        callback = MagicMock()
+        manager = ConnectionManager.from_environ(ENVIRON, client_class=client_class)
+        manager.on_connect(callback)
+        client_class.assert_not_called()
+
+        with patch('application.custom_mongo_client.os.getpid', return_value=100):
+            first = manager.client
+            self.assertIs(first, manager.client)
+        with patch('application.custom_mongo_client.os.getpid', return_value=101):
+            second = manager.client
+
+        self.assertEqual(2, client_class.call_count)
+        self.assertEqual(2, callback.call_count)
+        self.assertEqual(('mongo', 27017), client_class.call_args[0])
+        self.assertEqual([manager.pool_listener], client_class.call_args[1]['event_listeners'])
+        self.assertEqual(20, client_class.call_args[1]['maxPoolSize'])
+        self.assertIsNot(first, second)
+
+    def test_database_should_use_client_of_current_process(self):
+        clients = []
+
+        def create_client(*args, **kwargs):
+            clients.append(MongoClient())
+            return clients[-1]
+
+        manager = ConnectionManager('mongo', 27017, client_class=create_client)
+        collection = manager.database('db')['orders']
+        with patch('application.custom_mongo_client.os.getpid', return_value=100):
+            collection.insert_one({'_id': 1})
+            self.assertEqual(1, collection.count_documents({}))
+        with patch('application.custom_mongo_client.os.getpid', return_value=101):
+            self.assertEqual(0, collection.count_documents({}))
+
+        self.assertEqual(2, len(clients))
+        self.assertEqual('orders', collection.name)
+
+    def test_app_should_start_after_connecting_in_each_process(self):
+        clients = []
+
+        def create_client(*args, **kwargs):
+            clients.append(MongoClient())
+            return clients[-1]
+
+        manager = ConnectionManager('mongo', 27017, client_class=create_client)
+        db = manager.database('db')
+        import_worker = ImportWorker(db, DataValidator(), executor=test_utils.ImmediateExecutor())
+        with patch.object(import_worker, 'submit') as submit:
+            make_app(db, DataValidator(), import_worker, on_connect=manager.on_connect)
+            # Приложение, созданное в мастере до форка, не обращается к монго и не запускает задачи
+            self.assertEqual([], clients)
+            submit.assert_not_called()
+
+            for pid in (100, 101):
+                with patch('application.custom_mongo_client.os.getpid', return_value=pid):
+                    manager.client
+
+        self.assertEqual(2, submit.call_count)
+        for client in clients:
+            for collection_name, indexes in INDEXES.items():
+                self.assertTrue({index.document['name'] for index in indexes}
+                                <= set(client['db'][collection_name].index_information()))
+
+    def test_replica_set_should_be_initiated_through_direct_connection(self):
+        client = MagicMock()
+        client.admin.command.side_effect = OperationFailure('already initialized')
+        client_class = MagicMock(return_value=client)
+        manager = ConnectionManager('mongo', 27017, 'rs0', client_class=client_class, serverSelectionTimeoutMS=500)
+
+        manager.initiate_replica_set()
+
+        client_class.assert_called_once_with('mongo', 27017, serverSelectionTimeoutMS=500)
+        client.admin.command.assert_called_once_with('replSetInitiate')
+        client.close.assert_called_once_with()
+
+
+class PoolStatsListenerTests(unittest.TestCase):
+    def test_listener_should_track_pool_utilization(self):
+        metrics = Metrics()
+        manager = ConnectionManager('mongo', 27017, metrics=metrics, maxPoolSize=4)
+        listener: PoolStatsListener = manager.pool_listener
+        event = SimpleNamespace(address=('mongo', 27017), connection_id=1)
+
+        for _ in range(3):
+            listener.connection_created(event)
+            listener.connection_check_out_started(event)
+            listener.connection_checked_out(event)
+        listener.connection_checked_in(event)
+        listener.connection_check_out_started(event)
+        listener.connection_check_out_failed(event)
+
+        stats = manager.pool_stats()
+        self.assertEqual({'open': 3, 'in_use': 2, 'checkouts': 3, 'failed_checkouts': 1, 'max_pool_size': 4,
+                          'utilization': 0.5}, {key: value for key, value in stats.items() if key != 'wait_seconds'})
+        snapshot = metrics.snapshot()
+        self.assertEqual({'[["state", "open"]]': [3], '[["state", "in_use"]]': [2]}, snapshot[MONGO_POOL_METRIC])
+        self.assertEqual(3, snapshot[MONGO_POOL_WAIT_METRIC]['[["outcome", "success"]]'][-1])
+
+    def test_reset_should_drop_parent_connections(self):
+        metrics = Metrics()
+        listener = PoolStatsListener(metrics)
+        event = SimpleNamespace(address=('mongo', 27017), connection_id=1)
+        listener.connection_created(event)
+        listener.connection_checked_out(event)
+
+        listener.reset()
+
+        self.assertEqual((0, 0), (listener.open, listener.in_use))
+        self.assertEqual({'[["state", "open"]]': [0], '[["state", "in_use"]]': [0]},
+                         metrics.snapshot()[MONGO_POOL_METRIC])
+        self.assertIn(f'# TYPE {MONGO_POOL_METRIC} gauge', metrics.render())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+from bson import json_util
+from mongomock import MongoClient
+
+from application.courier_cache import CourierCache
+from application.metrics import CACHE_METRIC, Metrics
+from tests import test_utils
+from utils.parser import parse_hours
+from utils.preparer import prepare_courier, prepare_couriers, prepare_orders
+
+
+class CourierCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.collection = MongoClient()['db']['couriers']
+        self.collection.insert_many([prepare_courier(courier_id, regions=[courier_id]) for courier_id in (1, 2, 3)])
+
+    def test_second_lookup_should_hit(self):
+        metrics = Metrics()
+        cache = CourierCache(self.collection, metrics=metrics)
+
+        first = cache.get(1)
+        second = cache.get(1)
+
+        self.assertIs(first, second)
+        self.assertEqual({'_id': 1, 'courier_type': 'foot', 'regions': [1], 'working_hours': []}, first)
+        self.assertEqual({'size': 1, 'hits': 1, 'misses': 1, 'invalidations': 0, 'hit_rate': 0.5}, cache.stats())
+        self.assertEqual({'[["result", "hit"]]': [1], '[["result", "miss"]]': [1]}, metrics.snapshot()[CACHE_METRIC])
+
+    def test_unknown_courier_should_not_be_cached(self):
+        cache = CourierCache(self.collection)
+
+        self.assertIsNone(cache.get(5))
+        self.assertEqual(0, cache.stats()['size'])
+
+    def test_entry_should_expire(self):
+        cache = CourierCache(self.collection, ttl=10)
+        with patch('application.courier_cache.time.monotonic', return_value=100):
+            cache.get(1)
+        self.collection.update_one({'_id': 1}, {'$set': {'regions': [7]}})
+
+        with patch('application.courier_cache.time.monotonic', return_value=105):
+            self.assertEqual([1], cache.get(1)['regions'])
+        with patch('application.courier_cache.time.monotonic', return_value=111):
+            self.assertEqual([7], cache.get(1)['regions'])
+
+    def test_least_recently_used_entry_should_be_evicted(self):
+        cache = CourierCache(self.collection, max_size=2)
+        cache.get(1)
+        cache.get(2)
+        cache.get(1)
+        cache.get(3)
+
+        cache.get(1)
+        cache.get(2)
+
+        self.assertEqual(1, cache.stats()['hits'] - 1)
+
+    def test_get_many_should_read_missing_couriers_with_one_query(self):
+        cache = CourierCache(self.collection)
+        cache.get(1)
+
+        with patch.object(self.collection, 'find', wraps=self.collection.find) as find:
+            couriers = cache.get_many([1, 2, 3, 5])
+
+        self.assertEqual([1, 2, 3], sorted(couriers))
+        self.assertEqual(1, find.call_count)
+        self.assertEqual({'$in': [2, 3, 5]}, find.call_args[0][0]['_id'])
+
+    def test_courier_read_before_invalidation_should_not_be_stored(self):
+        cache = CourierCache(self.collection)
+        find_one = self.collection.find_one
+
+        def find_one_and_invalidate(*args, **kwargs):
+            courier = find_one(*args, **kwargs)
+            cache.invalidate(1)
+            return courier
+
+        with patch.object(self.collection, 'find_one', side_effect=find_one_and_invalidate):
+            cache.get(1)
+
+        self.assertEqual(0, cache.stats()['size'])
+
+    def test_change_stream_should_invalidate_entries(self):
+        cache = CourierCache(self.collection)
+        cache.get(1)
+        stream = MagicMock()
+        stream.__enter__.return_value = stream
+        stream.__iter__.return_value = iter([{'documentKey': {'_id': 1}}])
+        collection = MagicMock()
+        collection.watch.side_effect = [stream, StopIteration()]
+        cache.collection = collection
+
+        with self.assertRaises(StopIteration):
+            cache.watch()
+
+        self.assertEqual(0, cache.stats()['size'])
+        self.assertEqual(1, cache.stats()['invalidations'])
+
+
+class CourierCacheServiceTests(unittest.TestCase):
+    def setUp(self):
+        self.app, self.db, self.validator = test_utils.set_up_service()
+        couriers_data = test_utils.read_data('couriers.json')
+        parse_hours(couriers_data, 'working_hours')
+        self.db['couriers'].insert_many(prepare_couriers(couriers_data))
+        orders_data = test_utils.read_data('orders.json')
+        parse_hours(orders_data, 'delivery_hours')
+        self.db['orders'].insert_many(prepare_orders(orders_data))
+
+    def post(self, url: str, data: dict, method='post'):
+        headers = [('Content-Type', 'application/json')]
+        return getattr(self.app, method)(url, data=json_util.dumps(data), headers=headers).get_json()
+
+    def test_patch_should_invalidate_cached_courier(self):
+        self.assertEqual([], self.post('/orders/assign', {'courier_id': 2})['orders'])
+
+        self.post('/couriers/2', {'regions': [12, 22]}, method='patch')
+        response_data = self.post('/orders/assign', {'courier_id': 2})
+
+        self.assertEqual([{'id': 1}], response_data['orders'])
+
+if __name__ == '__main__':
+    unittest.main()
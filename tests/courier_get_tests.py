@@ -0,0 +1,150 @@
+import unittest
+from datetime import timedelta
+
+from unittest.mock import patch
+
+from bson import json_util
+from iso8601 import iso8601
+from mongomock.collection import Collection
+
+from tests import test_utils
+from utils.parser import parse_hours
+from utils.preparer import prepare_active_assign, prepare_couriers, prepare_orders
+
+
+class CourierGetTests(unittest.TestCase):
+    @classmethod
+    def setUp(cls):
+        cls.app, cls.db, cls.validator = test_utils.set_up_service()
+
+        couriers_data = test_utils.read_data('couriers.json')
+        parse_hours(couriers_data, 'working_hours')
+        cls.db['couriers'].insert_many(prepare_couriers(couriers_data))
+
+        orders_data = test_utils.read_data('orders.json')
+        parse_hours(orders_data, 'delivery_hours')
+        cls.db['orders'].insert_many(prepare_orders(orders_data))
+
+    def post(self, url: str, data: dict):
+        headers = [('Content-Type', 'application/json')]
+        return self.app.post(url, data=json_util.dumps(data), headers=headers)
+
+    def assign(self, courier_id: int):
+        response_data = self.post('/orders/assign', {'courier_id': courier_id}).get_json()
+        return iso8601.parse_date(response_data['assign_time'])
+
+    def complete(self, courier_id: int, order_id: int, complete_time):
+        complete_data = {'courier_id': courier_id, 'order_id': order_id,
+                         'complete_time': complete_time.isoformat().replace('+00:00', 'Z')}
+        http_response = self.post('/orders/complete', complete_data)
+        self.assertEqual(201, http_response.status_code)
+
+    def test_courier_without_deliveries_should_have_no_rating(self):
+        http_response = self.app.get('/couriers/2')
+
+        self.assertEqual(200, http_response.status_code)
+        self.assertEqual({'courier_id': 2, 'courier_type': 'bike', 'regions': [22], 'working_hours': ['09:00-18:00'],
+                          'earnings': 0}, http_response.get_json())
+
+    def test_rating_should_use_minimal_average_time_over_regions(self):
+        assign_time = self.assign(1)
+        self.complete(1, 1, assign_time + timedelta(minutes=10))
+        self.complete(1, 3, assign_time + timedelta(minutes=30))
+
+        response_data = self.app.get('/couriers/1').get_json()
+
+        self.assertEqual(4.17, response_data['rating'])
+        self.assertEqual(1000, response_data['earnings'])
+        courier = self.db['couriers'].find_one({'_id': 1})
+        self.assertEqual({'12': {'sum': 600, 'count': 1}, '22': {'sum': 1200, 'count': 1}},
+                         courier['delivery_stats'])
+        self.assertNotIn('active_assign', courier)
+
+    def test_earnings_should_be_added_only_when_assign_is_completed(self):
+        assign_time = self.assign(1)
+        self.complete(1, 1, assign_time + timedelta(minutes=10))
+
+        response_data = self.app.get('/couriers/1').get_json()
+
+        self.assertEqual(0, response_data['earnings'])
+        self.assertEqual(4.17, response_data['rating'])
+
+    def test_earnings_should_depend_on_courier_type_at_assign_time(self):
+        assign_time = self.assign(1)
+        self.db['couriers'].update_one({'_id': 1}, {'$set': {'courier_type': 'car'}})
+        self.complete(1, 1, assign_time + timedelta(minutes=10))
+        self.complete(1, 3, assign_time + timedelta(minutes=20))
+
+        response_data = self.app.get('/couriers/1').get_json()
+
+        self.assertEqual(1000, response_data['earnings'])
+
+    def test_batch_assign_should_start_assign(self):
+        response_data = self.post('/orders/assign/batch', {'courier_ids': [1, 2]}).get_json()
+        assign_time = iso8601.parse_date(response_data['couriers'][0]['assign_time'])
+        self.complete(1, 1, assign_time + timedelta(minutes=10))
+
+        courier = self.db['couriers'].find_one({'_id': 1})
+
+        self.assertEqual('foot', courier['active_assign']['courier_type'])
+        self.assertEqual({'12': {'sum': 600, 'count': 1}}, courier['delivery_stats'])
+
+    def test_repeated_complete_should_not_change_stats(self):
+        assign_time = self.assign(1)
+        self.complete(1, 1, assign_time + timedelta(minutes=10))
+        self.complete(1, 1, assign_time + timedelta(minutes=10))
+
+        courier = self.db['couriers'].find_one({'_id': 1})
+
+        self.assertEqual({'12': {'sum': 600, 'count': 1}}, courier['delivery_stats'])
+
+    def test_assign_should_count_outstanding_orders(self):
+        assign_time = self.assign(1)
+        self.assertEqual(2, self.db['couriers'].find_one({'_id': 1})['active_assign']['outstanding'])
+
+        self.complete(1, 1, assign_time + timedelta(minutes=10))
+
+        self.assertEqual(1, self.db['couriers'].find_one({'_id': 1})['active_assign']['outstanding'])
+
+    def test_last_complete_should_close_assign_without_reading_orders_in_progress(self):
+        assign_time = self.assign(1)
+        self.complete(1, 1, assign_time + timedelta(minutes=10))
+
+        with patch.object(Collection, 'find', autospec=True, side_effect=Collection.find) as find:
+            self.complete(1, 3, assign_time + timedelta(minutes=20))
+
+        self.assertNotIn({'courier_id': 1, 'status': 'in_progress'}, [call[0][1] for call in find.call_args_list])
+        courier = self.db['couriers'].find_one({'_id': 1})
+        self.assertNotIn('active_assign', courier)
+        self.assertEqual({'foot': 1}, courier['completed_assigns'])
+
+    def test_assign_without_counter_should_be_closed_by_orders_in_progress(self):
+        assign_time = self.assign(1)
+        self.db['couriers'].update_one({'_id': 1}, {'$unset': {'active_assign.outstanding': ''}})
+
+        self.complete(1, 1, assign_time + timedelta(minutes=10))
+        self.assertIn('active_assign', self.db['couriers'].find_one({'_id': 1}))
+        self.complete(1, 3, assign_time + timedelta(minutes=20))
+
+        self.assertEqual(1000, self.app.get('/couriers/1').get_json()['earnings'])
+
+    def test_parallel_assigns_should_be_merged(self):
+        courier = self.db['couriers'].find_one({'_id': 1})
+        self.db['couriers'].update_one({'_id': 1}, prepare_active_assign(courier, '2021-01-10T10:00:02.00Z', 2))
+        self.db['couriers'].update_one({'_id': 1}, prepare_active_assign(courier, '2021-01-10T10:00:01.00Z', 1))
+
+        active_assign = self.db['couriers'].find_one({'_id': 1})['active_assign']
+
+        self.assertEqual(3, active_assign['outstanding'])
+        self.assertEqual('2021-01-10T10:00:01.00Z', active_assign['assign_time'])
+        self.assertEqual(0, active_assign['completed'])
+
+    def test_should_return_bad_request_when_no_courier_found(self):
+        http_response = self.app.get('/couriers/5')
+
+        self.assertEqual(400, http_response.status_code)
+        self.assertIn('Courier with specified id not found', http_response.get_data(as_text=True))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,11 +1,13 @@
 import unittest
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 
 from bson import json_util
 from jsonschema import ValidationError
+from mongomock.collection import Collection
 
 import tests.test_utils as test_utils
-from utils.preparer import prepare_couriers
+from utils.parser import parse_hours, parse_intervals
+from utils.preparer import prepare_couriers, prepare_orders
 
 
 class CourierPatchTests(unittest.TestCase):
@@ -13,6 +15,7 @@ class CourierPatchTests(unittest.TestCase):
     def setUp(cls):
         cls.app, cls.db, cls.validator = test_utils.set_up_service()
         couriers_data = test_utils.read_data('couriers.json')
+        parse_hours(couriers_data, 'working_hours')
         data_to_insert = prepare_couriers(couriers_data)
         cls.db['couriers'].insert_many(data_to_insert)
 
@@ -54,6 +57,57 @@ class CourierPatchTests(unittest.TestCase):
         self.assertIn('Error when parsing JSON', response_data)
         self.assertEqual(400, http_response.status_code)
 
+    def assign_orders(self):
+        orders_data = test_utils.read_data('orders.json')
+        parse_hours(orders_data, 'delivery_hours')
+        self.db['orders'].insert_many(prepare_orders(orders_data))
+        headers = [('Content-Type', 'application/json')]
+        self.app.post('/orders/assign', data=json_util.dumps({'courier_id': 1}), headers=headers)
+
+    def patch_courier(self, patch_data):
+        headers = [('Content-Type', 'application/json')]
+        with patch.object(Collection, 'find', autospec=True, side_effect=Collection.find) as find:
+            http_response = self.app.patch('/couriers/1', data=json_util.dumps(patch_data), headers=headers)
+        self.assertEqual(201, http_response.status_code)
+        # Заказы читаются через find(filter=...), find_one и distinct mongomock вызывает find позиционно
+        return [call for call in find.call_args_list if call[0][0].name == 'orders' and 'filter' in call[1]]
+
+    def order_statuses(self):
+        return {order['_id']: order['status'] for order in self.db['orders'].find()}
+
+    def test_patch_regions_should_unassign_orders_without_reading_them(self):
+        self.assign_orders()
+
+        orders_reads = self.patch_courier({'regions': [22]})
+
+        self.assertEqual([], orders_reads)
+        self.assertEqual({1: 'not_assigned', 2: 'not_assigned', 3: 'in_progress'}, self.order_statuses())
+        self.assertIsNone(self.db['orders'].find_one({'_id': 1})['courier_id'])
+        self.assertIn('active_assign', self.db['couriers'].find_one({'_id': 1}))
+
+    def test_patch_working_hours_should_unassign_orders_out_of_hours(self):
+        self.assign_orders()
+
+        self.patch_courier({'working_hours': parse_intervals(['13:00-14:00'])})
+
+        self.assertEqual({1: 'in_progress', 2: 'not_assigned', 3: 'not_assigned'}, self.order_statuses())
+
+    def test_patch_with_greater_capacity_should_keep_orders_without_reading_them(self):
+        self.assign_orders()
+
+        orders_reads = self.patch_courier({'courier_type': 'car', 'regions': [1, 12, 22]})
+
+        self.assertEqual([], orders_reads)
+        self.assertEqual({1: 'in_progress', 2: 'not_assigned', 3: 'in_progress'}, self.order_statuses())
+
+    def test_patch_unassigning_all_orders_should_close_assign(self):
+        self.assign_orders()
+
+        self.patch_courier({'regions': [1]})
+
+        self.assertEqual({1: 'not_assigned', 2: 'not_assigned', 3: 'not_assigned'}, self.order_statuses())
+        self.assertNotIn('active_assign', self.db['couriers'].find_one({'_id': 1}))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+from datetime import datetime, timedelta, timezone
+
+from parameterized import parameterized
+
+from utils.courier_stats import closed_assign_update, completion_update, courier_earnings, courier_rating, \
+    delivery_duration, to_utc
+
+
+COMPLETE_TIME = datetime(2021, 1, 10, 9, 30)
+
+
+class CourierStatsTests(unittest.TestCase):
+    @parameterized.expand([
+        ({}, None),
+        ({'1': {'sum': 0, 'count': 0}}, None),
+        ({'1': {'sum': 1800, 'count': 2}, '2': {'sum': 3600, 'count': 1}}, 3.75),
+        ({'1': {'sum': 7200, 'count': 1}}, 0),
+        ({'1': {'sum': 0, 'count': 3}}, 5),
+    ])
+    def test_courier_rating(self, delivery_stats: dict, rating):
+        self.assertEqual(rating, courier_rating(delivery_stats))
+
+    def test_courier_earnings(self):
+        self.assertEqual(500 * (2 * 3 + 9), courier_earnings({'foot': 3, 'car': 1}))
+        self.assertEqual(0, courier_earnings({}))
+
+    def test_to_utc_should_return_naive_time(self):
+        expected = datetime(2021, 1, 10, 9, 33, 1, 420000)
+        moscow = timezone(timedelta(hours=3))
+
+        self.assertEqual(expected, to_utc('2021-01-10T09:33:01.42Z'))
+        self.assertEqual(expected, to_utc(datetime(2021, 1, 10, 12, 33, 1, 420000, tzinfo=moscow)))
+        self.assertEqual(expected, to_utc(expected))
+
+    def test_completion_update_should_close_assign_on_last_order(self):
+        courier = {'_id': 1, 'courier_type': 'car', 'active_assign': {'courier_type': 'foot', 'outstanding': 1}}
+
+        self.assertEqual({'$inc': {'delivery_stats.12.sum': 600, 'delivery_stats.12.count': 1,
+                                   'assigns': 1, 'completed_assigns.foot': 1},
+                          '$unset': {'active_assign': ''}}, completion_update(courier, 12, 600, COMPLETE_TIME))
+
+    @parameterized.expand([({'outstanding': 2},), ({},)])
+    def test_completion_update_should_keep_assign(self, active_assign: dict):
+        courier = {'_id': 1, 'courier_type': 'foot', 'active_assign': active_assign}
+
+        self.assertEqual({'$inc': {'delivery_stats.12.sum': 600, 'delivery_stats.12.count': 1,
+                                   'active_assign.completed': 1, 'active_assign.outstanding': -1},
+                          '$max': {'active_assign.last_complete_time': COMPLETE_TIME}},
+                         completion_update(courier, 12, 600, COMPLETE_TIME))
+
+
+    @parameterized.expand([(None, 600), ('2021-01-10T09:25:00Z', 300)])
+    def test_delivery_duration_should_start_at_previous_completion(self, last_complete_time, expected):
+        complete_time = datetime(2021, 1, 10, 9, 30)
+
+        self.assertEqual(expected, delivery_duration(complete_time, last_complete_time, '2021-01-10T09:20:00Z'))
+
+    def test_closed_assign_should_be_paid_only_with_completed_orders(self):
+        courier = {'_id': 1, 'courier_type': 'car', 'active_assign': {'courier_type': 'bike', 'completed': 2}}
+
+        self.assertEqual({'$inc': {'assigns': 1, 'completed_assigns.bike': 1}}, closed_assign_update(courier))
+        self.assertIsNone(closed_assign_update({'_id': 1, 'courier_type': 'car', 'active_assign': {'completed': 0}}))
+        self.assertIsNone(closed_assign_update(None))
+
+if __name__ == '__main__':
+    unittest.main()
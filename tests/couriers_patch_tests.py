@@ -0,0 +1,118 @@
+import unittest
+from unittest.mock import patch
+
+from bson import json_util
+from mongomock.collection import Collection
+
+from tests import test_utils
+from utils.parser import parse_hours, parse_intervals
+from utils.preparer import prepare_couriers, prepare_order, prepare_orders
+
+
+class CouriersPatchTests(unittest.TestCase):
+    @classmethod
+    def setUp(cls):
+        cls.app, cls.db, cls.validator = test_utils.set_up_service()
+
+        couriers_data = test_utils.read_data('couriers.json')
+        parse_hours(couriers_data, 'working_hours')
+        cls.db['couriers'].insert_many(prepare_couriers(couriers_data))
+
+        orders_data = test_utils.read_data('orders.json')
+        orders_data['data'].append({'order_id': 4, 'weight': 1, 'region': 22, 'delivery_hours': ['08:00-19:00']})
+        parse_hours(orders_data, 'delivery_hours')
+        cls.db['orders'].insert_many(prepare_orders(orders_data))
+
+        headers = [('Content-Type', 'application/json')]
+        for courier_id in (2, 1):
+            cls.app.post('/orders/assign', data=json_util.dumps({'courier_id': courier_id}), headers=headers)
+
+    def patch_couriers(self, patches: list):
+        headers = [('Content-Type', 'application/json')]
+        return self.app.patch('/couriers', data=json_util.dumps({'data': patches}), headers=headers)
+
+    def order_statuses(self):
+        return {order['_id']: order['status'] for order in self.db['orders'].find()}
+
+    def test_patch_should_update_couriers_and_return_them(self):
+        http_response = self.patch_couriers([{'courier_id': 3, 'courier_type': 'foot'},
+                                             {'courier_id': 1, 'regions': [12, 22, 33]}])
+
+        self.assertEqual(201, http_response.status_code)
+        self.assertEqual({'couriers': [
+            {'courier_id': 3, 'courier_type': 'foot', 'regions': [12, 22, 23, 33], 'working_hours': []},
+            {'courier_id': 1, 'courier_type': 'foot', 'regions': [12, 22, 33],
+             'working_hours': ['11:35-14:05', '09:00-11:00']},
+        ]}, http_response.get_json())
+        self.assertEqual('foot', self.db['couriers'].find_one({'_id': 3})['courier_type'])
+        self.assertEqual([12, 22, 33], self.db['couriers'].find_one({'_id': 1})['regions'])
+
+    def test_patch_should_unassign_invalid_orders_of_all_couriers(self):
+        self.assertEqual({1: 'in_progress', 2: 'not_assigned', 3: 'in_progress', 4: 'in_progress'},
+                         self.order_statuses())
+
+        self.patch_couriers([{'courier_id': 1, 'regions': [22]},
+                             {'courier_id': 2, 'working_hours': parse_intervals(['19:00-20:00'])}])
+
+        self.assertEqual({1: 'not_assigned', 2: 'not_assigned', 3: 'in_progress', 4: 'not_assigned'},
+                         self.order_statuses())
+        self.assertIsNone(self.db['orders'].find_one({'_id': 4})['courier_id'])
+        self.assertIn('active_assign', self.db['couriers'].find_one({'_id': 1}))
+        self.assertNotIn('active_assign', self.db['couriers'].find_one({'_id': 2}))
+
+    def test_patch_should_use_one_query_of_each_kind(self):
+        patches = [{'courier_id': 1, 'regions': [22]},
+                   {'courier_id': 2, 'working_hours': parse_intervals(['19:00-20:00'])},
+                   {'courier_id': 3, 'courier_type': 'foot'}]
+        with patch.object(Collection, 'find', autospec=True, side_effect=Collection.find) as find:
+            with patch.object(Collection, 'bulk_write', autospec=True, side_effect=Collection.bulk_write) as bulk_write:
+                with patch.object(Collection, 'update_many', autospec=True,
+                                  side_effect=Collection.update_many) as update_many:
+                    self.patch_couriers(patches)
+
+        # Запросы сервиса передают фильтр по имени, внутренние вызовы mongomock - позиционно
+        reads = [call[0][0].name for call in find.call_args_list if 'filter' in call[1]]
+        self.assertEqual(['couriers', 'orders'], reads)
+        # Изменение профилей и пересчёт счётчиков заказов в развозах
+        self.assertEqual(['couriers', 'couriers'], [call[0][0].name for call in bulk_write.call_args_list])
+        self.assertEqual(1, update_many.call_count)
+
+    def test_courier_patched_concurrently_should_be_rechecked_against_new_values(self):
+        bulk_write = Collection.bulk_write
+        concurrent_patches = []
+
+        def concurrent_bulk_write(collection, requests, *args, **kwargs):
+            if collection.name == 'couriers' and not concurrent_patches:
+                # Между чтением и записью другой запрос меняет районы курьера и назначает ему заказ
+                concurrent_patches.append(3)
+                self.db['couriers'].update_one({'_id': 3}, {'$set': {'regions': [5]}})
+                self.db['orders'].insert_one(prepare_order(5, region=5, status='in_progress', courier_id=3,
+                                                           assign_time='2021-01-10T10:00:00Z'))
+            return bulk_write(collection, requests, *args, **kwargs)
+
+        with patch.object(Collection, 'bulk_write', concurrent_bulk_write):
+            http_response = self.patch_couriers([{'courier_id': 3, 'regions': [12, 22, 23, 33]}])
+
+        self.assertEqual(201, http_response.status_code)
+        self.assertEqual([12, 22, 23, 33], self.db['couriers'].find_one({'_id': 3})['regions'])
+        self.assertEqual('not_assigned', self.db['orders'].find_one({'_id': 5})['status'])
+
+    def test_patch_of_unknown_courier_should_be_reported(self):
+        http_response = self.patch_couriers([{'courier_id': 5, 'regions': [1]}, {'courier_id': 2, 'regions': [1]}])
+
+        self.assertEqual(400, http_response.status_code)
+        response_data = http_response.get_json()
+        self.assertEqual([2], [courier['courier_id'] for courier in response_data['couriers']])
+        self.assertEqual([{'id': 5}], response_data['errors'])
+        self.assertEqual([1], self.db['couriers'].find_one({'_id': 2})['regions'])
+        self.assertEqual('not_assigned', self.db['orders'].find_one({'_id': 4})['status'])
+
+    def test_should_return_bad_request_when_no_content_type(self):
+        http_response = self.app.patch('/couriers', data=json_util.dumps({'data': []}))
+
+        self.assertIn('Content-Type must be application/json', http_response.get_data(as_text=True))
+        self.assertEqual(400, http_response.status_code)
+
+
+if __name__ == '__main__':
+    unittest.main()
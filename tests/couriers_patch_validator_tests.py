@@ -0,0 +1,54 @@
+import unittest
+
+from jsonschema import ValidationError
+from parameterized import parameterized
+
+from application.data_validator import DataValidator
+
+
+class CouriersPatchValidatorTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.data_validator = DataValidator()
+
+    def assert_exception(self, patches_data: dict, expected_exception_message: str):
+        with self.assertRaises(ValidationError) as context:
+            self.data_validator.validate_couriers_patch(patches_data)
+        self.assertIn(expected_exception_message, str(context.exception.message))
+
+    def test_correct_patches_should_be_valid(self):
+        self.data_validator.validate_couriers_patch({'data': [{'courier_id': 1, 'regions': [1, 2]},
+                                                              {'courier_id': 2, 'courier_type': 'car'}]})
+
+    @parameterized.expand([
+        [{'data': [{'courier_id': 1}]}],
+        [{'data': [{'courier_id': 1, 'regions': None}]}],
+        [{'data': [{'courier_id': 1, 'courier_type': 'plane'}]}],
+        [{'data': [{'courier_id': 1, 'EXTRA': 0}]}],
+    ])
+    def test_incorrect_patches_should_be_reported_by_id(self, patches_data: dict):
+        self.assert_exception(patches_data, "{'couriers': [{'id': 1}]}")
+
+    @parameterized.expand([
+        [{'data': [{'regions': [1]}]}],
+        [{'data': [{'courier_id': 0, 'regions': [1]}]}],
+    ])
+    def test_patches_without_courier_id_should_be_incorrect(self, patches_data: dict):
+        self.assert_exception(patches_data, "'couriers'")
+
+    def test_all_incorrect_patches_should_be_reported(self):
+        self.assert_exception({'data': [{'courier_id': 1}, {'courier_id': 2, 'regions': [1]}, {'courier_id': 3}]},
+                              "{'couriers': [{'id': 1}, {'id': 3}]}")
+
+    def test_patches_should_be_incorrect_when_courier_ids_not_unique(self):
+        self.assert_exception({'data': [{'courier_id': 1, 'regions': [1]}, {'courier_id': 1, 'regions': [2]}]},
+                              'Couriers ids are not unique')
+
+    def test_working_hours_should_be_parsed(self):
+        patches_data = {'data': [{'courier_id': 1, 'working_hours': ['09:00-11:00']}]}
+        self.data_validator.validate_couriers_patch(patches_data)
+        self.assertIsInstance(patches_data['data'][0]['working_hours'][0], int)
+
+
+if __name__ == '__main__':
+    unittest.main()
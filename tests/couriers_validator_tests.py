@@ -1,5 +1,4 @@
 import unittest
-from datetime import datetime
 from unittest.mock import MagicMock
 
 from jsonschema import ValidationError
@@ -7,6 +6,7 @@ from parameterized import parameterized
 
 from application.data_validator import DataValidator
 from tests.test_utils import read_data
+from utils.parser import unpack_interval
 
 
 class CouriersValidatorTests(unittest.TestCase):
@@ -64,12 +64,12 @@ class CouriersValidatorTests(unittest.TestCase):
     def test_couriers_should_be_incorrect_when_containing_extra_fields(self, couriers_data: dict, field_name: str):
         self.assert_exception(couriers_data, field_name)
 
-    @unittest.mock.patch('jsonschema.validate')
+    @unittest.mock.patch.object(DataValidator, '_invalid_items', return_value=[])
     def test_couriers_should_be_incorrect_when_courier_ids_not_unique(self, _):
         couriers_data = {'data': [{'courier_id': 1}, {'courier_id': 1}]}
         self.assert_exception(couriers_data, 'Couriers ids are not unique')
 
-    @unittest.mock.patch('jsonschema.validate')
+    @unittest.mock.patch.object(DataValidator, '_invalid_items', return_value=[])
     def test_correct_working_hours_should_be_parsed(self, _):
         couriers_data = {
             'data': [{'courier_id': 1, 'courier_type': 'bike', 'regions': [], 'working_hours': ["00:59-23:59"]}]}
@@ -77,10 +77,8 @@ class CouriersValidatorTests(unittest.TestCase):
         working_hours = couriers_data['data'][0]['working_hours']
         self.assertIsInstance(working_hours, list)
         self.assertEqual(len(working_hours), 1)
-        self.assertIsInstance(working_hours[0], tuple)
-        begin_time, end_time = working_hours[0]
-        self.assertEqual(begin_time, datetime.strptime("00:59", "%H:%M"))
-        self.assertEqual(end_time, datetime.strptime("23:59", "%H:%M"))
+        self.assertIsInstance(working_hours[0], int)
+        self.assertEqual((59, 23 * 60 + 59), unpack_interval(working_hours[0]))
 
     @parameterized.expand([
         [{'data': [{'courier_id': 1, 'courier_type': 'bike', 'regions': [],'working_hours': ["09:59-33:33"]}]}],
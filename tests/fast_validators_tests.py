@@ -0,0 +1,94 @@
+import random
+import unittest
+
+from parameterized import parameterized
+
+from application import fast_validators
+from application.data_validator import DataValidator
+from tests.test_utils import read_data
+
+COURIERS = [
+    {'courier_id': 1, 'courier_type': 'foot', 'regions': [1, 12], 'working_hours': ['11:35-14:05']},
+    {'courier_id': 1.0, 'courier_type': 'car', 'regions': [], 'working_hours': []},
+    {'courier_id': 0, 'courier_type': 'foot', 'regions': [], 'working_hours': []},
+    {'courier_id': True, 'courier_type': 'foot', 'regions': [], 'working_hours': []},
+    {'courier_id': '1', 'courier_type': 'foot', 'regions': [], 'working_hours': []},
+    {'courier_id': 1, 'courier_type': 'plane', 'regions': [], 'working_hours': []},
+    {'courier_id': 1, 'courier_type': None, 'regions': [], 'working_hours': []},
+    {'courier_id': 1, 'courier_type': 'bike', 'regions': [0], 'working_hours': []},
+    {'courier_id': 1, 'courier_type': 'bike', 'regions': [1.5], 'working_hours': []},
+    {'courier_id': 1, 'courier_type': 'bike', 'regions': None, 'working_hours': []},
+    {'courier_id': 1, 'courier_type': 'bike', 'regions': [], 'working_hours': ['9:00-10:00']},
+    {'courier_id': 1, 'courier_type': 'bike', 'regions': [], 'working_hours': ['09:00-24:00']},
+    {'courier_id': 1, 'courier_type': 'bike', 'regions': [], 'working_hours': [900]},
+    {'courier_id': 1, 'courier_type': 'bike', 'regions': [], 'working_hours': '09:00-10:00'},
+    {'courier_id': 1, 'courier_type': 'bike', 'regions': []},
+    {'courier_id': 1, 'courier_type': 'bike', 'regions': [], 'working_hours': [], 'EXTRA': 0},
+    [],
+    '',
+]
+
+ORDERS = [
+    {'order_id': 1, 'weight': 0.23, 'region': 12, 'delivery_hours': ['09:00-18:00']},
+    {'order_id': 1, 'weight': 50, 'region': 12, 'delivery_hours': []},
+    {'order_id': 1, 'weight': 0.01, 'region': 12, 'delivery_hours': []},
+    {'order_id': 1, 'weight': 0, 'region': 12, 'delivery_hours': []},
+    {'order_id': 1, 'weight': 50.01, 'region': 12, 'delivery_hours': []},
+    {'order_id': 1, 'weight': 0.005, 'region': 12, 'delivery_hours': []},
+    {'order_id': 1, 'weight': 0.29, 'region': 12, 'delivery_hours': []},
+    {'order_id': 1, 'weight': True, 'region': 12, 'delivery_hours': []},
+    {'order_id': 1, 'weight': '3', 'region': 12, 'delivery_hours': []},
+    {'order_id': 1, 'weight': 3, 'region': 0, 'delivery_hours': []},
+    {'order_id': 1, 'weight': 3, 'region': [1], 'delivery_hours': []},
+    {'order_id': 1, 'weight': 3, 'region': 1, 'delivery_hours': None},
+    {'order_id': 1, 'weight': 3, 'region': 1, 'delivery_hours': ['09:59-33:33']},
+    {'order_id': 1, 'weight': 3, 'region': 1},
+    {'order_id': 1, 'weight': 3, 'region': 1, 'delivery_hours': [], 'EXTRA': 0},
+    None,
+]
+
+
+def random_order(rnd: random.Random) -> dict:
+    return {'order_id': rnd.choice([1, 0, -1, 2.0, 2.5]),
+            'weight': rnd.choice([rnd.randrange(0, 5200) / 100, rnd.random() * 60, rnd.randrange(60)]),
+            'region': rnd.choice([1, 0, 3.0]),
+            'delivery_hours': [f'{rnd.randrange(26):02}:{rnd.randrange(62):02}-{rnd.randrange(24):02}:00']}
+
+
+class FastValidatorsTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.data_validator = DataValidator()
+
+    @parameterized.expand([(courier,) for courier in COURIERS])
+    def test_fast_courier_validation_should_be_equal_to_schema(self, courier):
+        self.assertEqual(self.data_validator.courier_validator.is_valid(courier),
+                         fast_validators.is_valid_courier(courier))
+
+    @parameterized.expand([(order,) for order in ORDERS])
+    def test_fast_order_validation_should_be_equal_to_schema(self, order):
+        self.assertEqual(self.data_validator.order_validator.is_valid(order),
+                         fast_validators.is_valid_order(order))
+
+    def test_fast_order_validation_should_be_equal_to_schema_on_random_orders(self):
+        rnd = random.Random(0)
+        for _ in range(2000):
+            order = random_order(rnd)
+            self.assertEqual(self.data_validator.order_validator.is_valid(order),
+                             fast_validators.is_valid_order(order), order)
+
+    def test_fast_path_should_report_same_errors(self):
+        fast_validator = DataValidator(fast_path=True)
+        for validator in (self.data_validator, fast_validator):
+            with self.assertRaises(Exception) as context:
+                validator.validate_orders({'data': ORDERS[:-1]})
+            self.assertEqual({'orders': [{'id': 1}] * (len(ORDERS) - 4)}, context.exception.message)
+
+    def test_fast_path_should_accept_correct_data(self):
+        fast_validator = DataValidator(fast_path=True)
+        fast_validator.validate_couriers(read_data('couriers.json'))
+        fast_validator.validate_orders(read_data('orders.json'))
+
+
+if __name__ == '__main__':
+    unittest.main()
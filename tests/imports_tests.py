@@ -0,0 +1,200 @@
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from bson import ObjectId
+
+from application.imports import ImportWorker, create_import_job, format_import_job
+from tests import test_utils
+from utils.parser import parse_hours
+from utils.preparer import prepare_orders
+from tests.ndjson_post_tests import to_ndjson
+
+
+def parse_orders(orders: list) -> list:
+    orders = [dict(order) for order in orders]
+    parse_hours({'data': orders}, 'delivery_hours')
+    return orders
+
+
+def make_orders(count: int) -> list:
+    return [{'order_id': i, 'weight': 1, 'region': 1, 'delivery_hours': ['10:00-11:00']} for i in range(1, count + 1)]
+
+
+class ImportsTests(unittest.TestCase):
+    @classmethod
+    def setUp(cls):
+        cls.app, cls.db, cls.validator = test_utils.set_up_service()
+
+    def get_import(self, http_response) -> dict:
+        self.assertEqual(202, http_response.status_code)
+        http_response = self.app.get('/imports/' + http_response.get_json()['import_id'])
+        self.assertEqual(200, http_response.status_code)
+        return http_response.get_json()
+
+    def test_json_import_should_insert_orders(self):
+        http_response = self.app.post('/imports/orders', json={'data': make_orders(3)})
+
+        job = self.get_import(http_response)
+        self.assertEqual('completed', job['status'])
+        self.assertEqual((3, 3, 3), (job['total'], job['processed'], job['inserted']))
+        self.assertEqual([], job['errors'])
+        self.assertEqual(3, self.db['orders'].count_documents({'status': 'not_assigned'}))
+        self.assertEqual(0, self.db['import_chunks'].count_documents({}))
+
+    def test_ndjson_import_should_report_errors_per_line(self):
+        orders = make_orders(2)
+        data = to_ndjson(orders) + '{\n' + to_ndjson([{'order_id': 4, 'weight': 0}, orders[0]])
+
+        http_response = self.app.post('/imports/orders', data=data,
+                                      headers=[('Content-Type', 'application/x-ndjson')])
+
+        job = self.get_import(http_response)
+        self.assertEqual('completed', job['status'])
+        self.assertEqual((5, 5, 2, 3), (job['total'], job['processed'], job['inserted'], job['errors_count']))
+        self.assertEqual([{'id': None, 'line': 3}, {'id': 4, 'line': 4}, {'id': 1, 'line': 5}], job['errors'])
+
+    def test_import_should_process_orders_in_chunks(self):
+        with patch('application.imports.CHUNK_SIZE', 10):
+            http_response = self.app.post('/imports/orders', json={'data': make_orders(25)})
+
+        job = self.get_import(http_response)
+        self.assertEqual((25, 25), (job['processed'], job['inserted']))
+        self.assertEqual(25, self.db['orders'].count_documents({}))
+
+    def test_import_should_store_only_limited_number_of_errors(self):
+        with patch('application.imports.CHUNK_SIZE', 2), patch('application.imports.MAX_REPORTED_ERRORS', 3):
+            http_response = self.app.post('/imports/orders', json={'data': [{}] * 5})
+
+        job = self.get_import(http_response)
+        self.assertEqual(5, job['errors_count'])
+        self.assertEqual([1, 2, 3], [error['line'] for error in job['errors']])
+
+    def test_items_with_reserved_keys_should_be_reported_as_errors(self):
+        orders = make_orders(3)
+        data = [orders[0], {**orders[1], '$where': 1}, {**orders[2], 'delivery.hours': []}]
+
+        http_response = self.app.post('/imports/orders', json={'data': data})
+
+        job = self.get_import(http_response)
+        self.assertEqual(('completed', 1, 2), (job['status'], job['inserted'], job['errors_count']))
+        self.assertEqual([{'id': 2, 'line': 2}, {'id': 3, 'line': 3}], job['errors'])
+
+    def test_import_should_split_chunks_by_size_and_skip_oversized_items(self):
+        orders = make_orders(4)
+        orders[2]['comment'] = 'x' * 300
+        with patch('application.imports.MAX_CHUNK_BYTES', 200):
+            import_id = create_import_job(self.db, enumerate(orders, start=1))
+
+        self.assertEqual(2, self.db['import_chunks'].count_documents({'import_id': import_id}))
+        self.app.post('/imports/orders', json={'data': []})
+        job = self.app.get(f'/imports/{import_id}').get_json()
+        self.assertEqual(('completed', 4, 3), (job['status'], job['processed'], job['inserted']))
+        self.assertEqual([{'id': None, 'line': 3}], job['errors'])
+
+    def test_pending_import_should_not_be_processed_before_submit(self):
+        import_id = create_import_job(self.db, enumerate(make_orders(2), start=1))
+
+        job = self.app.get(f'/imports/{import_id}').get_json()
+
+        self.assertEqual(('pending', 0, None), (job['status'], job['processed'], job['throughput']))
+        self.assertEqual(0, self.db['orders'].count_documents({}))
+
+    def interrupt_import(self, locked_until: datetime) -> ObjectId:
+        """
+        Создаёт задачу, процесс которой завершился после учёта первой пачки, но до её удаления.
+        """
+        orders = make_orders(5)
+        with patch('application.imports.CHUNK_SIZE', 2):
+            import_id = create_import_job(self.db, enumerate(orders, start=1))
+        self.db['orders'].insert_many(prepare_orders({'data': parse_orders(orders[:2])}))
+        self.db['imports'].update_one({'_id': import_id}, {'$set': {
+            'status': 'running', 'started_at': datetime.utcnow(), 'lease_owner': ObjectId(),
+            'locked_until': locked_until, 'next_seq': 1, 'processed': 2, 'inserted': 2}})
+        return import_id
+
+    def test_import_with_expired_lease_should_be_resumed(self):
+        import_id = self.interrupt_import(datetime.utcnow() - timedelta(seconds=1))
+
+        self.app.get(f'/imports/{import_id}')
+        job = self.app.get(f'/imports/{import_id}').get_json()
+
+        self.assertEqual(('completed', 5, 5, 0), (job['status'], job['processed'], job['inserted'],
+                                                   job['errors_count']))
+        self.assertEqual(5, self.db['orders'].count_documents({}))
+        self.assertEqual(0, self.db['import_chunks'].count_documents({}))
+
+    def test_import_with_active_lease_should_not_be_taken_over(self):
+        import_id = self.interrupt_import(datetime.utcnow() + timedelta(seconds=60))
+
+        self.app.post('/imports/orders', json={'data': []})
+        job = self.app.get(f'/imports/{import_id}').get_json()
+
+        self.assertEqual(('running', 2), (job['status'], job['processed']))
+
+    def test_worker_should_stop_when_lease_is_lost(self):
+        with patch('application.imports.CHUNK_SIZE', 2):
+            import_id = create_import_job(self.db, enumerate(make_orders(5), start=1))
+        worker = ImportWorker(self.db, self.validator)
+        job = worker.claim()
+        # Другой процесс продолжил задачу, пока этот обрабатывал первую пачку
+        self.db['imports'].update_one({'_id': import_id}, {'$set': {'lease_owner': ObjectId()}})
+
+        worker.process_job(job)
+
+        job = self.db['imports'].find_one({'_id': import_id})
+        self.assertEqual(('running', 0, 0), (job['status'], job['processed'], job['next_seq']))
+        self.assertEqual(3, self.db['import_chunks'].count_documents({}))
+
+    def test_chunk_inserted_by_previous_owner_should_not_be_reported_as_errors(self):
+        with patch('application.imports.CHUNK_SIZE', 2):
+            import_id = create_import_job(self.db, enumerate(make_orders(5), start=1))
+        self.db['orders'].insert_one({'_id': 5, 'order_id': 5})
+        worker = ImportWorker(self.db, self.validator)
+        job = worker.claim()
+        # Прежний владелец вставил заказы первой пачки, но не успел её учесть
+        orders = prepare_orders({'data': parse_orders(make_orders(2))})
+        self.db['orders'].insert_many([{**order, 'source': {'import_id': import_id, 'line': line}}
+                                       for line, order in enumerate(orders, start=1)])
+
+        worker.process_job(job)
+
+        job = self.db['imports'].find_one({'_id': import_id})
+        self.assertEqual(('completed', 5, 4), (job['status'], job['processed'], job['inserted']))
+        self.assertEqual([{'id': 5, 'line': 5}], job['errors'])
+
+    def test_import_with_incorrect_data_should_return_bad_request(self):
+        http_response = self.app.post('/imports/orders', json=make_orders(1))
+
+        self.assertEqual(400, http_response.status_code)
+        self.assertEqual(0, self.db['imports'].count_documents({}))
+
+    def test_unknown_import_should_return_bad_request(self):
+        for import_id in (str(ObjectId()), 'unknown'):
+            http_response = self.app.get('/imports/' + import_id)
+
+            self.assertEqual(400, http_response.status_code)
+            self.assertEqual({'message': 'Database error: Import with specified id not found'},
+                             http_response.get_json())
+
+    def test_worker_should_create_executor_in_each_process(self):
+        worker = ImportWorker(self.db, self.validator)
+        with patch('application.imports.os.getpid', return_value=100):
+            executor = worker.executor
+            self.assertIs(executor, worker.executor)
+        with patch('application.imports.os.getpid', return_value=101):
+            self.assertIsNot(executor, worker.executor)
+        executor.shutdown()
+        worker.executor.shutdown()
+
+    def test_format_import_job_should_compute_throughput(self):
+        started_at = datetime(2021, 3, 28, 10)
+        job = {'_id': ObjectId(), 'status': 'completed', 'total': 300, 'processed': 300, 'inserted': 300,
+               'errors_count': 0, 'errors': [], 'started_at': started_at,
+               'finished_at': started_at + timedelta(seconds=2)}
+
+        self.assertEqual(150.0, format_import_job(job)['throughput'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,36 @@
+import unittest
+from unittest.mock import MagicMock
+
+from application.indexes import INDEXES, ROUTE_QUERIES, ensure_indexes, explain_route_queries
+from tests import test_utils
+
+
+class IndexesTests(unittest.TestCase):
+    def test_indexes_should_be_created_when_service_starts(self):
+        _, db, _ = test_utils.set_up_service()
+        for collection_name, indexes in INDEXES.items():
+            index_names = set(db[collection_name].index_information())
+            for index in indexes:
+                self.assertIn(index.document['name'], index_names)
+
+    def test_ensure_indexes_should_be_idempotent(self):
+        _, db, _ = test_utils.set_up_service()
+        ensure_indexes(db)
+        ensure_indexes(db)
+        self.assertEqual(1 + len(INDEXES['orders']), len(db['orders'].index_information()))
+
+    def test_explain_should_report_collscan(self):
+        db = MagicMock()
+        db.__getitem__.return_value.find.return_value.explain.side_effect = [
+            {'queryPlanner': {'winningPlan': {'stage': 'FETCH', 'inputStage': {'stage': 'IXSCAN'}}}},
+            {'queryPlanner': {'winningPlan': {'queryPlan': {'stage': 'COLLSCAN'}}}},
+        ] + [{'queryPlanner': {'winningPlan': {'stage': 'IDHACK'}}}] * (len(ROUTE_QUERIES) - 2)
+        plans = explain_route_queries(db)
+        self.assertEqual(['FETCH', 'IXSCAN'], plans[0]['stages'])
+        self.assertFalse(plans[0]['collscan'])
+        self.assertTrue(plans[1]['collscan'])
+        self.assertEqual(1, sum(plan['collscan'] for plan in plans))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import unittest
+from unittest.mock import patch
+
+from bson import json_util
+
+from application.data_validator import DataValidator
+from application.ingestion import IngestionMode, insert_unordered
+from application.order_book import OrderBook
+from application.service import make_app
+from tests import test_utils
+
+
+def make_orders(order_ids) -> dict:
+    return {'data': [{'order_id': order_id, 'weight': 1, 'region': 1, 'delivery_hours': ['10:00-11:00']}
+                     for order_id in order_ids]}
+
+
+class IngestionModeTests(unittest.TestCase):
+    def setUp(self):
+        self.db = test_utils.MockMongoClient()['db']
+        self.order_book = OrderBook(self.db['orders'])
+        self.order_book.ready = True
+        self.ingestion = IngestionMode(ordered=False, chunk_size=2, write_concern='majority')
+        self.app = make_app(self.db, DataValidator(), order_book=self.order_book,
+                            ingestion=self.ingestion).test_client()
+
+    def post(self, url: str, data: dict):
+        headers = [('Content-Type', 'application/json')]
+        return self.app.post(url, data=json_util.dumps(data), headers=headers)
+
+    def test_duplicate_orders_should_be_returned_as_validation_errors(self):
+        self.post('/orders', make_orders([2, 4]))
+
+        http_response = self.post('/orders', make_orders([1, 2, 3, 4, 5]))
+
+        self.assertEqual({'validation_error': {'orders': [{'id': 2}, {'id': 4}]}}, http_response.get_json())
+        self.assertEqual(5, self.db['orders'].count_documents({}))
+
+    def test_duplicate_couriers_should_be_returned_as_validation_errors(self):
+        couriers = [{'courier_id': courier_id, 'courier_type': 'foot', 'regions': [1], 'working_hours': []}
+                    for courier_id in (1, 2, 3)]
+        self.post('/couriers', {'data': couriers[:1]})
+
+        http_response = self.post('/couriers', {'data': couriers})
+
+        self.assertEqual({'validation_error': {'couriers': [{'id': 1}]}}, http_response.get_json())
+        self.assertEqual(3, self.db['couriers'].count_documents({}))
+
+    def test_orders_should_be_inserted_in_chunks(self):
+        with patch('application.ingestion.insert_unordered', wraps=insert_unordered) as insert:
+            http_response = self.post('/orders', make_orders(range(1, 6)))
+
+        self.assertEqual(201, http_response.status_code)
+        self.assertEqual([2, 2, 1], [len(call[0][1]) for call in insert.call_args_list])
+        self.assertEqual({'w': 'majority'}, insert.call_args[0][0].write_concern.document)
+
+    def test_order_book_should_get_only_inserted_orders(self):
+        self.post('/orders', make_orders([1]))
+        self.db['orders'].update_one({'_id': 1}, {'$set': {'status': 'in_progress'}})
+        self.order_book.remove([1])
+
+        self.post('/orders', make_orders([1, 2]))
+
+        self.assertNotIn(1, self.order_book)
+        self.assertIn(2, self.order_book)
+
+    def test_ordered_mode_should_stop_on_first_duplicate(self):
+        app = make_app(self.db, DataValidator(), ingestion=IngestionMode()).test_client()
+        headers = [('Content-Type', 'application/json')]
+        app.post('/orders', data=json_util.dumps(make_orders([2])), headers=headers)
+
+        http_response = app.post('/orders', data=json_util.dumps(make_orders([1, 2, 3])), headers=headers)
+
+        self.assertEqual(400, http_response.status_code)
+        self.assertIn('Database error: ', http_response.get_data(as_text=True))
+        self.assertEqual(2, self.db['orders'].count_documents({}))
+
+    def test_mode_should_be_read_from_environ(self):
+        mode = IngestionMode.from_environ({'INGEST_MODE': 'unordered', 'INGEST_CHUNK_SIZE': '500',
+                                           'INGEST_WRITE_CONCERN': '1'})
+        default = IngestionMode.from_environ({})
+
+        self.assertEqual((False, 500, 1), (mode.ordered, mode.chunk_size, mode.write_concern))
+        self.assertEqual((True, None, None), (default.ordered, default.chunk_size, default.write_concern))
+
+
+if __name__ == '__main__':
+    unittest.main()
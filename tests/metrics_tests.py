@@ -0,0 +1,116 @@
+import json
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from bson import json_util
+
+from application.metrics import (BUCKETS, MONGO_METRIC, ROUTE_METRIC, SNAPSHOT_TTL, STAGE_METRIC, Metrics,
+                                 MongoCommandListener, merge_snapshots, render_snapshot)
+from tests import test_utils
+
+
+class MetricsTests(unittest.TestCase):
+    def test_metrics_should_contain_routes_and_stages(self):
+        app, db, validator = test_utils.set_up_service()
+        headers = [('Content-Type', 'application/json')]
+        app.post('/orders/assign', data=json_util.dumps({'courier_id': 1}), headers=headers)
+
+        http_response = app.get('/metrics')
+
+        self.assertEqual(200, http_response.status_code)
+        self.assertTrue(http_response.content_type.startswith('text/plain'))
+        text = http_response.get_data(as_text=True)
+        self.assertIn(f'{ROUTE_METRIC}_count{{handler="assign_orders",status="400"}} 1', text)
+        self.assertIn(f'{STAGE_METRIC}_count{{handler="assign_orders",stage="parse_json"}} 1', text)
+        self.assertIn(f'{STAGE_METRIC}_count{{handler="assign_orders",stage="validate"}} 1', text)
+
+    def test_render_should_use_cumulative_buckets(self):
+        metrics = Metrics()
+        for seconds in (0.0001, 0.003, 0.003, 100):
+            metrics.observe(ROUTE_METRIC, (('handler', 'h'), ('status', '201')), seconds)
+
+        lines = render_snapshot(metrics.snapshot()).splitlines()
+
+        self.assertIn(f'# TYPE {ROUTE_METRIC} histogram', lines)
+        self.assertIn(f'{ROUTE_METRIC}_bucket{{handler="h",status="201",le="{BUCKETS[0]}"}} 1', lines)
+        self.assertIn(f'{ROUTE_METRIC}_bucket{{handler="h",status="201",le="0.005"}} 3', lines)
+        self.assertIn(f'{ROUTE_METRIC}_bucket{{handler="h",status="201",le="10"}} 3', lines)
+        self.assertIn(f'{ROUTE_METRIC}_bucket{{handler="h",status="201",le="+Inf"}} 4', lines)
+        self.assertIn(f'{ROUTE_METRIC}_count{{handler="h",status="201"}} 4', lines)
+
+    def test_mongo_listener_should_record_commands_of_current_handler(self):
+        metrics = Metrics()
+        listener = MongoCommandListener(metrics)
+
+        @metrics.instrument
+        def handler():
+            listener.succeeded(SimpleNamespace(command_name='find', duration_micros=1500))
+            listener.failed(SimpleNamespace(command_name='update', duration_micros=100))
+            return {}, 201
+
+        handler()
+
+        series = metrics.snapshot()[MONGO_METRIC]
+        self.assertEqual(1, series[json.dumps([['handler', 'handler'], ['command', 'find'],
+                                               ['outcome', 'success']])][-1])
+        self.assertEqual(1, series[json.dumps([['handler', 'handler'], ['command', 'update'],
+                                               ['outcome', 'failure']])][-1])
+
+    def test_metrics_of_processes_should_be_merged(self):
+        with tempfile.TemporaryDirectory() as directory:
+            metrics = Metrics(directory)
+            labels = (('handler', 'h'), ('status', '201'))
+            metrics.observe(ROUTE_METRIC, labels, 0.002)
+            other = Metrics()
+            other.observe(ROUTE_METRIC, labels, 0.2)
+            with open(os.path.join(directory, 'other.json'), 'w') as f:
+                json.dump(other.snapshot(), f)
+
+            values = metrics.collect()[ROUTE_METRIC][json.dumps(labels)]
+
+        self.assertEqual(2, values[-1])
+        self.assertAlmostEqual(0.202, values[-2])
+
+    def test_snapshots_of_finished_processes_should_be_removed(self):
+        labels = (('handler', 'h'), ('status', '201'))
+        other = Metrics()
+        other.observe(ROUTE_METRIC, labels, 0.2)
+        with tempfile.TemporaryDirectory() as directory:
+            metrics = Metrics(directory)
+            metrics.observe(ROUTE_METRIC, labels, 0.002)
+            for filename in ('999999.json', 'stale.json'):
+                with open(os.path.join(directory, filename), 'w') as f:
+                    json.dump(other.snapshot(), f)
+            stale = os.path.join(directory, 'stale.json')
+            os.utime(stale, (os.path.getmtime(stale) - SNAPSHOT_TTL - 1,) * 2)
+
+            with patch('application.metrics._process_alive', side_effect=lambda pid: pid != 999999):
+                values = metrics.collect()[ROUTE_METRIC][json.dumps(labels)]
+
+            self.assertEqual([f'{os.getpid()}.json'], os.listdir(directory))
+        self.assertEqual(1, values[-1])
+
+    def test_series_inherited_from_parent_process_should_be_reset(self):
+        metrics = Metrics()
+        labels = (('handler', 'h'), ('status', '201'))
+        metrics.observe(ROUTE_METRIC, labels, 0.002)
+
+        with patch('application.metrics.os.getpid', return_value=os.getpid() + 1):
+            self.assertEqual({}, metrics.snapshot()[ROUTE_METRIC])
+            metrics.observe(ROUTE_METRIC, labels, 0.2)
+            values = metrics.snapshot()[ROUTE_METRIC][json.dumps(labels)]
+
+        self.assertEqual(1, values[-1])
+        self.assertAlmostEqual(0.2, values[-2])
+
+    def test_merge_snapshots(self):
+        merged = merge_snapshots([{ROUTE_METRIC: {'[]': [1, 0, 0.5, 1]}}, {ROUTE_METRIC: {'[]': [0, 1, 1.5, 1]}}])
+
+        self.assertEqual([1, 1, 2.0, 2], merged[ROUTE_METRIC]['[]'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+from datetime import datetime
+
+from bson import json_util
+
+from application.migrations import migrate_intervals
+from tests import test_utils
+from utils.parser import parse_interval
+
+
+def legacy(begin: str, end: str, next_day: bool = False) -> list:
+    begin_time = datetime.strptime(begin, '%H:%M')
+    end_time = datetime.strptime(end, '%H:%M')
+    if next_day:
+        end_time = end_time.replace(day=2)
+    return [begin_time, end_time]
+
+
+class MigrationsTests(unittest.TestCase):
+    def setUp(self):
+        self.app, self.db, _ = test_utils.set_up_service()
+        self.db['couriers'].insert_many([
+            {'_id': 1, 'courier_type': 'foot', 'regions': [1],
+             'working_hours': [legacy('09:00', '11:00'), legacy('22:30', '02:15', next_day=True)]},
+            {'_id': 2, 'courier_type': 'foot', 'regions': [1], 'working_hours': [parse_interval('10:00-12:00')]},
+        ])
+        self.db['orders'].insert_many([
+            {'_id': 1, 'weight': 1, 'region': 1, 'status': 'not_assigned',
+             'delivery_hours': [legacy('08:00', '12:00')]},
+            {'_id': 2, 'weight': 1, 'region': 1, 'status': 'not_assigned', 'delivery_hours': []},
+        ])
+
+    def test_legacy_intervals_should_be_packed(self):
+        migrated = migrate_intervals(self.db)
+
+        self.assertEqual({'couriers': 1, 'orders': 1}, migrated)
+        self.assertEqual([parse_interval('09:00-11:00'), parse_interval('22:30-02:15')],
+                         self.db['couriers'].find_one({'_id': 1})['working_hours'])
+        self.assertEqual([parse_interval('10:00-12:00')], self.db['couriers'].find_one({'_id': 2})['working_hours'])
+        self.assertEqual([parse_interval('08:00-12:00')], self.db['orders'].find_one({'_id': 1})['delivery_hours'])
+
+    def test_migration_should_be_idempotent(self):
+        migrate_intervals(self.db, batch_size=1)
+
+        self.assertEqual({'couriers': 0, 'orders': 0}, migrate_intervals(self.db))
+
+    def test_migrated_orders_should_be_assigned(self):
+        migrate_intervals(self.db)
+
+        http_response = self.app.post('/orders/assign', data=json_util.dumps({'courier_id': 1}),
+                                      headers=[('Content-Type', 'application/json')])
+
+        self.assertEqual([{'id': 1}], http_response.get_json()['orders'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import json
+import unittest
+from unittest.mock import patch
+
+from application.ingestion import insert_unordered
+from tests import test_utils
+from utils.parser import format_intervals
+
+
+def to_ndjson(items: list) -> str:
+    return '\n'.join(json.dumps(item) for item in items) + '\n'
+
+
+class NdjsonPostTests(unittest.TestCase):
+    @classmethod
+    def setUp(cls):
+        cls.app, cls.db, cls.validator = test_utils.set_up_service()
+
+    def post_ndjson(self, url: str, data: str):
+        return self.app.post(url, data=data, headers=[('Content-Type', 'application/x-ndjson')])
+
+    def test_successful_couriers_post_should_return_list_ids(self):
+        couriers = test_utils.read_data('couriers.json')['data']
+
+        http_response = self.post_ndjson('/couriers', to_ndjson(couriers))
+
+        self.assertEqual(201, http_response.status_code)
+        self.assertEqual({'couriers': [{'id': 1}, {'id': 2}, {'id': 3}]}, http_response.get_json())
+        courier = self.db['couriers'].find_one({'_id': 1})
+        self.assertEqual(couriers[0]['working_hours'], format_intervals(courier['working_hours']))
+
+    def test_successful_orders_post_should_return_list_ids(self):
+        orders = test_utils.read_data('orders.json')['data']
+
+        http_response = self.post_ndjson('/orders', to_ndjson(orders))
+
+        self.assertEqual(201, http_response.status_code)
+        self.assertEqual({'orders': [{'id': 1}, {'id': 2}, {'id': 3}]}, http_response.get_json())
+        self.assertEqual(3, self.db['orders'].count_documents({'status': 'not_assigned'}))
+
+    def test_orders_post_should_report_errors_per_item(self):
+        orders = test_utils.read_data('orders.json')['data']
+        data = to_ndjson(orders[:2]) + '{\n\n' + to_ndjson([{'order_id': 4, 'weight': 0}, orders[0], orders[2]])
+
+        http_response = self.post_ndjson('/orders', data)
+
+        self.assertEqual(400, http_response.status_code)
+        self.assertEqual({'orders': [{'id': 1}, {'id': 2}, {'id': 3}],
+                          'errors': [{'id': None, 'line': 3}, {'id': 4, 'line': 5}, {'id': 1, 'line': 6}]},
+                         http_response.get_json())
+        self.assertEqual(3, self.db['orders'].count_documents({}))
+
+    def test_orders_post_should_insert_in_chunks(self):
+        orders = [{'order_id': i, 'weight': 1, 'region': 1, 'delivery_hours': ['10:00-11:00']} for i in range(1, 26)]
+
+        with patch('application.ingestion.CHUNK_SIZE', 10), \
+                patch('application.ingestion.insert_unordered', wraps=insert_unordered) as insert:
+            http_response = self.post_ndjson('/orders', to_ndjson(orders))
+
+        self.assertEqual(201, http_response.status_code)
+        self.assertEqual(25, len(http_response.get_json()['orders']))
+        self.assertEqual([10, 10, 5], [len(call[0][1]) for call in insert.call_args_list])
+
+
+if __name__ == '__main__':
+    unittest.main()
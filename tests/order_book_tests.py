@@ -0,0 +1,209 @@
+import random
+import unittest
+from unittest.mock import MagicMock, patch
+
+from bson import json_util
+from mongomock import MongoClient
+
+from application.data_validator import DataValidator
+from application.order_book import OrderBook
+from application.service import make_app
+from tests import test_utils
+from utils.parser import MINUTES_PER_DAY, pack_interval, parse_interval, parse_intervals
+from utils.preparer import prepare_order
+from utils.utils import split_orders
+
+
+class OrderBookTests(unittest.TestCase):
+    def setUp(self):
+        self.collection = MongoClient()['db']['orders']
+        self.collection.insert_many([
+            prepare_order(1, weight=0.5, region=1, delivery_hours=[parse_interval('09:00-18:00')]),
+            prepare_order(2, weight=12, region=1, delivery_hours=[parse_interval('09:00-18:00')]),
+            prepare_order(3, weight=49, region=2, delivery_hours=[parse_interval('09:00-18:00')]),
+            prepare_order(4, weight=1, region=1, delivery_hours=[parse_interval('19:00-20:00')]),
+            prepare_order(5, weight=1, region=1, status='in_progress', courier_id=1,
+                          assign_time='2021-01-10T10:00:00Z'),
+        ])
+        self.book = OrderBook(self.collection)
+        self.book.load()
+
+    def test_load_should_take_only_free_orders(self):
+        self.assertTrue(self.book.ready)
+        self.assertEqual(4, len(self.book))
+        self.assertNotIn(5, self.book)
+
+    def test_find_should_filter_by_region_and_weight_bucket(self):
+        self.assertEqual([1, 4], sorted(order['_id'] for order in self.book.find([1], 10)))
+        self.assertEqual([1, 2, 4], sorted(order['_id'] for order in self.book.find([1], 15)))
+        self.assertEqual([1, 2, 3, 4], sorted(order['_id'] for order in self.book.find([1, 2], 50)))
+        self.assertEqual([1, 4], sorted(order['_id'] for order in self.book.find([1], 11)))
+
+    def test_candidates_should_match_working_hours(self):
+        candidates = self.book.candidates([1, 2], parse_intervals(['10:00-11:00']), 50)
+
+        self.assertEqual([1, 2, 3], sorted(order['_id'] for order in candidates))
+        self.assertIn({'_id': 1, 'weight': 0.5, 'region': 1, 'delivery_hours': [parse_interval('09:00-18:00')]},
+                      candidates)
+
+    def test_candidates_should_match_split_orders(self):
+        rnd = random.Random(0)
+
+        def random_interval():
+            begin = rnd.randrange(0, MINUTES_PER_DAY, 30)
+            return pack_interval(begin, (begin + rnd.randrange(30, 600, 30)) % MINUTES_PER_DAY)
+
+        orders = [{'_id': order_id, 'weight': rnd.choice([1, 12, 30]), 'region': rnd.randint(1, 3),
+                   'delivery_hours': [random_interval() for _ in range(rnd.randint(0, 3))]}
+                  for order_id in range(1, 301)]
+        book = OrderBook(None)
+        book.add(orders)
+        book.remove(range(1, 301, 7))
+        free_orders = [order for order in orders if order['_id'] % 7 != 1]
+
+        for _ in range(50):
+            regions = rnd.sample([1, 2, 3], rnd.randint(1, 3))
+            working_hours = [random_interval() for _ in range(rnd.randint(1, 3))]
+            capacity = rnd.choice([10, 15, 50])
+            expected, _ = split_orders([order for order in free_orders if order['region'] in regions
+                                        and order['weight'] <= capacity], working_hours)
+
+            self.assertEqual(sorted(order['_id'] for order in expected),
+                             sorted(order['_id'] for order in book.candidates(regions, working_hours, capacity)))
+
+    def test_loaded_book_should_match_added_book(self):
+        rnd = random.Random(1)
+        orders = [prepare_order(order_id, weight=rnd.choice([1, 12, 30, 60]), region=rnd.randint(1, 3),
+                                delivery_hours=[pack_interval(rnd.randrange(0, MINUTES_PER_DAY, 30),
+                                                              rnd.randrange(0, MINUTES_PER_DAY, 30))
+                                                for _ in range(rnd.randint(0, 3))])
+                  for order_id in range(1, 201)]
+        collection = MongoClient()['db']['orders']
+        collection.insert_many(orders)
+        added = OrderBook(None)
+        added.add(orders)
+        loaded = OrderBook(collection)
+
+        with patch('application.order_book.insort') as insort:
+            loaded.load()
+
+        insort.assert_not_called()
+        for regions, working_hours, capacity in [([1], [parse_interval('10:00-11:00')], 10),
+                                                 ([1, 2, 3], [parse_interval('23:00-01:00')], 50),
+                                                 ([2, 3], parse_intervals(['00:00-00:30', '12:00-12:30']), 15)]:
+            self.assertEqual(sorted(order['_id'] for order in added.candidates(regions, working_hours, capacity)),
+                             sorted(order['_id'] for order in loaded.candidates(regions, working_hours, capacity)))
+
+    def test_add_should_move_changed_order(self):
+        self.book.add([{'_id': 1, 'weight': 20, 'region': 2, 'delivery_hours': []}])
+
+        self.assertEqual([4], sorted(order['_id'] for order in self.book.find([1], 10)))
+        self.assertEqual([1, 3], sorted(order['_id'] for order in self.book.find([2], 50)))
+
+    def test_refresh_should_remove_orders_which_are_not_free(self):
+        self.collection.update_one({'_id': 1}, {'$set': {'status': 'in_progress'}})
+        self.collection.update_one({'_id': 5}, {'$set': {'status': 'not_assigned'}})
+
+        self.book.refresh([1, 5])
+
+        self.assertNotIn(1, self.book)
+        self.assertIn(5, self.book)
+
+    def test_change_stream_should_update_book(self):
+        stream = MagicMock()
+        stream.__enter__.return_value = stream
+        stream.__iter__.return_value = iter([
+            {'operationType': 'update', 'documentKey': {'_id': 1},
+             'fullDocument': prepare_order(1, weight=0.5, region=1, status='in_progress', courier_id=2)},
+            {'operationType': 'insert', 'documentKey': {'_id': 6}, 'fullDocument': prepare_order(6, region=2)},
+            {'operationType': 'delete', 'documentKey': {'_id': 2}},
+        ])
+        collection = MagicMock()
+        collection.watch.side_effect = [stream, StopIteration()]
+        collection.find.return_value = self.collection.find({'status': 'not_assigned'})
+        self.book.collection = collection
+
+        with self.assertRaises(StopIteration):
+            self.book.watch()
+
+        self.assertEqual([3, 4, 6], sorted(order['_id'] for order in self.book.find([1, 2], 50)))
+
+
+class OrderBookServiceTests(unittest.TestCase):
+    def setUp(self):
+        self.db = test_utils.MockMongoClient()['db']
+        self.book = OrderBook(self.db['orders'])
+        self.app = make_app(self.db, DataValidator(), order_book=self.book).test_client()
+        self.post('/couriers', {'data': [
+            {'courier_id': 1, 'courier_type': 'foot', 'regions': [1, 2], 'working_hours': ['10:00-11:00']},
+            {'courier_id': 2, 'courier_type': 'car', 'regions': [1, 2], 'working_hours': ['10:00-11:00']}]})
+        self.book.load()
+        self.post('/orders', {'data': [
+            {'order_id': 1, 'weight': 3, 'region': 1, 'delivery_hours': ['09:00-18:00']},
+            {'order_id': 2, 'weight': 8, 'region': 2, 'delivery_hours': ['09:00-18:00']},
+            {'order_id': 3, 'weight': 20, 'region': 2, 'delivery_hours': ['09:00-18:00']},
+            {'order_id': 4, 'weight': 1, 'region': 1, 'delivery_hours': ['19:00-20:00']}]})
+
+    def post(self, url: str, data: dict, method='post'):
+        headers = [('Content-Type', 'application/json')]
+        return getattr(self.app, method)(url, data=json_util.dumps(data), headers=headers).get_json()
+
+    def test_add_orders_should_fill_book(self):
+        self.assertEqual(4, len(self.book))
+
+    def test_ndjson_orders_should_fill_book(self):
+        lines = [json_util.dumps({'order_id': 5, 'weight': 2, 'region': 2, 'delivery_hours': ['09:00-18:00']}),
+                 json_util.dumps({'order_id': 1, 'weight': 2, 'region': 2, 'delivery_hours': ['09:00-18:00']})]
+
+        self.app.post('/orders', data='\n'.join(lines), headers=[('Content-Type', 'application/x-ndjson')])
+
+        self.assertEqual([2, 3, 5], sorted(order['_id'] for order in self.book.find([2], 50)))
+
+    def test_assign_should_read_only_orders_in_progress(self):
+        with patch.object(self.db['orders'], 'find', wraps=self.db['orders'].find) as find:
+            response_data = self.post('/orders/assign', {'courier_id': 1})
+
+        self.assertEqual([{'id': 2}], response_data['orders'])
+        reads = [call[1]['filter'] for call in find.call_args_list if 'filter' in call[1]]
+        self.assertEqual([{'status': 'in_progress', 'courier_id': 1}], reads)
+        self.assertNotIn(2, self.book)
+        self.assertEqual('in_progress', self.db['orders'].find_one({'_id': 2})['status'])
+
+    def test_order_claimed_elsewhere_should_not_be_assigned(self):
+        # Заказ забрал другой процесс, а событие потока изменений ещё не пришло
+        self.db['orders'].update_one({'_id': 2}, {'$set': {'status': 'in_progress', 'courier_id': 2,
+                                                          'assign_time': '2021-01-10T10:00:00Z'}})
+
+        response_data = self.post('/orders/assign', {'courier_id': 1})
+
+        self.assertEqual([], response_data['orders'])
+        self.assertNotIn(2, self.book)
+
+    def test_batch_assign_should_use_book(self):
+        response_data = self.post('/orders/assign/batch', {'courier_ids': [1, 2]})
+
+        assigned = {courier['courier_id']: [order['id'] for order in courier['orders']]
+                    for courier in response_data['couriers']}
+        self.assertEqual([1, 2, 3], sorted(assigned[1] + assigned[2]))
+        self.assertEqual([4], sorted(order['_id'] for order in self.book.find([1, 2], 50)))
+
+    def test_unassigned_orders_should_return_to_book(self):
+        self.post('/orders/assign', {'courier_id': 2})
+
+        self.post('/couriers/2', {'regions': [2]}, method='patch')
+
+        self.assertIn(1, self.book)
+        self.assertEqual('not_assigned', self.db['orders'].find_one({'_id': 1})['status'])
+        self.assertEqual([{'id': 1}], self.post('/orders/assign', {'courier_id': 1})['orders'])
+
+    def test_book_should_not_be_used_until_loaded(self):
+        self.book.ready = False
+        self.book.remove([1, 2, 3, 4])
+
+        response_data = self.post('/orders/assign', {'courier_id': 1})
+
+        self.assertEqual([{'id': 2}], response_data['orders'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,4 @@
 import unittest
-from datetime import datetime
 from unittest.mock import MagicMock
 
 from jsonschema import ValidationError
@@ -7,6 +6,7 @@ from parameterized import parameterized
 
 from application.data_validator import DataValidator
 from tests.test_utils import read_data
+from utils.parser import unpack_interval
 
 
 class OrdersValidatorTests(unittest.TestCase):
@@ -63,12 +63,12 @@ class OrdersValidatorTests(unittest.TestCase):
     def test_orders_should_be_incorrect_when_containing_extra_fields(self, orders_data: dict, field_name: str):
         self.assert_exception(orders_data, field_name)
 
-    @unittest.mock.patch('jsonschema.validate')
+    @unittest.mock.patch.object(DataValidator, '_invalid_items', return_value=[])
     def test_orders_should_be_incorrect_when_order_ids_not_unique(self, _):
         orders_data = {'data': [{'order_id': 1}, {'order_id': 1}]}
         self.assert_exception(orders_data, 'Orders ids are not unique')
 
-    @unittest.mock.patch('jsonschema.validate')
+    @unittest.mock.patch.object(DataValidator, '_invalid_items', return_value=[])
     def test_correct_delivery_hours_should_be_parsed(self, _):
         orders_data = {
             'data': [{'order_id': 1, 'weight': 3, 'region': 4, 'delivery_hours': ["00:59-23:59"]}]}
@@ -76,10 +76,8 @@ class OrdersValidatorTests(unittest.TestCase):
         delivery_hours = orders_data['data'][0]['delivery_hours']
         self.assertIsInstance(delivery_hours, list)
         self.assertEqual(len(delivery_hours), 1)
-        self.assertIsInstance(delivery_hours[0], tuple)
-        begin_time, end_time = delivery_hours[0]
-        self.assertEqual(begin_time, datetime.strptime("00:59", "%H:%M"))
-        self.assertEqual(end_time, datetime.strptime("23:59", "%H:%M"))
+        self.assertIsInstance(delivery_hours[0], int)
+        self.assertEqual((59, 23 * 60 + 59), unpack_interval(delivery_hours[0]))
 
     @parameterized.expand([
         [{'data': [{'order_id': 1, 'weight': 3, 'region': 4, 'delivery_hours': ["09:59-33:33"]}]}],
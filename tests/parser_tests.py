@@ -0,0 +1,49 @@
+import unittest
+from datetime import datetime
+
+from parameterized import parameterized
+
+from utils.parser import format_interval, pack_interval, pack_legacy_interval, parse_hours, parse_interval, \
+    unpack_interval
+
+
+class ParserTests(unittest.TestCase):
+    @parameterized.expand([
+        ('09:00-18:00', (9 * 60, 18 * 60)),
+        ('00:00-23:59', (0, 23 * 60 + 59)),
+        ('22:30-02:15', (22 * 60 + 30, 26 * 60 + 15)),
+        ('10:00-10:00', (10 * 60, 10 * 60)),
+    ])
+    def test_interval_should_be_parsed_to_minutes(self, hours: str, expected: tuple):
+        self.assertEqual(expected, unpack_interval(parse_interval(hours)))
+
+    @parameterized.expand([['09:00-18:00'], ['22:30-02:15'], ['00:00-00:00'], ['23:59-00:01']])
+    def test_formatted_interval_should_be_equal_to_source(self, hours: str):
+        self.assertEqual(hours, format_interval(parse_interval(hours)))
+
+    @parameterized.expand([['9:00-18:00'], ['09:00-24:00'], ['09:60-18:00'], ['09:00_18:00'], ['09:00-18:000'], ['']])
+    def test_incorrect_interval_should_raise_value_error(self, hours: str):
+        with self.assertRaises(ValueError):
+            parse_interval(hours)
+
+    @parameterized.expand([
+        ('09:00-18:00', datetime(1900, 1, 1, 9), datetime(1900, 1, 1, 18)),
+        ('22:30-02:15', datetime(1900, 1, 1, 22, 30), datetime(1900, 1, 2, 2, 15)),
+    ])
+    def test_legacy_interval_should_be_packed_as_parsed(self, hours: str, begin: datetime, end: datetime):
+        self.assertEqual(parse_interval(hours), pack_legacy_interval((begin, end)))
+
+    def test_packed_intervals_should_be_ordered_by_begin_and_end(self):
+        intervals = [(600, 660), (600, 30), (599, 1439), (0, 0)]
+        packed = sorted(pack_interval(begin, end) for begin, end in intervals)
+        self.assertEqual(sorted(unpack_interval(pack_interval(begin, end)) for begin, end in intervals),
+                         [unpack_interval(value) for value in packed])
+
+    def test_parse_hours_should_replace_field_with_packed_intervals(self):
+        data = {'data': [{'working_hours': ['09:00-11:00', '23:00-01:00']}]}
+        parse_hours(data, 'working_hours')
+        self.assertEqual([(540, 660), (1380, 1500)], [unpack_interval(value) for value in data['data'][0]['working_hours']])
+
+
+if __name__ == '__main__':
+    unittest.main()
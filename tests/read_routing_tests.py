@@ -0,0 +1,122 @@
+import unittest
+from contextlib import contextmanager
+from unittest.mock import MagicMock, patch
+
+from bson import json_util
+from mongomock.collection import Collection, Cursor
+from pymongo import ReadPreference
+
+from application.data_validator import DataValidator
+from application.repository import find_courier, order_exists
+from application.service import make_app
+from application.steps import run
+from tests import test_utils
+
+
+@contextmanager
+def record_reads():
+    """
+    Записывает коллекцию и read preference каждого прочитанного документа.
+    """
+    reads = []
+    next_document = Cursor.__next__
+
+    def recording_next(cursor):
+        document = next_document(cursor)
+        reads.append((cursor.collection.name, cursor.collection.read_preference.mongos_mode))
+        return document
+
+    with patch.object(Cursor, '__next__', recording_next):
+        yield reads
+
+
+class ReadRoutingTests(unittest.TestCase):
+    def setUp(self):
+        self.client = test_utils.MockMongoClient()
+        self.db = self.client['db']
+        self.app = make_app(self.db, DataValidator(),
+                            read_preference=ReadPreference.SECONDARY_PREFERRED).test_client()
+        self.post('/couriers', {'data': [
+            {'courier_id': 1, 'courier_type': 'foot', 'regions': [1], 'working_hours': ['10:00-11:00']}]})
+        self.post('/orders', {'data': [
+            {'order_id': order_id, 'weight': 4, 'region': 1, 'delivery_hours': ['09:00-12:00']}
+            for order_id in (1, 2)]})
+
+    def post(self, url: str, data: dict):
+        headers = [('Content-Type', 'application/json')]
+        return self.app.post(url, data=json_util.dumps(data), headers=headers)
+
+    def test_courier_lookup_should_prefer_secondary(self):
+        with record_reads() as reads:
+            response = self.app.get('/couriers/1')
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual([('couriers', 'secondaryPreferred')], reads)
+
+    def test_repeated_complete_should_check_order_on_secondary(self):
+        self.post('/orders/assign', {'courier_id': 1})
+        complete_data = {'courier_id': 1, 'order_id': 1, 'complete_time': '2021-01-10T10:33:01.42Z'}
+        self.post('/orders/complete', complete_data)
+
+        with record_reads() as reads:
+            response = self.post('/orders/complete', complete_data)
+
+        self.assertEqual({'order_id': 1}, response.get_json())
+        self.assertIn(('orders', 'secondaryPreferred'), reads)
+
+    def test_orders_should_be_reread_in_causal_session_after_partial_claim(self):
+        update_many = Collection.update_many
+
+        def concurrent_update_many(collection, filter, update, **kwargs):
+            # Параллельный запрос успевает забрать второй заказ
+            update_many(collection, {'_id': 2}, {'$set': {'status': 'in_progress', 'courier_id': 2,
+                                                         'assign_time': '2021-01-10T09:00:00Z'}})
+            return update_many(collection, filter, update, **kwargs)
+
+        with patch.object(self.client, 'start_session', wraps=self.client.start_session) as start_session, \
+                patch.object(Collection, 'update_many', concurrent_update_many), record_reads() as reads:
+            response = self.post('/orders/assign', {'courier_id': 1})
+
+        self.assertEqual([{'id': 1}], response.get_json()['orders'])
+        start_session.assert_called_once_with(causal_consistency=True)
+        self.assertIn(('orders', 'secondaryPreferred'), reads)
+
+    def test_primary_should_be_used_without_read_preference(self):
+        app = make_app(self.db, DataValidator()).test_client()
+
+        with patch.object(self.client, 'start_session') as start_session, record_reads() as reads:
+            app.get('/couriers/1')
+            app.post('/orders/assign', data=json_util.dumps({'courier_id': 1}),
+                     headers=[('Content-Type', 'application/json')])
+
+        start_session.assert_not_called()
+        self.assertEqual({'primary'}, {read_preference for _, read_preference in reads})
+
+
+class PrimaryFallbackTests(unittest.TestCase):
+    def setUp(self):
+        self.secondary = MagicMock()
+        self.secondary.find_one.return_value = None
+        self.primary = MagicMock()
+        self.primary.find_one.return_value = {'_id': 1}
+        collection = MagicMock()
+        collection.with_options.side_effect = lambda read_preference: (
+            self.primary if read_preference == ReadPreference.PRIMARY else self.secondary)
+        self.db = {'couriers': collection, 'orders': collection}
+
+    def test_courier_missing_on_secondary_should_be_read_from_primary(self):
+        courier = run(find_courier(self.db, 1, {'regions': 1}, ReadPreference.SECONDARY_PREFERRED))
+
+        self.assertEqual({'_id': 1}, courier)
+        self.secondary.find_one.assert_called_once_with({'_id': 1}, {'regions': 1})
+        self.primary.find_one.assert_called_once_with({'_id': 1}, {'regions': 1})
+
+    def test_order_missing_on_secondary_should_be_checked_on_primary(self):
+        self.assertTrue(run(order_exists(self.db, {'_id': 1}, ReadPreference.SECONDARY_PREFERRED)))
+
+        self.primary.find_one.return_value = None
+        self.assertFalse(run(order_exists(self.db, {'_id': 1}, ReadPreference.SECONDARY_PREFERRED)))
+
+
+if __name__ == '__main__':
+    unittest.main()
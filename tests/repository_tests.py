@@ -0,0 +1,143 @@
+import unittest
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+from unittest.mock import patch
+
+import bson
+from bson import json_util
+from mongomock.collection import Collection, Cursor
+
+from application.data_validator import DataValidator
+from application.service import make_app
+from tests import test_utils
+
+# Свободные заказы, которые подходят курьеру по району и весу
+MATCHING_ORDERS = 100
+
+# Сколько байт документов монго может вернуть обработчик на наборе данных теста. Назначение читает все
+# подходящие свободные заказы, с проекцией FREE_ORDER_FIELDS это меньше 90 байт на заказ вместо 150
+BYTES_BUDGET = {
+    'POST /orders/assign': 400 + 90 * MATCHING_ORDERS,
+    'POST /orders/complete': 500,
+    'GET /couriers/$courier_id': 200,
+    'PATCH /couriers/$courier_id': 400,
+}
+
+
+# Методы коллекции, которые возвращают один документ
+DOCUMENT_METHODS = ('find_one', 'find_one_and_update', 'find_one_and_replace', 'find_one_and_delete')
+
+# Методы коллекции, которые не возвращают документов, но внутри mongomock читают их курсором
+WRITE_METHODS = ('insert_one', 'insert_many', 'update_one', 'update_many', 'replace_one', 'delete_one',
+                 'delete_many', 'bulk_write', 'count_documents')
+
+
+@contextmanager
+def count_transferred_bytes():
+    """
+    Считает размер в BSON документов, которые вернули запросы к монго, по коллекциям.
+
+    Учитываются документы курсоров find и aggregate и документы, которые вернули find_one и find_one_and_*.
+    Внутри методов коллекции mongomock сам читает документы курсором, такие чтения не учитываются:
+    сервер их не передаёт.
+    """
+    transferred = defaultdict(int)
+    inside_method = [0]
+    next_document = Cursor.__next__
+
+    def counting_next(cursor):
+        document = next_document(cursor)
+        if not inside_method[0]:
+            transferred[cursor.collection.name] += len(bson.BSON.encode(document))
+        return document
+
+    def guarded(method, count_result):
+        def call(collection, *args, **kwargs):
+            inside_method[0] += 1
+            try:
+                result = method(collection, *args, **kwargs)
+            finally:
+                inside_method[0] -= 1
+            if count_result is not None:
+                result = count_result(collection, result)
+            return result
+
+        return call
+
+    def count_document(collection, document):
+        if document is not None and not inside_method[0]:
+            transferred[collection.name] += len(bson.BSON.encode(document))
+        return document
+
+    def count_documents(collection, documents):
+        documents = list(documents)
+        for document in documents:
+            count_document(collection, document)
+        return iter(documents)
+
+    with ExitStack() as stack:
+        stack.enter_context(patch.object(Cursor, '__next__', counting_next))
+        for name in DOCUMENT_METHODS:
+            stack.enter_context(patch.object(Collection, name, guarded(getattr(Collection, name), count_document)))
+        for name in WRITE_METHODS:
+            stack.enter_context(patch.object(Collection, name, guarded(getattr(Collection, name), None)))
+        stack.enter_context(patch.object(Collection, 'aggregate',
+                                         guarded(Collection.aggregate, count_documents)))
+        yield transferred
+
+
+class RepositoryTests(unittest.TestCase):
+    def setUp(self):
+        self.db = test_utils.MockMongoClient()['db']
+        self.app = make_app(self.db, DataValidator()).test_client()
+        self.post('/couriers', {'data': [
+            {'courier_id': 1, 'courier_type': 'foot', 'regions': [1], 'working_hours': ['10:00-11:00']}]})
+        # Много свободных заказов района курьера: подходящие по весу читаются все, назначаются только несколько
+        self.post('/orders', {'data': [
+            {'order_id': order_id, 'weight': 4 if order_id <= MATCHING_ORDERS else 30, 'region': 1,
+             'delivery_hours': ['09:00-12:00', '13:00-14:00', '15:00-16:00', '17:00-18:00']}
+            for order_id in range(1, 2 * MATCHING_ORDERS + 1)]})
+
+    def post(self, url: str, data: dict, method='post'):
+        headers = [('Content-Type', 'application/json')]
+        return getattr(self.app, method)(url, data=json_util.dumps(data), headers=headers)
+
+    def assert_within_budget(self, route: str, transferred: dict):
+        self.assertLessEqual(sum(transferred.values()), BYTES_BUDGET[route], route)
+
+    def test_routes_should_stay_within_bytes_budget(self):
+        with count_transferred_bytes() as transferred:
+            assign_response = self.post('/orders/assign', {'courier_id': 1})
+        self.assertEqual([{'id': 1}, {'id': 2}], assign_response.get_json()['orders'])
+        self.assert_within_budget('POST /orders/assign', transferred)
+
+        with count_transferred_bytes() as transferred:
+            complete_response = self.post('/orders/complete', {
+                'courier_id': 1, 'order_id': 1, 'complete_time': '2021-01-10T10:33:01.42Z'})
+        self.assertEqual(201, complete_response.status_code)
+        self.assert_within_budget('POST /orders/complete', transferred)
+
+        with count_transferred_bytes() as transferred:
+            get_response = self.app.get('/couriers/1')
+        self.assertEqual(200, get_response.status_code)
+        self.assert_within_budget('GET /couriers/$courier_id', transferred)
+
+        with count_transferred_bytes() as transferred:
+            patch_response = self.post('/couriers/1', {'working_hours': ['17:00-17:30']}, method='patch')
+        self.assertEqual(201, patch_response.status_code)
+        self.assert_within_budget('PATCH /couriers/$courier_id', transferred)
+
+    def test_repeated_complete_should_check_only_existence(self):
+        self.post('/orders/assign', {'courier_id': 1})
+        complete_data = {'courier_id': 1, 'order_id': 1, 'complete_time': '2021-01-10T10:33:01.42Z'}
+        self.post('/orders/complete', complete_data)
+
+        with count_transferred_bytes() as transferred:
+            response = self.post('/orders/complete', complete_data)
+
+        self.assertEqual({'order_id': 1}, response.get_json())
+        self.assertEqual({'orders': len(bson.BSON.encode({'_id': 1}))}, dict(transferred))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import json
+import unittest
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+
+from application.data_validator import DataValidator
+from application.serialization import BACKENDS, JsonFlask, JsonSerializer, format_datetime
+from application.service import make_app
+from tests import test_utils
+
+
+class SerializationTests(unittest.TestCase):
+    def test_backends_should_serialize_equally(self):
+        value = {
+            'id': ObjectId('5f0c1b6a9d1e8a3b2c4d5e6f'),
+            'naive': datetime(2021, 3, 28, 10, 15, 30, 123000),
+            'utc': datetime(2021, 3, 28, 10, 15, 30, tzinfo=timezone.utc),
+            'moscow': datetime(2021, 3, 28, 13, 15, 30, tzinfo=timezone(timedelta(hours=3))),
+            'orders': [{'id': 1, 'weight': 0.23, 'region': 'Москва'}],
+        }
+        expected = {
+            'id': '5f0c1b6a9d1e8a3b2c4d5e6f',
+            'naive': '2021-03-28T10:15:30.123000Z',
+            'utc': '2021-03-28T10:15:30Z',
+            'moscow': '2021-03-28T13:15:30+03:00',
+            'orders': [{'id': 1, 'weight': 0.23, 'region': 'Москва'}],
+        }
+
+        for backend in BACKENDS:
+            with self.subTest(backend=backend):
+                serializer = JsonSerializer(backend)
+                dumped = serializer.dumps(value)
+                self.assertIsInstance(dumped, bytes)
+                self.assertEqual(expected, json.loads(dumped))
+                self.assertEqual(expected, serializer.loads(dumped))
+
+    def test_format_datetime_should_treat_naive_time_as_utc(self):
+        self.assertEqual('2021-01-10T09:32:14.420000Z', format_datetime(datetime(2021, 1, 10, 9, 32, 14, 420000)))
+
+    def test_unknown_backend_should_raise(self):
+        with self.assertRaises(ValueError):
+            JsonSerializer('simplejson-unknown')
+
+    def test_default_backend_should_be_fastest_available(self):
+        self.assertEqual(next(iter(BACKENDS)), JsonSerializer().backend)
+        self.assertEqual('json', list(BACKENDS)[-1])
+
+    def test_app_should_serialize_returned_dicts(self):
+        app = JsonFlask(__name__, serializer=JsonSerializer('json'))
+        app.add_url_rule('/tuple', 'tuple', lambda: ({'orders': [{'id': 1}]}, 201))
+        app.add_url_rule('/dict', 'dict', lambda: {'validation_error': 'error'})
+        client = app.test_client()
+
+        tuple_response = client.get('/tuple')
+        dict_response = client.get('/dict')
+
+        self.assertEqual(201, tuple_response.status_code)
+        self.assertEqual('application/json', tuple_response.mimetype)
+        self.assertEqual({'orders': [{'id': 1}]}, tuple_response.get_json())
+        self.assertEqual(200, dict_response.status_code)
+        self.assertEqual({'validation_error': 'error'}, dict_response.get_json())
+
+    def test_service_should_reject_invalid_json(self):
+        app, db, validator = test_utils.set_up_service()
+
+        http_response = app.post('/orders/assign', data=b'{"courier_id": ',
+                                 headers=[('Content-Type', 'application/json')])
+
+        self.assertEqual(400, http_response.status_code)
+        self.assertTrue(http_response.get_json()['message'].startswith('Error when parsing JSON'))
+        validator.validate_assign.assert_not_called()
+
+    def test_service_should_parse_and_serialize_with_serializer(self):
+        db = test_utils.MockMongoClient()['db']
+        app = make_app(db, DataValidator()).test_client()
+        headers = [('Content-Type', 'application/json')]
+        data = {'data': [{'courier_id': 1, 'courier_type': 'foot', 'regions': [1], 'working_hours': ['11:35-14:05']}]}
+
+        post_response = app.post('/couriers', data=json.dumps(data), headers=headers)
+        patch_response = app.patch('/couriers/1', data=json.dumps({'regions': [1, 2]}), headers=headers)
+
+        self.assertEqual(201, post_response.status_code)
+        self.assertEqual({'couriers': [{'id': 1}]}, post_response.get_json())
+        self.assertEqual(201, patch_response.status_code)
+        self.assertEqual({'courier_id': 1, 'courier_type': 'foot', 'regions': [1, 2],
+                          'working_hours': ['11:35-14:05']}, patch_response.get_json())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import random
+import unittest
+from unittest.mock import patch
+
+from parameterized import parameterized
+
+from utils.parser import pack_interval, parse_hours, unpack_interval
+from utils.utils import split_orders
+
+
+def naive_split_orders(orders_data, working_hours):
+    av_orders = []
+    un_orders = []
+    for order in orders_data:
+        if any(st2 <= st1 and fn1 <= fn2
+               for st2, fn2 in map(unpack_interval, order['delivery_hours'])
+               for st1, fn1 in map(unpack_interval, working_hours)):
+            av_orders.append(order)
+        else:
+            un_orders.append(order['_id'])
+    return av_orders, un_orders
+
+
+def random_hours(rnd: random.Random, count: int):
+    hours = []
+    for _ in range(count):
+        begin = rnd.randrange(24 * 60)
+        end = rnd.randrange(24 * 60)
+        hours.append(f'{begin // 60:02}:{begin % 60:02}-{end // 60:02}:{end % 60:02}')
+    return hours
+
+
+def random_packed_hours(rnd: random.Random, count: int):
+    intervals = []
+    for _ in range(count):
+        begin = rnd.randrange(24 * 60)
+        end = rnd.randrange(24 * 60)
+        intervals.append(pack_interval(begin, end))
+    return intervals
+
+
+def make_orders(hours_list):
+    orders_data = {'data': [{'_id': i + 1, 'delivery_hours': hours} for i, hours in enumerate(hours_list)]}
+    parse_hours(orders_data, 'delivery_hours')
+    return orders_data['data']
+
+
+def make_working_hours(hours):
+    courier_data = {'data': [{'working_hours': hours}]}
+    parse_hours(courier_data, 'working_hours')
+    return courier_data['data'][0]['working_hours']
+
+
+class SplitOrdersTests(unittest.TestCase):
+    @parameterized.expand([
+        (['09:00-18:00'], ['10:00-11:00'], [1]),
+        (['09:00-12:00', '16:00-21:30'], ['20:00-21:00'], [1]),
+        (['09:00-18:00'], ['17:00-19:00'], []),
+        (['22:00-02:00'], ['23:00-01:00'], [1]),
+        (['23:00-01:00'], ['22:00-02:00'], []),
+        ([], ['10:00-11:00'], []),
+        (['10:00-11:00'], [], []),
+    ])
+    def test_split_orders_should_match_when_delivery_contains_working_interval(
+            self, delivery_hours: list, working_hours: list, expected_ids: list):
+        orders = make_orders([delivery_hours])
+        av_orders, un_orders = split_orders(orders, make_working_hours(working_hours))
+        self.assertEqual(expected_ids, [order['_id'] for order in av_orders])
+        self.assertEqual([1] if not expected_ids else [], un_orders)
+
+    @parameterized.expand([(0, 100), (1, 100), (2, 2000)])
+    def test_split_orders_should_be_equal_to_naive_implementation(self, seed: int, orders_count: int):
+        rnd = random.Random(seed)
+        orders = make_orders([random_hours(rnd, rnd.randrange(4)) for _ in range(orders_count)])
+        working_hours = make_working_hours(random_hours(rnd, 5))
+        self.assertEqual(naive_split_orders(orders, working_hours), split_orders(orders, working_hours))
+
+    def test_vectorized_and_scalar_paths_should_be_equal(self):
+        rnd = random.Random(3)
+        orders = [{'_id': i + 1, 'delivery_hours': random_packed_hours(rnd, rnd.randrange(1, 4))} for i in range(300)]
+        working_hours = random_packed_hours(rnd, 3)
+        with patch('utils.utils.VECTORIZE_THRESHOLD', 0):
+            vectorized = split_orders(orders, working_hours)
+        with patch('utils.utils.VECTORIZE_THRESHOLD', 10 ** 9):
+            scalar = split_orders(orders, working_hours)
+        self.assertEqual(scalar, vectorized)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,4 +1,5 @@
 import os
+from concurrent.futures import Executor, Future
 from typing import Tuple
 from unittest.mock import MagicMock
 
@@ -6,7 +7,9 @@ from bson import json_util
 from flask import Flask
 from mongomock import MongoClient
 
+from application.async_service import make_async_app
 from application.data_validator import DataValidator
+from application.imports import ImportWorker
 from application.service import make_app
 
 
@@ -26,10 +29,65 @@ class MockMongoClient(MongoClient):
         self.session.__enter__ = MagicMock(return_value=session_enter)
         self.session.start_transaction = MagicMock(return_value=transaction)
 
-    def start_session(self):
+    def start_session(self, **kwargs):
         return self.session
 
 
+class ImmediateExecutor(Executor):
+    """
+    Исполнитель, выполняющий задачи сразу в вызывающем потоке.
+
+    Позволяет проверять результат фоновой обработки без ожидания.
+    """
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        future.set_result(fn(*args, **kwargs))
+        return future
+
+
+class AsyncMockCursor(object):
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    async def to_list(self, length):
+        return list(self.cursor)
+
+
+class AsyncMockCollection(object):
+    """
+    Асинхронная обёртка над коллекцией mongomock с интерфейсом коллекции motor.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def find(self, *args, **kwargs):
+        return AsyncMockCursor(self.collection.find(*args, **kwargs))
+
+    def aggregate(self, *args, **kwargs):
+        return AsyncMockCursor(self.collection.aggregate(*args, **kwargs))
+
+    def with_options(self, **kwargs):
+        return AsyncMockCollection(self.collection.with_options(**kwargs))
+
+    def __getattr__(self, name):
+        method = getattr(self.collection, name)
+
+        async def call(*args, **kwargs):
+            return method(*args, **kwargs)
+
+        return call
+
+
+class AsyncMockDatabase(object):
+    def __init__(self, db):
+        self.db = db
+
+    def __getitem__(self, collection_name):
+        return AsyncMockCollection(self.db[collection_name])
+
+
 def create_mock_validator() -> DataValidator:
     """
     Создает фейковый экземпляр класса DataValidator
@@ -41,8 +99,11 @@ def create_mock_validator() -> DataValidator:
     validator.validate_couriers = MagicMock()
     validator.validate_orders = MagicMock()
     validator.validate_assign = MagicMock()
+    validator.validate_assign_batch = MagicMock()
     validator.validate_courier_patch = MagicMock()
+    validator.validate_couriers_patch = MagicMock()
     validator.validate_complete = MagicMock()
+    validator.validate_complete_batch = MagicMock()
     return validator
 
 
@@ -69,5 +130,20 @@ def set_up_service() -> Tuple[Flask, MongoClient, DataValidator]:
     """
     db = MockMongoClient()['db']
     validator = create_mock_validator()
-    app = make_app(db, validator).test_client()
+    import_worker = ImportWorker(db, validator, executor=ImmediateExecutor())
+    app = make_app(db, validator, import_worker).test_client()
+    return app, db, validator
+
+
+def set_up_async_service(**kwargs) -> Tuple[object, MongoClient, DataValidator]:
+    """
+    Производит подготовку асинхронного сервиса к тестированию.
+
+    :param kwargs: дополнительные параметры make_async_app
+    :return: Тестовый клиент сервиса, фейковый монго клиент, фейковый валидатор
+    :rtype: Tuple[object, MongoClient, DataValidator]
+    """
+    db = MockMongoClient()['db']
+    validator = create_mock_validator()
+    app = make_async_app(AsyncMockDatabase(db), validator, **kwargs).test_client()
     return app, db, validator
@@ -0,0 +1,223 @@
+from collections import defaultdict
+from typing import Optional, Tuple
+
+import numpy as np
+
+from utils.utils import split_orders
+
+COURIER_CAPACITY = {'foot': 10, 'bike': 15, 'car': 50}
+
+# Веса заказов кратны 0.01, поэтому задача решается в целых сотых долях килограмма
+WEIGHT_SCALE = 100
+
+# Начиная с такого числа заказов веса переводятся в целые числа через numpy
+VECTORIZE_THRESHOLD = 256
+
+
+def courier_capacity(courier_type: str) -> int:
+    return COURIER_CAPACITY[courier_type]
+
+
+def changed_constraints(courier: dict, patch_data: dict) -> set:
+    """
+    Определяет поля профиля, после изменения которых заказы курьера в работе нужно проверить заново.
+
+    Уменьшение грузоподъёмности требует проверки веса, увеличение ни один заказ не делает недопустимым.
+    :param dict courier: курьер до изменения
+    :param dict patch_data: новые значения полей
+    :return: множество из regions, working_hours и courier_type
+    :rtype: set
+    """
+    changed = {key for key, value in patch_data.items() if courier.get(key) != value}
+    if 'courier_type' in changed and \
+            courier_capacity(patch_data['courier_type']) >= courier_capacity(courier['courier_type']):
+        changed.discard('courier_type')
+    return changed
+
+
+def revalidate_orders(orders: list, courier: dict, changed: set) -> list:
+    """
+    Выбирает заказы в работе, которые остаются за курьером после изменения профиля.
+
+    Проверяются только ограничения, зависящие от изменённых полей: остальные заказы уже выполняли
+    при назначении, а подмножество назначенных заказов не превышает грузоподъёмность.
+    :param list orders: заказы курьера в работе
+    :param dict courier: курьер после изменения
+    :param set changed: поля, вернувшиеся из changed_constraints
+    :return: оставшиеся заказы в исходном порядке
+    :rtype: list
+    """
+    if 'regions' in changed:
+        regions = set(courier['regions'])
+        orders = [order for order in orders if order['region'] in regions]
+    if 'working_hours' in changed:
+        orders, _ = split_orders(orders, courier['working_hours'])
+    if 'courier_type' in changed:
+        orders = select_orders(orders, courier_capacity(courier['courier_type']))
+    return orders
+
+
+def couriers_to_recheck(patched: list, read_orders: bool = False) -> dict:
+    """
+    Выбирает изменённых курьеров, заказы в работе которых нужно прочитать и проверить заново.
+
+    Если изменились только районы, заказы можно не читать: районы проверяет само условие снятия заказов.
+    :param list patched: пары из курьера после изменения и непустого результата changed_constraints
+    :param bool read_orders: читать заказы всех курьеров, например чтобы вернуть снятые заказы в книгу
+    :return: словарь идентификатор курьера -> пара из patched
+    :rtype: dict
+    """
+    return {courier['_id']: (courier, changed) for courier, changed in patched
+            if read_orders or changed != {'regions'}}
+
+
+def plan_unassign(patched: list, rechecked: dict, orders: list) -> Tuple[Optional[dict], list]:
+    """
+    Определяет заказы в работе, которые перестали подходить курьерам после изменения их профилей.
+
+    :param list patched: пары из курьера после изменения и непустого результата changed_constraints
+    :param dict rechecked: результат couriers_to_recheck
+    :param list orders: заказы в работе курьеров из rechecked
+    :return: условие снятия заказов для update_many или None, если снимать нечего, и снимаемые заказы из orders
+    :rtype: Tuple[Optional[dict], list]
+    """
+    orders_by_courier = defaultdict(list)
+    for order in orders:
+        orders_by_courier[order['courier_id']].append(order)
+    unassign_filters = []
+    un_orders = []
+    for courier, changed in patched:
+        if courier['_id'] not in rechecked:
+            unassign_filters.append({'courier_id': courier['_id'], 'region': {'$nin': courier['regions']}})
+            continue
+        list_orders = orders_by_courier[courier['_id']]
+        kept_ids = {order['_id'] for order in revalidate_orders(list_orders, courier, changed)}
+        un_orders.extend(order for order in list_orders if order['_id'] not in kept_ids)
+    if un_orders:
+        unassign_filters.append({'_id': {'$in': [order['_id'] for order in un_orders]}})
+    if not unassign_filters:
+        return None, []
+    return {'status': 'in_progress', '$or': unassign_filters}, un_orders
+
+
+def scale_weights(weights) -> list:
+    """
+    Переводит веса заказов в целые сотые доли килограмма.
+
+    :param weights: веса заказов в килограммах
+    :return: список целых весов
+    :rtype: list
+    """
+    if len(weights) >= VECTORIZE_THRESHOLD:
+        return np.rint(np.asarray(weights, dtype=np.float64) * WEIGHT_SCALE).astype(np.int64).tolist()
+    return [int(round(weight * WEIGHT_SCALE)) for weight in weights]
+
+
+def select_orders(orders: list, capacity) -> list:
+    """
+    Выбирает заказы с максимальным суммарным весом, не превышающим грузоподъёмность курьера.
+
+    Сначала проверяются быстрые случаи: все заказы помещаются целиком или жадный выбор
+    по убыванию веса заполняет грузоподъёмность полностью. Иначе решается задача о сумме
+    подмножества, где одинаковые веса объединяются в группы с двоичным разбиением.
+    :param list orders: заказы с полем weight
+    :param capacity: грузоподъёмность курьера в килограммах
+    :return: выбранные заказы в исходном порядке
+    :rtype: list
+    """
+    limit = int(round(capacity * WEIGHT_SCALE))
+    weights = scale_weights([order['weight'] for order in orders])
+    fitting = [i for i, weight in enumerate(weights) if weight <= limit]
+    if sum(weights[i] for i in fitting) <= limit:
+        return [orders[i] for i in fitting]
+
+    chosen = _select_greedy(fitting, weights, limit)
+    if sum(weights[i] for i in chosen) < limit:
+        chosen = _select_subset_sum(fitting, weights, limit)
+    return [orders[i] for i in sorted(chosen)]
+
+
+def _select_greedy(indices: list, weights: list, limit: int) -> list:
+    chosen = []
+    total = 0
+    for i in sorted(indices, key=weights.__getitem__, reverse=True):
+        if total + weights[i] <= limit:
+            chosen.append(i)
+            total += weights[i]
+            if total == limit:
+                break
+    return chosen
+
+
+def _select_subset_sum(indices: list, weights: list, limit: int) -> list:
+    groups = defaultdict(list)
+    for i in indices:
+        groups[weights[i]].append(i)
+
+    # Группа из k заказов одного веса заменяется частями 1, 2, 4, ... заказов, из которых набирается любое
+    # количество от 0 до k. Больше limit // weight заказов одного веса всё равно не поместится
+    parts = []
+    for weight, group in groups.items():
+        count = min(len(group), limit // weight)
+        size = 1
+        while count > 0:
+            part = min(size, count)
+            parts.append((weight, part))
+            count -= part
+            size *= 2
+
+    # Множество достижимых сумм хранится битами целого числа, для каждой суммы запоминается часть,
+    # которой она была достигнута впервые
+    reachable = 1
+    mask = (1 << (limit + 1)) - 1
+    first_part = [-1] * (limit + 1)
+    for part_number, (weight, part) in enumerate(parts):
+        new_sums = (reachable << weight * part) & ~reachable & mask
+        reachable |= new_sums
+        while new_sums:
+            lowest = new_sums & -new_sums
+            first_part[lowest.bit_length() - 1] = part_number
+            new_sums ^= lowest
+        if reachable >> limit:
+            break
+
+    taken = defaultdict(int)
+    total = reachable.bit_length() - 1
+    while total > 0:
+        weight, part = parts[first_part[total]]
+        taken[weight] += part
+        total -= weight * part
+    return [i for weight, count in taken.items() for i in groups[weight][:count]]
+
+
+def plan_assignments(couriers: list, orders: list) -> dict:
+    """
+    Распределяет свободные заказы между несколькими курьерами за один проход.
+
+    Для каждого курьера подходящие заказы ищутся через индекс заказов по районам и индекс его рабочих
+    интервалов. Затем курьеры обрабатываются от имеющих меньше всего подходящих заказов к имеющим
+    больше всего, и каждый получает оптимальный по весу набор из ещё не распределённых заказов.
+    :param list couriers: курьеры без заказов в работе
+    :param list orders: свободные заказы
+    :return: словарь из идентификатора курьера в список назначенных ему заказов
+    :rtype: dict
+    """
+    orders_by_region = defaultdict(list)
+    for order in orders:
+        orders_by_region[order['region']].append(order)
+
+    matching_orders = {}
+    for courier in couriers:
+        capacity = courier_capacity(courier['courier_type'])
+        candidates = [order for region in set(courier['regions']) for order in orders_by_region.get(region, [])
+                      if order['weight'] <= capacity]
+        matching_orders[courier['_id']], _ = split_orders(candidates, courier['working_hours'])
+
+    taken_ids = set()
+    plan = {}
+    for courier in sorted(couriers, key=lambda item: len(matching_orders[item['_id']])):
+        available = [order for order in matching_orders[courier['_id']] if order['_id'] not in taken_ids]
+        selected = select_orders(available, courier_capacity(courier['courier_type']))
+        taken_ids.update(order['_id'] for order in selected)
+        plan[courier['_id']] = selected
+    return plan
@@ -0,0 +1,123 @@
+from datetime import datetime, timezone
+from typing import Optional
+
+import iso8601
+
+# Коэффициент оплаты развоза в зависимости от типа курьера на момент назначения
+EARNINGS_COEFFICIENT = {'foot': 2, 'bike': 5, 'car': 9}
+
+# Базовая оплата одного завершённого развоза
+BASE_EARNING = 500
+
+# Среднее время доставки, начиная с которого рейтинг равен нулю, в секундах
+MAX_DELIVERY_TIME = 60 * 60
+
+MAX_RATING = 5
+
+
+def to_utc(value) -> datetime:
+    """
+    Приводит время назначения или выполнения к наивному datetime в UTC с точностью до миллисекунд,
+    в каком виде его возвращает монго.
+
+    :param value: время в формате RFC 3339 или datetime
+    :return: время в UTC без часового пояса
+    :rtype: datetime
+    """
+    if isinstance(value, str):
+        value = iso8601.parse_date(value)
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.replace(microsecond=value.microsecond // 1000 * 1000)
+
+
+def region_key(region: int) -> str:
+    return str(region)
+
+
+def completion_update(courier: dict, region: int, duration: float, complete_time: datetime) -> dict:
+    """
+    Формирует обновление курьера после выполнения заказа.
+
+    Статистика доставок пополняется всегда, счётчики развоза уменьшаются тем же обновлением. Если выполнен
+    последний заказ развоза, вместо этого развоз закрывается и учитывается в заработке, поэтому завершение
+    развоза - одно обновление документа курьера.
+    :param dict courier: курьер до выполнения заказа, со счётчиком невыполненных заказов развоза
+    :param int region: район заказа
+    :param float duration: длительность доставки в секундах
+    :param datetime complete_time: время выполнения в UTC
+    :return: обновление для update_one
+    :rtype: dict
+    """
+    key = region_key(region)
+    update = {'$inc': {f'delivery_stats.{key}.sum': duration, f'delivery_stats.{key}.count': 1}}
+    active_assign = courier.get('active_assign') or {}
+    if active_assign.get('outstanding') == 1:
+        update['$inc'].update(_assign_payment(courier))
+        update['$unset'] = {'active_assign': ''}
+    else:
+        update['$inc'].update({'active_assign.completed': 1, 'active_assign.outstanding': -1})
+        update['$max'] = {'active_assign.last_complete_time': complete_time}
+    return update
+
+
+def delivery_duration(complete_time: datetime, last_complete_time, assign_time) -> float:
+    """
+    Считает длительность доставки: от предыдущего выполненного заказа развоза, а для первого заказа
+    от времени назначения.
+
+    :param datetime complete_time: время выполнения в UTC
+    :param last_complete_time: время выполнения предыдущего заказа развоза или None
+    :param assign_time: время назначения
+    :return: длительность в секундах, не меньше нуля
+    :rtype: float
+    """
+    return max((complete_time - to_utc(last_complete_time or assign_time)).total_seconds(), 0)
+
+
+def closed_assign_update(courier: Optional[dict]) -> Optional[dict]:
+    """
+    Формирует начисление за развоз, снятый с курьера через close_active_assign.
+
+    :param dict courier: курьер с удалённым развозом или None, если развоза не было
+    :return: обновление для update_one или None, если в развозе не выполнено ни одного заказа
+    :rtype: Optional[dict]
+    """
+    if courier is None or courier['active_assign'].get('completed', 0) == 0:
+        return None
+    return {'$inc': _assign_payment(courier)}
+
+
+def _assign_payment(courier: dict) -> dict:
+    # Развоз оплачивается по типу курьера на момент назначения
+    courier_type = courier['active_assign'].get('courier_type', courier['courier_type'])
+    return {'assigns': 1, f'completed_assigns.{courier_type}': 1}
+
+
+def courier_rating(delivery_stats: dict) -> Optional[float]:
+    """
+    Считает рейтинг курьера по накопленной статистике доставок.
+
+    Для каждого района хранятся сумма и число длительностей доставок, поэтому рейтинг считается
+    за время, пропорциональное числу районов.
+    :param dict delivery_stats: словарь район -> {'sum': секунды, 'count': число доставок}
+    :return: рейтинг от 0 до 5 или None, если курьер ещё ничего не доставил
+    :rtype: Optional[float]
+    """
+    averages = [stats['sum'] / stats['count'] for stats in delivery_stats.values() if stats['count']]
+    if not averages:
+        return None
+    t = min(min(averages), MAX_DELIVERY_TIME)
+    return round((MAX_DELIVERY_TIME - t) / MAX_DELIVERY_TIME * MAX_RATING, 2)
+
+
+def courier_earnings(completed_assigns: dict) -> int:
+    """
+    Считает заработок курьера по числу завершённых развозов каждого типа.
+
+    :param dict completed_assigns: словарь тип курьера -> число завершённых развозов
+    :return: заработок
+    :rtype: int
+    """
+    return sum(BASE_EARNING * EARNINGS_COEFFICIENT[courier_type] * count
+               for courier_type, count in completed_assigns.items())
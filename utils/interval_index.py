@@ -0,0 +1,71 @@
+from bisect import bisect_left
+
+import numpy as np
+
+from utils.parser import BEGIN_SHIFT, END_MASK, MINUTES_PER_DAY, WRAP_FLAG, unpack_interval
+
+
+def unpack_array(packed: np.ndarray):
+    """
+    Векторная версия unpack_interval.
+
+    :param np.ndarray packed: массив упакованных интервалов
+    :return: пара массивов (начала, концы) в минутах
+    :rtype: Tuple[np.ndarray, np.ndarray]
+    """
+    ends = packed & END_MASK
+    ends += (packed & WRAP_FLAG) // WRAP_FLAG * MINUTES_PER_DAY
+    return packed >> BEGIN_SHIFT, ends
+
+
+class IntervalIndex(object):
+    """
+    Индекс рабочих интервалов курьера.
+
+    Интервалы отсортированы по началу, для каждой позиции хранится минимальный конец среди
+    интервалов, начинающихся не раньше неё. Поэтому проверка "интервал заказа содержит хотя бы
+    один рабочий интервал" сводится к одному бинарному поиску.
+    """
+
+    def __init__(self, intervals):
+        pairs = sorted(unpack_interval(packed) for packed in intervals)
+        self.begins = [begin for begin, _ in pairs]
+        self.min_ends = [end for _, end in pairs]
+        for i in range(len(pairs) - 2, -1, -1):
+            if self.min_ends[i + 1] < self.min_ends[i]:
+                self.min_ends[i] = self.min_ends[i + 1]
+        self._begins_array = np.array(self.begins, dtype=np.int64)
+        self._min_ends_array = np.array(self.min_ends, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.begins)
+
+    def covers(self, packed: int) -> bool:
+        """
+        Проверяет, содержит ли интервал хотя бы один рабочий интервал.
+
+        :param int packed: упакованный интервал
+        :rtype: bool
+        """
+        i = bisect_left(self.begins, packed >> BEGIN_SHIFT)
+        if i == len(self.begins):
+            return False
+        end = packed & END_MASK
+        if packed & WRAP_FLAG:
+            end += MINUTES_PER_DAY
+        return self.min_ends[i] <= end
+
+    def covers_many(self, packed: np.ndarray) -> np.ndarray:
+        """
+        Векторная версия covers.
+
+        :param np.ndarray packed: массив упакованных интервалов
+        :return: булев массив, True для интервалов, содержащих рабочий интервал
+        :rtype: np.ndarray
+        """
+        begins, ends = unpack_array(packed)
+        positions = np.searchsorted(self._begins_array, begins, side='left')
+        found = positions < len(self.begins)
+        result = np.zeros(len(packed), dtype=bool)
+        result[found] = self._min_ends_array[positions[found]] <= ends[found]
+        return result
@@ -1,14 +1,85 @@
-from datetime import datetime, timedelta
+MINUTES_PER_DAY = 24 * 60
+
+# Интервал хранится одним целым числом: начало в минутах, флаг перехода через полночь и конец в минутах.
+# Порядок упакованных чисел совпадает с порядком пар (начало, конец с учётом перехода через полночь)
+BEGIN_SHIFT = 12
+WRAP_FLAG = 1 << 11
+END_MASK = WRAP_FLAG - 1
+
+_MINUTES = {f'{hour:02}:{minute:02}': hour * 60 + minute for hour in range(24) for minute in range(60)}
+
+
+def pack_interval(begin: int, end: int) -> int:
+    """
+    Упаковывает интервал в одно целое число.
+
+    :param int begin: начало интервала в минутах от начала суток
+    :param int end: конец интервала в минутах от начала суток
+    :return: упакованный интервал
+    :rtype: int
+    """
+    wrap = WRAP_FLAG if begin > end else 0
+    return begin << BEGIN_SHIFT | wrap | end
+
+
+def unpack_interval(packed: int):
+    """
+    Распаковывает интервал в пару из начала и конца в минутах.
+
+    Если интервал переходит через полночь, к концу прибавляются сутки.
+    :param int packed: упакованный интервал
+    :return: пара (начало, конец)
+    :rtype: Tuple[int, int]
+    """
+    end = packed & END_MASK
+    if packed & WRAP_FLAG:
+        end += MINUTES_PER_DAY
+    return packed >> BEGIN_SHIFT, end
+
+
+def pack_legacy_interval(interval) -> int:
+    """
+    Упаковывает интервал из старого формата хранения: пары datetime, у которой конец сдвинут на сутки,
+    если интервал переходит через полночь.
+
+    :param interval: пара (начало, конец) из datetime
+    :return: упакованный интервал
+    :rtype: int
+    """
+    begin, end = interval
+    return pack_interval(begin.hour * 60 + begin.minute, end.hour * 60 + end.minute)
+
+
+def parse_interval(hours: str) -> int:
+    """
+    Разбирает интервал вида HH:MM-HH:MM без использования strptime.
+
+    :param str hours: строка с интервалом
+    :return: упакованный интервал
+    :rtype: int
+    :raises ValueError: если строка имеет неверный формат
+    """
+    begin = _MINUTES.get(hours[:5])
+    end = _MINUTES.get(hours[6:])
+    if begin is None or end is None or len(hours) != 11 or hours[5] != '-':
+        raise ValueError(f'Incorrect time interval: {hours}')
+    return pack_interval(begin, end)
+
+
+def parse_intervals(hours_list) -> list:
+    return [parse_interval(hours) for hours in hours_list]
+
+
+def format_interval(packed: int) -> str:
+    begin = packed >> BEGIN_SHIFT
+    end = packed & END_MASK
+    return f'{begin // 60:02}:{begin % 60:02}-{end // 60:02}:{end % 60:02}'
+
+
+def format_intervals(packed_list) -> list:
+    return [format_interval(packed) for packed in packed_list]
 
 
 def parse_hours(data, field_name):
     for item in data['data']:
-        parsed_time_list = []
-        for hour in item[field_name]:
-            time_parts = hour.split('-')
-            begin_time = datetime.strptime(time_parts[0], "%H:%M")
-            end_time = datetime.strptime(time_parts[1], "%H:%M")
-            if begin_time > end_time:
-                end_time += timedelta(days=1)
-            parsed_time_list.append((begin_time, end_time))
-        item[field_name] = parsed_time_list
+        item[field_name] = parse_intervals(item[field_name])
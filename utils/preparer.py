@@ -1,3 +1,17 @@
+from typing import Optional, Tuple
+
+from utils.courier_stats import to_utc
+from utils.parser import format_intervals
+
+UNASSIGN_ORDERS = {
+    '$set': {
+        'status': 'not_assigned',
+        'assign_time': None,
+        'courier_id': None
+    }
+}
+
+
 def prepare_couriers(data):
     prepared_data = []
     for courier in data['data']:
@@ -9,6 +23,69 @@ def prepare_couriers(data):
     return prepared_data
 
 
+def format_courier(courier):
+    return {'courier_id': courier['_id'],
+            'courier_type': courier['courier_type'],
+            'regions': courier['regions'],
+            'working_hours': format_intervals(courier['working_hours'])}
+
+
+def prepare_assign(courier_id, assign_time):
+    """
+    Формирует обновление свободных заказов, назначающее их курьеру.
+
+    :param int courier_id: идентификатор курьера
+    :param str assign_time: время назначения
+    :return: обновление для update_many
+    :rtype: dict
+    """
+    return {
+        '$set': {
+            'courier_id': courier_id,
+            'status': 'in_progress',
+            'assign_time': assign_time,
+        }
+    }
+
+
+def prepare_assign_time_merge(courier_id, list_orders) -> Tuple[str, Optional[dict]]:
+    """
+    Объединяет заказы курьера в работе в одно назначение с самым ранним временем.
+
+    Разные времена назначения возможны, если несколько запросов назначения для одного курьера
+    выполнялись параллельно в разных процессах.
+    :param int courier_id: идентификатор курьера
+    :param list list_orders: заказы курьера в работе
+    :return: время назначения и аргументы update_many или None, если времена уже совпадают
+    :rtype: Tuple[str, Optional[dict]]
+    """
+    assign_time = min(order['assign_time'] for order in list_orders)
+    if all(order['assign_time'] == assign_time for order in list_orders):
+        return assign_time, None
+    return assign_time, {
+        'filter': {'courier_id': courier_id, 'status': 'in_progress', 'assign_time': {'$ne': assign_time}},
+        'update': {'$set': {'assign_time': assign_time}}}
+
+
+def prepare_active_assign(courier, assign_time, orders_count):
+    """
+    Формирует обновление курьера, начинающее развоз или добавляющее в него заказы.
+
+    Если несколько запросов назначения для одного курьера выполнялись параллельно, их обновления
+    складываются: время назначения берётся самое раннее, а числа назначенных заказов суммируются.
+    :param dict courier: курьер
+    :param str assign_time: время назначения
+    :param int orders_count: число заказов, назначенных этим запросом
+    :return: обновление для update_one
+    :rtype: dict
+    """
+    # Тип курьера запоминается на момент назначения: от него зависит оплата развоза
+    return {'$min': {'active_assign.assign_time': assign_time,
+                     'active_assign.last_complete_time': to_utc(assign_time)},
+            '$inc': {'active_assign.outstanding': orders_count, 'active_assign.completed': 0},
+            '$set': {'active_assign.courier_type': courier['courier_type']}}
+
+
 def prepare_orders(data):
     prepared_data = []
     for order in data['data']:
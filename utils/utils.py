@@ -1,16 +1,38 @@
+import numpy as np
+
+from utils.interval_index import IntervalIndex
+
+# Начиная с такого числа интервалов доставки проверка выполняется векторно через numpy
+VECTORIZE_THRESHOLD = 1024
+
+
 def split_orders(orders_data, working_hours):
+    index = IntervalIndex(working_hours)
+    if len(index) == 0:
+        return [], [order['_id'] for order in orders_data]
+
+    counts = [len(order['delivery_hours']) for order in orders_data]
+    if sum(counts) >= VECTORIZE_THRESHOLD:
+        matched = _match_vectorized(orders_data, index, counts)
+    else:
+        covers = index.covers
+        matched = [any(covers(packed) for packed in order['delivery_hours'])
+                   for order in orders_data]
+
     av_orders = []
     un_orders = []
-    for order in orders_data:
-        find = False
-        for st2, fn2 in order['delivery_hours']:
-            for st1, fn1 in working_hours:
-                if st2 <= st1 and fn1 <= fn2:
-                    av_orders.append(order)
-                    find = True
-                    break
-            if find:
-                break
-        if not find:
+    for order, is_matched in zip(orders_data, matched):
+        if is_matched:
+            av_orders.append(order)
+        else:
             un_orders.append(order['_id'])
     return av_orders, un_orders
+
+
+def _match_vectorized(orders_data, index, counts):
+    owners = np.repeat(np.arange(len(orders_data)), counts)
+    packed = np.array([packed for order in orders_data for packed in order['delivery_hours']], dtype=np.int64)
+
+    matched = np.zeros(len(orders_data), dtype=bool)
+    matched[owners[index.covers_many(packed)]] = True
+    return matched.tolist()